@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """
+    Cache de resultados da análise do Gemini, endereçado pelo conteúdo
+    (hash da imagem ou do texto normalizado + versão do prompt).
+
+    Fica em um SQLite ao lado do banco de transações, com expiração por TTL,
+    limite de entradas com descarte LRU e contadores de acerto/erro.
+    """
+
+    def __init__(self, db_path=None, max_entries=None, ttl=None):
+        if db_path:
+            self.db_path = db_path
+        else:
+            transactions_db = os.getenv('DATABASE_PATH', '/tmp/financial_data.db')
+            self.db_path = os.getenv(
+                'ANALYSIS_CACHE_PATH',
+                os.path.join(os.path.dirname(transactions_db), 'analysis_cache.db')
+            )
+        self.max_entries = int(max_entries or os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 5000))
+        self.ttl = float(ttl or os.getenv('ANALYSIS_CACHE_TTL', 30 * 24 * 3600))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        dirpath = os.path.dirname(self.db_path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                key TEXT PRIMARY KEY,
+                result_json TEXT NOT NULL,
+                analyzed_on TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_access ON analysis_cache (last_access)'
+        )
+        self._size = self._conn.execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+
+    @staticmethod
+    def text_key(text, prompt_version):
+        """Chave de um texto: minúsculas, Unicode NFKC e espaços colapsados"""
+        normalized = re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip().lower()
+        return AnalysisCache._key('text', prompt_version, normalized.encode('utf-8'))
+
+    @staticmethod
+    def image_key(image_bytes, prompt_version):
+        return AnalysisCache._key('image', prompt_version, bytes(image_bytes))
+
+    @staticmethod
+    def _key(kind, prompt_version, payload):
+        digest = hashlib.sha256(f"{kind}:{prompt_version}:".encode('utf-8'))
+        digest.update(payload)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Retorna (resultado, data da análise original) ou None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT result_json, analyzed_on, created_at FROM analysis_cache WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            if now - row[2] > self.ttl:
+                self._conn.execute('DELETE FROM analysis_cache WHERE key = ?', (key,))
+                self._size -= 1
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._conn.execute('UPDATE analysis_cache SET last_access = ? WHERE key = ?', (now, key))
+            self.hits += 1
+            return json.loads(row[0]), row[1]
+
+    def set(self, key, result):
+        now = time.time()
+        try:
+            result_json = json.dumps(result, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Resultado não serializável, cache ignorado: {e}")
+            return
+
+        with self._lock:
+            inserted = self._conn.execute('''
+                INSERT INTO analysis_cache (key, result_json, analyzed_on, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO NOTHING
+            ''', (key, result_json, date.today().isoformat(), now, now)).rowcount
+
+            if inserted:
+                self._size += 1
+            else:
+                self._conn.execute('''
+                    UPDATE analysis_cache
+                    SET result_json = ?, analyzed_on = ?, created_at = ?, last_access = ?
+                    WHERE key = ?
+                ''', (result_json, date.today().isoformat(), now, now, key))
+
+            if self._size > self.max_entries:
+                self._evict(now)
+
+    def _evict(self, now):
+        """Remove expirados e, se ainda acima do limite, os menos usados (10% de folga)"""
+        expired = self._conn.execute(
+            'DELETE FROM analysis_cache WHERE created_at < ?', (now - self.ttl,)
+        ).rowcount
+        self._size -= expired
+        self.evictions += expired
+
+        excess = self._size - int(self.max_entries * 0.9)
+        if excess > 0:
+            removed = self._conn.execute('''
+                DELETE FROM analysis_cache WHERE key IN (
+                    SELECT key FROM analysis_cache ORDER BY last_access LIMIT ?
+                )
+            ''', (excess,)).rowcount
+            self._size -= removed
+            self.evictions += removed
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM analysis_cache')
+            self._size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': self._size,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
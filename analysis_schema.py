@@ -0,0 +1,161 @@
+"""
+Saída estruturada do Gemini: o responseSchema enviado no modo JSON (mesmos campos das
+tabelas transactions/transaction_items) e a validação da resposta em objetos tipados,
+com conversão numérica rápida ("R$ 1.234,56", 12, "12.5" -> float).
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from category_classifier import DEFAULT_CATEGORY
+from local_parser import parse_amount
+
+NOT_SPECIFIED = "Não especificado"
+
+CATEGORIES = (
+    "Tecnologia", "Eletrônico", "Informática", "Alimentação", "Transporte", "Moradia",
+    "Saúde", "Lazer", "Educação", "Mercado", "Serviços", DEFAULT_CATEGORY,
+)
+
+ISO_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+# Símbolo de moeda e espaços em valores que chegam como texto
+CURRENCY_RE = re.compile(r'^(?:R\$|RS)\s*', re.IGNORECASE)
+
+ITEM_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "description": {"type": "STRING"},
+        "quantity": {"type": "NUMBER"},
+        "unit_price": {"type": "NUMBER"},
+        "total_price": {"type": "NUMBER"},
+        "category": {"type": "STRING"},
+    },
+    "required": ["description", "total_price"],
+    "propertyOrdering": ["description", "quantity", "unit_price", "total_price", "category"],
+}
+
+
+def transaction_schema(raw_text=False, index=False):
+    """
+    Esquema de uma transação. A ordem das propriedades põe estabelecimento, total e
+    categoria antes dos itens. raw_text só é pedido para imagens (o texto enviado já é
+    conhecido); index identifica a entrada nos lotes.
+    """
+    properties = {
+        "establishment": {"type": "STRING"},
+        "date": {"type": "STRING", "description": "YYYY-MM-DD"},
+        "total_amount": {"type": "NUMBER"},
+        "category": {"type": "STRING", "enum": list(CATEGORIES)},
+        "items": {"type": "ARRAY", "items": ITEM_SCHEMA},
+    }
+    if raw_text:
+        properties["raw_text"] = {"type": "STRING"}
+    if index:
+        properties = {"index": {"type": "INTEGER"}, **properties}
+    return {
+        "type": "OBJECT",
+        "properties": properties,
+        "required": [name for name in properties if name != "raw_text"],
+        "propertyOrdering": list(properties),
+    }
+
+
+TEXT_SCHEMA = transaction_schema()
+IMAGE_SCHEMA = transaction_schema(raw_text=True)
+BATCH_SCHEMA = {"type": "ARRAY", "items": transaction_schema(index=True)}
+
+
+def to_number(value, default=0.0):
+    """float a partir do que o modelo devolver; números (o caso comum no modo JSON) não passam por regex"""
+    value_type = type(value)
+    if value_type is float:
+        return value
+    if value_type is int:
+        return float(value)
+    if value_type is str:
+        token = CURRENCY_RE.sub('', value.strip()).replace(' ', '')
+        try:
+            return parse_amount(token)
+        except ValueError:
+            return default
+    return default
+
+
+def _to_text(value, default=NOT_SPECIFIED):
+    if type(value) is str:
+        return value.strip() or default
+    return default
+
+
+@dataclass
+class TransactionItem:
+    description: str
+    quantity: float
+    unit_price: float
+    total_price: float
+    category: str
+
+    @classmethod
+    def from_dict(cls, data):
+        get = data.get
+        # Floats (o que o modo JSON devolve) seguem direto; o resto passa por to_number
+        quantity = get('quantity')
+        if type(quantity) is str:
+            quantity = to_number(quantity, 1.0)
+        elif type(quantity) is not int and type(quantity) is not float:
+            quantity = 1
+        if quantity <= 0:
+            quantity = 1
+        unit_price = get('unit_price')
+        if type(unit_price) is not float:
+            unit_price = to_number(unit_price)
+        total_price = get('total_price')
+        if type(total_price) is not float:
+            total_price = to_number(total_price)
+        if not total_price and unit_price:
+            total_price = round(unit_price * quantity, 2)
+        elif not unit_price and total_price:
+            unit_price = round(total_price / quantity, 2)
+        return cls(_to_text(get('description')), quantity, unit_price, total_price,
+                   _to_text(get('category'), DEFAULT_CATEGORY))
+
+
+@dataclass
+class AnalysisResult:
+    establishment: str
+    date: str
+    total_amount: float
+    category: str
+    items: list = field(default_factory=list)
+    raw_text: str = ''
+
+    @classmethod
+    def from_dict(cls, data, raw_text=None):
+        """Valida um objeto da resposta; levanta ValueError se não for uma transação"""
+        if not isinstance(data, dict):
+            raise ValueError(f"Transação deve ser um objeto JSON, não {type(data).__name__}")
+        from_item = TransactionItem.from_dict
+        items = [from_item(item) for item in data.get('items') or () if type(item) is dict]
+        total_amount = data.get('total_amount')
+        if type(total_amount) is not float:
+            total_amount = to_number(total_amount)
+        if not total_amount and items:
+            total_amount = round(sum(item.total_price for item in items), 2)
+        date = data.get('date')
+        if not isinstance(date, str) or not ISO_DATE_RE.match(date):
+            date = datetime.now().strftime('%Y-%m-%d')
+        return cls(
+            establishment=_to_text(data.get('establishment')),
+            date=date,
+            total_amount=total_amount,
+            category=_to_text(data.get('category'), DEFAULT_CATEGORY),
+            items=items,
+            raw_text=raw_text if raw_text is not None else _to_text(data.get('raw_text'), ''),
+        )
+
+    def to_dict(self):
+        """Dicionário no formato usado pelo DatabaseManager, pelo cache e pelas respostas"""
+        # Sem dataclasses.asdict: a cópia recursiva genérica custa mais que a própria validação
+        data = dict(vars(self))
+        data['items'] = [dict(vars(item)) for item in self.items]
+        return data
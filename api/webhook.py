@@ -1,59 +1,214 @@
-from fastapi import FastAPI, Request
-import json
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response
+import hmac
 import logging
 import os
-import httpx
+import threading
 
-from gemini_vision import GeminiAIClient
 from database_manager import DatabaseManager
-from speech_to_text import SpeechToText
+from idempotency import IdempotencyStore
+from job_queue import JobQueue, JobWorker
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from profiling import profiler
+from update_buffer import UpdateBuffer
 
-app = FastAPI()
 logger = logging.getLogger("vercel_webhook")
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_API = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}" if TELEGRAM_TOKEN else None
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Uma chave ou várias (GEMINI_API_KEYS, separadas por vírgula) para o roteador do Gemini
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEYS") or os.getenv("GEMINI_API_KEY")
+# Sem DEBUG_TOKEN as rotas /api/debug ficam desativadas
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+# Sem METRICS_TOKEN a rota /metrics fica desativada; com ele, exige "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
 
-# Instâncias reutilizáveis
-gemini_client = GeminiAIClient(GEMINI_API_KEY) if GEMINI_API_KEY else None
-db = DatabaseManager()
-stt = SpeechToText()
+# Instâncias reutilizáveis, criadas no primeiro uso: um cold start que só confirma
+# o update não paga pela importação do httpx/Pillow, pelas migrações nem pelos caches
+_gemini_client = None
+_telegram_api = None
+_db = None
+_db_lock = threading.Lock()
+_stt = None
+_job_queue = None
+_idempotency = None
+worker = None
+# Processa os jobs depois da resposta, no próprio processo, quando não há worker rodando (ver _process_inline)
+_inline_worker = None
+
+# Últimos updates recebidos, em memória (substitui o /tmp/last_update.json)
+update_buffer = UpdateBuffer()
+
+
+def get_gemini_client():
+    global _gemini_client
+    if _gemini_client is None and GEMINI_API_KEY:
+        from analysis_cache import AnalysisCache
+        from gemini_vision import GeminiAIClient
+        _gemini_client = GeminiAIClient(GEMINI_API_KEY, cache=AnalysisCache())
+    return _gemini_client
+
+
+def get_telegram_api():
+    """Cliente da Bot API com pool keep-alive compartilhado (sendMessage, getFile e downloads)"""
+    global _telegram_api
+    if _telegram_api is None and TELEGRAM_TOKEN:
+        from telegram_api import TelegramAPI
+        _telegram_api = TelegramAPI(TELEGRAM_TOKEN)
+    return _telegram_api
+
+
+def get_db():
+    global _db
+    if _db is None:
+        # Criado dentro de to_thread (ver _db_call): o lock evita dois bancos e migrações em paralelo
+        with _db_lock:
+            if _db is None:
+                _db = DatabaseManager()
+    return _db
+
+
+def _db_call(method, *args):
+    """get_db().<method>(*args) para asyncio.to_thread: o primeiro uso (migrações) também fica fora do loop"""
+    return getattr(get_db(), method)(*args)
+
+
+def get_stt():
+    global _stt
+    if _stt is None:
+        from speech_to_text import SpeechToText
+        # Serverless: sem pool de processos por padrão (spawn no primeiro áudio custa mais que a transcrição)
+        _stt = SpeechToText(process_workers=int(os.getenv('STT_PROCESS_WORKERS', 0)))
+    return _stt
+
+
+def get_job_queue():
+    """Updates são confirmados assim que gravados na fila; o processamento fica com o worker"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
+
+
+def get_idempotency():
+    """Reentregas do Telegram e retentativas do webhook são descartadas antes de enfileirar"""
+    global _idempotency
+    if _idempotency is None:
+        _idempotency = IdempotencyStore()
+    return _idempotency
+
+
+async def _handle_job(job):
+    await process_update(job.payload, final_attempt=job.final_attempt)
+
+
+def create_worker(concurrency=None):
+    """Worker que processa os updates da fila (usado no lifespan e em worker.py)"""
+    return JobWorker(get_job_queue(), profiler.maybe_wrap(_handle_job), concurrency=concurrency)
+
+
+def get_inline_worker():
+    global _inline_worker
+    if _inline_worker is None:
+        _inline_worker = create_worker()
+    return _inline_worker
+
+
+def _worker_inprocess():
+    # JOB_WORKER_INPROCESS=0 quando os jobs forem processados por `python worker.py`
+    return os.getenv('JOB_WORKER_INPROCESS', '1').lower() in ('1', 'true', 'yes')
+
+
+def _process_inline():
+    """
+    JOB_PROCESS_INLINE=auto (padrão): processa o job em uma background task do request (depois
+    da resposta) se o worker do processo deveria rodar mas o lifespan não o iniciou (TestClient
+    sem `with`, runtimes sem eventos de lifespan). No Vercel (VERCEL definido) o padrão é 1:
+    a instância congela entre invocações, então nada pode ficar para um worker em segundo plano.
+    """
+    setting = os.getenv('JOB_PROCESS_INLINE', '1' if os.getenv('VERCEL') else 'auto').lower()
+    if setting == 'auto':
+        return worker is None and _worker_inprocess()
+    return setting in ('1', 'true', 'yes')
+
+
+async def shutdown():
+    """Fecha o que foi criado: pools de conexão e de processos, fila write-behind e bancos auxiliares"""
+    global _gemini_client, _telegram_api, _db, _stt, _job_queue, _idempotency, _inline_worker
+    if _gemini_client is not None:
+        await _gemini_client.aclose()
+        _gemini_client = None
+    if _telegram_api is not None:
+        await _telegram_api.aclose()
+        _telegram_api = None
+    # Grava o que ainda estiver na fila write-behind
+    if _db is not None:
+        _db.close()
+        _db = None
+    if _stt is not None:
+        _stt.close()
+        _stt = None
+    _inline_worker = None
+    if _job_queue is not None:
+        _job_queue.close()
+        _job_queue = None
+    if _idempotency is not None:
+        _idempotency.close()
+        _idempotency = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global worker
+    if _worker_inprocess():
+        worker = create_worker()
+        worker.start()
+    yield
+    if worker is not None:
+        await worker.stop()
+        worker = None
+    await shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 async def _send_telegram_message(chat_id: int, text: str):
-    if not TELEGRAM_API:
+    telegram_api = get_telegram_api()
+    if not telegram_api:
         logger.info("TELEGRAM_BOT_TOKEN not set; skipping send_message")
         return
 
-    url = TELEGRAM_API + "/sendMessage"
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        try:
-            await client.post(url, json={"chat_id": chat_id, "text": text})
-        except Exception as e:
-            logger.error(f"Erro ao enviar mensagem Telegram: {e}")
+    try:
+        await telegram_api.send_message(chat_id, text)
+    except Exception as e:
+        logger.error(f"Erro ao enviar mensagem Telegram: {e}")
 
 
-async def _download_telegram_file(file_id: str) -> bytes:
+async def _download_telegram_file(file_id: str, file_unique_id: str = None) -> bytes:
     """Baixa arquivo do Telegram (imagem/voice) e retorna bytes"""
-    if not TELEGRAM_API:
+    telegram_api = get_telegram_api()
+    if not telegram_api:
         raise RuntimeError("TELEGRAM_BOT_TOKEN not set")
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        # getFile
-        r = await client.get(f"{TELEGRAM_API}/getFile", params={"file_id": file_id})
-        r.raise_for_status()
-        data = r.json()
-        file_path = data['result']['file_path']
-        file_url = f"https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{file_path}"
-        r2 = await client.get(file_url)
-        r2.raise_for_status()
-        return r2.content
+    # Mídia repetida (mesmo file_unique_id) pula o getFile
+    return await telegram_api.download_file(file_id, file_unique_id)
+
+
+async def _save_transaction(chat_id, transaction_data, input_method):
+    """Salva a transação sem perder a confirmação no modo write-behind; retorna o id ou None"""
+    try:
+        # Sem write-behind, submit_transaction grava na hora: fica fora do event loop
+        future = await asyncio.to_thread(_db_call, 'submit_transaction', chat_id, transaction_data, input_method)
+        return await asyncio.wrap_future(future)
+    except Exception as e:
+        logger.error(f'Erro ao salvar transação: {e}')
+        return None
 
 
-def _format_transaction_response(transaction_data):
+def _format_transaction_response(transaction_data, updated=False):
     response_message = (
-        f"✅ Transação registrada com sucesso!\n\n"
+        f"✅ Transação {'atualizada' if updated else 'registrada'} com sucesso!\n\n"
         f"🏪 Estabelecimento: {transaction_data.get('establishment', 'Não identificado')}\n"
         f"📅 Data: {transaction_data.get('date', 'Não especificada')}\n"
         f"💰 Valor Total: R$ {transaction_data.get('total_amount', 0):.2f}\n"
@@ -70,32 +225,163 @@ def _format_transaction_response(transaction_data):
 
 @app.post('/')
 @app.post('/api/webhook')
-async def telegram_webhook(request: Request):
+@profiler.maybe_wrap
+async def telegram_webhook(request: Request, background_tasks: BackgroundTasks):
     try:
         update = await request.json()
     except Exception:
         update = await request.body()
 
-    # Salva o último update recebido (útil para debug)
+    # Guarda o update para debug (amostrado, sem I/O)
+    update_buffer.record(update)
+
+    if not isinstance(update, dict) or not (update.get('message') or update.get('edited_message')):
+        return {"ok": True}
+
+    # Claims no SQLite de idempotência: fora do event loop, como os demais acessos ao banco
+    if await asyncio.to_thread(_is_duplicate, update):
+        logger.info(f"Update duplicado descartado: {update.get('update_id')}")
+        return {"ok": True}
+
+    # Grava e confirma na hora: o Telegram não espera (nem reenvia) enquanto o trabalho acontece
     try:
-        last_update_path = os.getenv('LAST_UPDATE_PATH', '/tmp/last_update.json')
-        dirp = os.path.dirname(last_update_path)
-        if dirp:
-            try:
-                os.makedirs(dirp, exist_ok=True)
-            except Exception:
-                pass
-        with open(last_update_path, 'w') as f:
-            json.dump(update, f)
-    except Exception as e:
-        logger.error(f'Erro salvando update: {e}')
+        # Um job por vez em cada chat, na ordem dos updates: a edição espera a mensagem original
+        message = update.get('message') or update.get('edited_message')
+        job_id = await asyncio.to_thread(
+            get_job_queue().enqueue, 'telegram_update', update,
+            ordering_key=message.get('chat', {}).get('id'), sequence=update.get('update_id')
+        )
+    except Exception:
+        # Sem job gravado o webhook responde 500: a reentrega do Telegram precisa passar pelo filtro
+        await asyncio.to_thread(_release_claims, update)
+        raise
+    if _process_inline():
+        # Sem worker confiável: o job roda depois que a confirmação é enviada, na mesma invocação
+        background_tasks.add_task(get_inline_worker().run_now, job_id)
+    elif worker is not None:
+        worker.notify()
+    return {"ok": True}
+
+
+def _check_debug_token(request: Request):
+    # Só no cabeçalho: na query string o token iria parar nos logs de acesso
+    token = request.headers.get('X-Debug-Token') or ''
+    if not DEBUG_TOKEN:
+        raise HTTPException(status_code=404)
+    if not hmac.compare_digest(token.encode(), DEBUG_TOKEN.encode()):
+        raise HTTPException(status_code=403)
+
+
+@app.get('/api/debug/updates')
+async def debug_updates(request: Request, limit: int = 20):
+    """Últimos updates do buffer (mais recentes primeiro), com redação se UPDATE_REDACT=1"""
+    _check_debug_token(request)
+    return {"ok": True, "stats": update_buffer.stats(), "updates": update_buffer.snapshot(limit)}
+
+
+@app.post('/api/debug/updates/flush')
+async def debug_flush_updates(request: Request, clear: bool = False):
+    """Anexa o buffer em JSONL (UPDATE_DUMP_PATH) sem bloquear o event loop"""
+    _check_debug_token(request)
+    path, count = await update_buffer.flush(clear=clear)
+    return {"ok": True, "path": path, "count": count}
+
+
+@app.get('/api/debug/profile')
+async def debug_profile(request: Request, limit: int = 20):
+    """Estado do perfilador e funções mais caras do agregado"""
+    _check_debug_token(request)
+    return {"ok": True, "stats": profiler.stats(), "top": profiler.top(limit)}
+
+
+@app.post('/api/debug/profile')
+async def debug_configure_profile(request: Request, rate: float = None, mode: str = None):
+    """
+    Liga/desliga o perfil dos jobs em tempo de execução (a rota do webhook só é
+    embrulhada se PROFILE_SAMPLE_RATE > 0 na inicialização)
+    """
+    _check_debug_token(request)
+    try:
+        profiler.configure(rate, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for job_worker in (worker, _inline_worker):
+        if job_worker is not None:
+            job_worker.handler = profiler.wrap(_handle_job) if profiler.enabled else _handle_job
+    return {"ok": True, "stats": profiler.stats()}
+
+
+@app.post('/api/debug/profile/dump')
+async def debug_dump_profile(request: Request, reset: bool = False):
+    """Grava o agregado em PROFILE_DIR (.pstats e/ou .collapsed) sem bloquear o event loop"""
+    _check_debug_token(request)
+    paths = await asyncio.to_thread(profiler.dump, reset=reset)
+    return {"ok": True, "paths": paths}
+
+
+@app.get('/api/debug/gemini')
+async def debug_gemini(request: Request):
+    """Roteamento por nível de modelo, uso das chaves (mascaradas) e contadores de resiliência"""
+    _check_debug_token(request)
+    # Não cria o cliente só para a consulta: antes da primeira análise não há o que mostrar
+    if _gemini_client is None:
+        return {"ok": True, "routing": None, "resilience": None}
+    return {"ok": True, "routing": _gemini_client.router.stats(), "resilience": _gemini_client.resilience.stats()}
 
+
+@app.get('/metrics')
+async def prometheus_metrics(request: Request):
+    """Métricas por etapa deste processo no formato de texto do Prometheus"""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404)
+    authorization = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=403)
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def _is_duplicate(update):
+    """Update já recebido (mesmo update_id) ou mensagem nova já vista (mesmo chat_id/message_id)"""
+    update_id = update.get('update_id')
+    if update_id is not None and not get_idempotency().claim_update(update_id):
+        return True
+
+    message = update.get('message')
+    if message and message.get('message_id') is not None:
+        chat_id = message.get('chat', {}).get('id')
+        return not get_idempotency().claim_message(chat_id, message['message_id'])
+    return False
+
+
+def _release_claims(update):
+    """Desfaz os claims de _is_duplicate para um update que não foi enfileirado"""
+    message = update.get('message') or {}
+    get_idempotency().release(
+        update.get('update_id'), message.get('chat', {}).get('id'), message.get('message_id')
+    )
+
+
+async def process_update(update, final_attempt=True):
+    """
+    Processa um update do Telegram (download, análise, gravação e resposta).
+    Falhas de download e de gravação levantam exceção para que o job seja repetido;
+    na última tentativa o usuário recebe a mensagem de erro.
+    """
     message = update.get('message') or update.get('edited_message')
     if not message:
-        return {"ok": True}
+        return
 
     chat = message.get('chat', {})
     chat_id = chat.get('id')
+    message_id = message.get('message_id')
+    gemini_client = get_gemini_client()
+
+    # Edição: só o texto muda a transação (fotos e áudios editados não mudam o conteúdo)
+    edited_transaction_id = None
+    if 'message' not in update:
+        if 'text' not in message or not chat_id:
+            return
+        edited_transaction_id = await asyncio.to_thread(get_idempotency().get_transaction, chat_id, message_id)
 
     try:
         # Texto
@@ -104,11 +390,12 @@ async def telegram_webhook(request: Request):
             # Processar com Gemini (se disponível)
             try:
                 if gemini_client:
-                    transaction_data = gemini_client.analyze_financial_document(text_input=text)
+                    transaction_data = await gemini_client.analyze_financial_document_async(text_input=text)
                 else:
                     raise RuntimeError('Gemini client não configurado')
             except Exception as e:
                 logger.error(f'Gemini erro: {e}')
+                metrics.fallback('default_transaction')
                 # fallback simples
                 transaction_data = {
                     'establishment': 'Não identificado',
@@ -119,25 +406,25 @@ async def telegram_webhook(request: Request):
                     'raw_text': text
                 }
 
-            saved = db.save_transaction(chat_id, transaction_data, 'text')
-            if saved:
-                await _send_telegram_message(chat_id, _format_transaction_response(transaction_data))
+            if edited_transaction_id:
+                await _update_and_reply(chat_id, edited_transaction_id, transaction_data, final_attempt)
             else:
-                await _send_telegram_message(chat_id, '❌ Erro ao salvar transação no banco de dados.')
+                await _save_and_reply(chat_id, transaction_data, 'text', final_attempt, message_id)
 
         # Foto
-        elif 'photo' in message and chat_id and TELEGRAM_API:
+        elif 'photo' in message and chat_id and TELEGRAM_TOKEN:
             # Pegar maior resolução
             photo_list = message.get('photo')
-            file_id = photo_list[-1].get('file_id')
+            photo = photo_list[-1]
+            image_bytes = await _download_telegram_file(photo.get('file_id'), photo.get('file_unique_id'))
             try:
-                image_bytes = await _download_telegram_file(file_id)
                 if gemini_client:
-                    transaction_data = gemini_client.analyze_financial_document(image_bytes=image_bytes)
+                    transaction_data = await gemini_client.analyze_financial_document_async(image_bytes=image_bytes)
                 else:
                     raise RuntimeError('Gemini client não configurado')
             except Exception as e:
                 logger.error(f'Erro processando imagem: {e}')
+                metrics.fallback('default_transaction')
                 transaction_data = {
                     'establishment': 'Não identificado',
                     'date': '',
@@ -147,24 +434,21 @@ async def telegram_webhook(request: Request):
                     'raw_text': 'Imagem recebida'
                 }
 
-            saved = db.save_transaction(chat_id, transaction_data, 'image')
-            if saved:
-                await _send_telegram_message(chat_id, _format_transaction_response(transaction_data))
-            else:
-                await _send_telegram_message(chat_id, '❌ Erro ao salvar transação no banco de dados.')
+            await _save_and_reply(chat_id, transaction_data, 'image', final_attempt, message_id)
 
         # Voice
-        elif 'voice' in message and chat_id and TELEGRAM_API:
-            file_id = message.get('voice', {}).get('file_id')
+        elif 'voice' in message and chat_id and TELEGRAM_TOKEN:
+            voice = message.get('voice', {})
+            audio_bytes = await _download_telegram_file(voice.get('file_id'), voice.get('file_unique_id'))
             try:
-                audio_bytes = await _download_telegram_file(file_id)
-                transcribed = stt.transcribe_audio(audio_bytes)
+                transcribed = await get_stt().transcribe_audio_async(audio_bytes)
                 if gemini_client:
-                    transaction_data = gemini_client.analyze_financial_document(text_input=transcribed)
+                    transaction_data = await gemini_client.analyze_financial_document_async(text_input=transcribed)
                 else:
                     raise RuntimeError('Gemini client não configurado')
             except Exception as e:
                 logger.error(f'Erro processando voice: {e}')
+                metrics.fallback('default_transaction')
                 transaction_data = {
                     'establishment': 'Não identificado',
                     'date': '',
@@ -174,11 +458,7 @@ async def telegram_webhook(request: Request):
                     'raw_text': 'Áudio recebido'
                 }
 
-            saved = db.save_transaction(chat_id, transaction_data, 'voice')
-            if saved:
-                await _send_telegram_message(chat_id, _format_transaction_response(transaction_data))
-            else:
-                await _send_telegram_message(chat_id, '❌ Erro ao salvar transação no banco de dados.')
+            await _save_and_reply(chat_id, transaction_data, 'voice', final_attempt, message_id)
 
         else:
             if chat_id:
@@ -186,7 +466,30 @@ async def telegram_webhook(request: Request):
 
     except Exception as e:
         logger.error(f'Erro geral no processamento do update: {e}')
+        if not final_attempt:
+            raise
         if chat_id:
             await _send_telegram_message(chat_id, '❌ Erro interno ao processar sua mensagem.')
 
-    return {"ok": True}
+
+async def _save_and_reply(chat_id, transaction_data, input_method, final_attempt=True, message_id=None):
+    saved = await _save_transaction(chat_id, transaction_data, input_method)
+    if not saved:
+        if not final_attempt:
+            raise RuntimeError('Erro ao salvar transação no banco de dados')
+        await _send_telegram_message(chat_id, '❌ Erro ao salvar transação no banco de dados.')
+        return
+    if message_id is not None:
+        # Edições futuras desta mensagem atualizam esta transação
+        await asyncio.to_thread(get_idempotency().set_transaction, chat_id, message_id, saved)
+    await _send_telegram_message(chat_id, _format_transaction_response(transaction_data))
+
+
+async def _update_and_reply(chat_id, transaction_id, transaction_data, final_attempt=True):
+    updated = await asyncio.to_thread(_db_call, 'update_transaction', transaction_id, chat_id, transaction_data)
+    if not updated:
+        if not final_attempt:
+            raise RuntimeError('Erro ao atualizar transação no banco de dados')
+        await _send_telegram_message(chat_id, '❌ Erro ao atualizar transação no banco de dados.')
+        return
+    await _send_telegram_message(chat_id, _format_transaction_response(transaction_data, updated=True))
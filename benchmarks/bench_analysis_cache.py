@@ -0,0 +1,49 @@
+"""
+Mede o ganho do AnalysisCache em reenvios do mesmo texto contra um Gemini falso local.
+
+Uso:
+    python benchmarks/bench_analysis_cache.py --latency 0.5 --repeats 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_servers import FakeGeminiServer  # noqa: E402
+from analysis_cache import AnalysisCache  # noqa: E402
+from gemini_vision import GeminiAIClient  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="latência simulada do Gemini (s)")
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, FakeGeminiServer(latency=args.latency) as server:
+        cache = AnalysisCache(os.path.join(tmp, "cache.db"))
+        client = GeminiAIClient("fake-key", base_url=server.base_url, cache=cache,
+                                local_confidence_threshold=2)
+
+        start = time.perf_counter()
+        client.analyze_financial_document(text_input="Conta de luz 150,00")
+        first = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(args.repeats):
+            # Variações de caixa/espaços caem na mesma chave
+            client.analyze_financial_document(text_input="conta de luz  150,00" if i % 2 else "Conta de luz 150,00")
+        repeat = (time.perf_counter() - start) / args.repeats
+
+        print(f"primeira chamada: {first * 1000:.1f} ms")
+        print(f"reenvio (média):  {repeat * 1000:.3f} ms")
+        print(f"chamadas ao Gemini: {server.request_count} | cache: {cache.stats()}")
+        client.close()
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
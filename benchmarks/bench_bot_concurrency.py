@@ -0,0 +1,105 @@
+"""
+Teste de carga do bot por polling (telegram_bot.py) contra o Gemini e o Telegram falsos:
+mensagens de texto de vários chats são colocadas na fila de updates da Application e
+o script mede mensagens/s para cada valor de BOT_CONCURRENT_UPDATES, conferindo se as
+transações de cada chat foram gravadas na ordem em que as mensagens foram enviadas.
+
+Uso:
+    python benchmarks/bench_bot_concurrency.py --chats 10 --per-chat 5 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_servers import FakeGeminiServer, FakeTelegramServer  # noqa: E402
+
+TOKEN = "123:fake"
+
+
+def make_update(update_id, chat_id, sequence):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': sequence + 1,
+            'date': int(time.time()),
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Teste'},
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': f'mercado {sequence + 1},90',
+        }
+    }
+
+
+async def run(concurrency, chats, per_chat, gemini_url):
+    from telegram import Update
+    from gemini_vision import GeminiAIClient
+    from telegram_bot import TelegramBot
+
+    bot = TelegramBot(TOKEN, GeminiAIClient("fake-key", base_url=gemini_url), concurrent_updates=concurrency)
+    application = bot.application
+    await application.initialize()
+    await application.start()
+
+    # Intercalado: chat 0 msg 1, chat 1 msg 1, ..., chat 0 msg 2, ...
+    total = chats * per_chat
+    start = time.perf_counter()
+    for sequence in range(per_chat):
+        for chat in range(chats):
+            data = make_update(sequence * chats + chat, 5000 + chat, sequence)
+            application.update_queue.put_nowait(Update.de_json(data, application.bot))
+
+    # Cada mensagem gera "Processando..." e a confirmação
+    def saved():
+        return sum(len(bot.db_manager.get_transactions(5000 + chat, limit=per_chat)) for chat in range(chats))
+
+    while saved() < total:
+        await asyncio.sleep(0.02)
+    elapsed = time.perf_counter() - start
+
+    out_of_order = 0
+    for chat in range(chats):
+        rows = sorted(bot.db_manager.get_transactions(5000 + chat, limit=per_chat), key=lambda row: row[0])
+        sequence = [int(row[7].split()[1].split(',')[0]) for row in rows]
+        out_of_order += sum(1 for a, b in zip(sequence, sequence[1:]) if b < a)
+
+    await application.stop()
+    await application.shutdown()
+    await bot._on_shutdown(application)
+    return elapsed, out_of_order
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--per-chat", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=0.1, help="latência simulada do Gemini (s)")
+    parser.add_argument("--telegram-latency", type=float, default=0.005, help="latência simulada do Telegram (s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    total = args.chats * args.per_chat
+    print(f"mensagens: {total} ({args.chats} chats x {args.per_chat}) | "
+          f"latência Gemini {args.latency * 1000:.0f} ms, Telegram {args.telegram_latency * 1000:.0f} ms")
+
+    with FakeGeminiServer(latency=args.latency) as gemini, FakeTelegramServer(latency=args.telegram_latency) as telegram:
+        for concurrency in args.concurrency:
+            with tempfile.TemporaryDirectory() as tmp:
+                os.environ.update({
+                    'DATABASE_PATH': os.path.join(tmp, 'financial_data.db'),
+                    'TELEGRAM_API_BASE': telegram.base_url,
+                    # Parser local desativado para que todas as mensagens cheguem ao Gemini falso
+                    'LOCAL_PARSER_MIN_CONFIDENCE': '2',
+                })
+                elapsed, out_of_order = asyncio.run(run(concurrency, args.chats, args.per_chat, gemini.base_url))
+            print(f"concorrência {concurrency:3} | {elapsed:6.2f} s | {total / elapsed:7.1f} msgs/s | "
+                  f"fora de ordem no mesmo chat: {out_of_order}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compara o classificador compilado (trie -> regex) com a busca por substring
+que existia em _fallback_financial_processing, em descrições de itens.
+
+Uso:
+    python benchmarks/bench_category_classifier.py --descriptions 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from category_classifier import classifier  # noqa: E402
+
+# Dicionário e laço originais, como referência
+LEGACY_KEYWORDS = {
+    'Mercado': ['mercado', 'supermercado', 'compras', 'hipermercado'],
+    'Alimentação': ['restaurante', 'lanche', 'pizza', 'hambúrguer', 'comida', 'almoço', 'jantar'],
+    'Transporte': ['combustível', 'gasolina', 'posto', 'ônibus', 'metro', 'táxi', 'uber'],
+    'Moradia': ['aluguel', 'condomínio', 'conta de luz', 'água', 'internet', 'energia'],
+    'Saúde': ['farmácia', 'remédio', 'médico', 'hospital', 'consulta'],
+    'Lazer': ['cinema', 'shopping', 'parque', 'viagem', 'hotel'],
+    'Educação': ['livro', 'curso', 'faculdade', 'escola', 'material']
+}
+
+SAMPLES = [
+    "Arroz tipo 1 5kg supermercado", "Remédios farmácia popular", "Gasolina aditivada posto Shell",
+    "Pizza grande calabresa", "Mensalidade faculdade", "Conta de água Sabesp", "Aguardente 1L",
+    "Mouse sem fio Logitech", "Ingresso cinema 3D", "Corrida Uber centro", "Parafuso 10mm",
+    "Cheguei tarde no trabalho", "Almoço executivo", "Consulta dermatologista", "Material escolar"
+]
+
+
+def legacy_classify(text):
+    for category, keywords in LEGACY_KEYWORDS.items():
+        if any(keyword in text.lower() for keyword in keywords):
+            return category
+    return "Outros"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--descriptions", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    texts = [f"{rng.choice(SAMPLES)} {rng.randint(1, 999)}" for _ in range(args.descriptions)]
+
+    start = time.perf_counter()
+    [legacy_classify(text) for text in texts]
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single_results = [classifier.classify_with_score(text) for text in texts]
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_results = classifier.classify_many(texts)
+    batch = time.perf_counter() - start
+    if batch_results != single_results:
+        sys.exit("classify_many diverge da classificação um a um")
+
+    n = len(texts)
+    print(f"{n} descrições")
+    print(f"substring (original):  {legacy:.3f} s ({n / legacy:,.0f}/s)")
+    print(f"compilado, um a um:    {single:.3f} s ({n / single:,.0f}/s)")
+    print(f"compilado, em lote:    {batch:.3f} s ({n / batch:,.0f}/s) | "
+          f"{len(set(texts))} descrições distintas")
+    print("diferenças de rótulo (original -> compilado):")
+    for sample in SAMPLES:
+        before, after = legacy_classify(sample), classifier.classify(sample)
+        if before != after:
+            print(f"  {sample!r}: {before} -> {after}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Cold start do webhook (entrada serverless): cada rodada é um processo Python novo,
+com banco vazio, que importa api.webhook, sobe o app (lifespan) e faz a primeira
+requisição com um update de texto.
+
+Mostra p50/p95 de cada etapa; com --budget-ms o script termina com código 1 se o
+p95 do total (importação + lifespan + primeira requisição) passar do orçamento (uso em CI).
+--importtime lista os módulos mais caros segundo `python -X importtime`.
+
+Uso:
+    python benchmarks/bench_cold_start.py --runs 10 --budget-ms 800
+    python benchmarks/bench_cold_start.py --importtime
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executado em cada processo novo; a importação do TestClient (harness) fica fora das medidas
+CHILD = """
+import json, time
+t0 = time.perf_counter()
+import api.webhook as webhook
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(webhook.app)
+t2 = time.perf_counter()
+client.__enter__()
+t3 = time.perf_counter()
+update = {'update_id': 1, 'message': {'message_id': 1, 'chat': {'id': 1}, 'text': 'mercado 12,90'}}
+response = client.post('/api/webhook', json=update)
+t4 = time.perf_counter()
+assert response.status_code == 200, response.text
+print(json.dumps({'import': t1 - t0, 'lifespan': t3 - t2, 'first_request': t4 - t3}))
+client.__exit__(None, None, None)
+"""
+
+
+def child_env(tmp):
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': ROOT,
+        'DATABASE_PATH': os.path.join(tmp, 'financial_data.db'),
+    })
+    # Sem tokens: nenhuma chamada externa durante a medição
+    env.pop('TELEGRAM_BOT_TOKEN', None)
+    env.pop('GEMINI_API_KEY', None)
+    return env
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD], cwd=ROOT, env=child_env(tmp),
+            capture_output=True, text=True, check=True
+        ).stdout
+        process = time.perf_counter() - start
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings['total'] = timings['import'] + timings['lifespan'] + timings['first_request']
+    timings['process'] = process
+    return timings
+
+
+def show_importtime(top):
+    """Módulos com maior tempo próprio de importação ao importar api.webhook"""
+    with tempfile.TemporaryDirectory() as tmp:
+        stderr = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import api.webhook'], cwd=ROOT, env=child_env(tmp),
+            capture_output=True, text=True, check=True
+        ).stderr
+
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+
+    total = next((cumulative for _, cumulative, name in rows if name == 'api.webhook'), 0)
+    print(f"importação de api.webhook: {total / 1000:.1f} ms")
+    print(f"{'próprio (ms)':>12} {'acumulado (ms)':>15}  módulo")
+    for self_us, cumulative_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{self_us / 1000:12.1f} {cumulative_us / 1000:15.1f}  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="falha se o p95 do total passar deste valor (padrão: COLD_START_BUDGET_MS)")
+    parser.add_argument("--importtime", action="store_true", help="lista os módulos mais caros e sai")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    if args.importtime:
+        show_importtime(args.top)
+        return
+
+    budget = args.budget_ms or (float(os.environ['COLD_START_BUDGET_MS']) if os.getenv('COLD_START_BUDGET_MS') else None)
+    runs = [run_once() for _ in range(args.runs)]
+
+    print(f"rodadas: {args.runs} (processo novo e banco vazio em cada uma)")
+    for stage in ('import', 'lifespan', 'first_request', 'total', 'process'):
+        values = [run[stage] for run in runs]
+        print(f"{stage:14} p50 {percentile(values, 50) * 1000:7.1f} ms | p95 {percentile(values, 95) * 1000:7.1f} ms")
+
+    if budget is not None:
+        p95 = percentile([run['total'] for run in runs], 95) * 1000
+        if p95 > budget:
+            print(f"FALHOU: p95 do total {p95:.1f} ms acima do orçamento de {budget:.0f} ms")
+            sys.exit(1)
+        print(f"OK: p95 do total {p95:.1f} ms dentro do orçamento de {budget:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
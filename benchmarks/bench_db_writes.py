@@ -0,0 +1,76 @@
+"""
+Mede a vazão de gravação do DatabaseManager com e sem o modo write-behind.
+
+Simula uma rajada (ex.: vários álbuns de recibos encaminhados ao mesmo tempo):
+cada thread produtora envia sua parte via submit_transaction e, no fim,
+todas as confirmações (ids) são aguardadas, como fazem os handlers do bot.
+
+Uso:
+    python benchmarks/bench_db_writes.py --transactions 5000 --items 3 --threads 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import DatabaseManager  # noqa: E402
+
+
+def make_transaction(i, items):
+    return {
+        "establishment": f"Mercado {i % 17}",
+        "date": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+        "total_amount": 10.0 * items,
+        "category": "Mercado",
+        "items": [
+            {"description": f"Item {j}", "quantity": 1, "unit_price": 10.0, "total_price": 10.0, "category": "Mercado"}
+            for j in range(items)
+        ],
+        "raw_text": f"recibo {i}"
+    }
+
+
+def run(write_behind, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "bench.db"), write_behind=write_behind,
+                             batch_size=args.batch_size, max_latency=args.latency_ms / 1000)
+        transactions = [make_transaction(i, args.items) for i in range(args.transactions)]
+
+        def produce(offset):
+            return [
+                db.submit_transaction(i % 50, transactions[i], "image")
+                for i in range(offset, len(transactions), args.threads)
+            ]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            futures = [f for chunk in pool.map(produce, range(args.threads)) for f in chunk]
+        ids = [f.result() for f in futures]
+        elapsed = time.perf_counter() - start
+        db.close()
+
+        assert len(set(ids)) == len(transactions), "alguma transação não foi salva"
+        rows = args.transactions * (1 + args.items)
+        return elapsed, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=3, help="itens por transação")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=2)
+    args = parser.parse_args()
+
+    for label, write_behind in (("sem lote", False), ("write-behind", True)):
+        elapsed, rows = run(write_behind, args)
+        print(f"{label:>12}: {elapsed:.2f} s | {args.transactions / elapsed:,.0f} transações/s | {rows / elapsed:,.0f} linhas/s")
+
+
+if __name__ == "__main__":
+    main()
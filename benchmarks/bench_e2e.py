@@ -0,0 +1,360 @@
+"""
+Benchmark de ponta a ponta: o webhook (api/webhook.py, com fila e worker) e o bot por
+polling (TelegramBot) recebem uma carga mista de textos, fotos e áudios a uma taxa fixa,
+contra o Gemini e o Telegram falsos (latência e injeção de erros configuráveis).
+
+Para cada alvo mede, do envio do update até a resposta final chegar ao Telegram falso:
+latência p50/p95/p99, mensagens/s, chamadas de API por mensagem e linhas gravadas no
+banco por segundo. Com --output os resultados são salvos em JSON; --compare mostra a
+diferença para um resultado salvo antes.
+
+Uso:
+    python benchmarks/bench_e2e.py --messages 60 --rate 20 --mix text=6,photo=3,voice=1 --output e2e.json
+    python benchmarks/bench_e2e.py --target webhook --gemini-error-rate 0.1 --compare e2e.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from functools import lru_cache
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_speech_to_text import make_clip  # noqa: E402
+from fake_servers import FakeGeminiServer, FakeTelegramServer  # noqa: E402
+
+TOKEN = "123:fake"
+FIRST_CHAT_ID = 100_000
+# Respostas que encerram o processamento de uma mensagem (as demais são "Processando...")
+FINAL_PREFIXES = ('✅', '❌', 'Recebi')
+
+
+@lru_cache(maxsize=None)
+def receipt_image(index):
+    """JPEG distinto por mensagem (sem acertos de cache por acaso)"""
+    from PIL import Image, ImageDraw
+    image = Image.new('RGB', (900, 1200), (250, 250 - index % 40, 245))
+    draw = ImageDraw.Draw(image)
+    for line in range(30):
+        draw.text((60, 60 + line * 36), f"ITEM {index}-{line} .......... R$ {line + index % 97},90", fill=(20, 20, 20))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=1)
+def voice_clip():
+    return make_clip(3.0, silence=0.5)
+
+
+def file_content(file_path):
+    name = file_path.rsplit('/', 1)[-1]
+    if name.startswith('photo-'):
+        return receipt_image(int(name.split('-')[1]))
+    return voice_clip()
+
+
+def build_plan(messages, mix, seed):
+    kinds = random.Random(seed).choices(list(mix), weights=list(mix.values()), k=messages)
+    plan = []
+    for i, kind in enumerate(kinds):
+        chat_id = FIRST_CHAT_ID + i
+        message = {
+            'message_id': 1,
+            'date': int(time.time()),
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Teste'},
+            'chat': {'id': chat_id, 'type': 'private'},
+        }
+        if kind == 'text':
+            message['text'] = f'mercado {i + 1},90' if i % 2 else f'almoço com a equipe no restaurante {i + 1} reais'
+        elif kind == 'photo':
+            message['photo'] = [{'file_id': f'photo-{i}', 'file_unique_id': f'photo-{i}', 'width': 900, 'height': 1200}]
+        else:
+            message['voice'] = {'file_id': f'voice-{i}', 'file_unique_id': f'voice-{i}', 'duration': 4}
+        plan.append((kind, chat_id, {'update_id': i + 1, 'message': message}))
+    return plan
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else None
+
+
+def final_times(telegram):
+    """chat_id -> instante da primeira resposta final recebida pelo Telegram falso"""
+    finals = {}
+    for request, sent_at in zip(list(telegram.sent_messages), list(telegram.sent_at)):
+        if str(request.get('text', '')).startswith(FINAL_PREFIXES):
+            finals.setdefault(int(request['chat_id']), sent_at)
+    return finals
+
+
+async def wait_until_settled(plan, telegram, gemini, settle, timeout):
+    """Até todas as mensagens terem resposta final, ou nada acontecer por `settle` segundos"""
+    expected = {chat_id for _, chat_id, _ in plan}
+    deadline = time.perf_counter() + timeout
+    last_activity, last_count = time.perf_counter(), -1
+    while time.perf_counter() < deadline:
+        if expected <= final_times(telegram).keys():
+            return
+        count = sum(telegram.calls.values()) + gemini.request_count + telegram.errors
+        if count != last_count:
+            last_activity, last_count = time.perf_counter(), count
+        elif time.perf_counter() - last_activity > settle:
+            return
+        await asyncio.sleep(0.02)
+
+
+async def paced(plan, rate, submit):
+    """Envia cada update no instante programado (carga em malha aberta)"""
+    start = time.perf_counter()
+    submitted = {}
+
+    async def one(i, chat_id, update):
+        await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+        submitted[chat_id] = time.perf_counter()
+        await submit(update)
+
+    await asyncio.gather(*(one(i, chat_id, update) for i, (_, chat_id, update) in enumerate(plan)))
+    return submitted
+
+
+async def drive_webhook(plan, rate, telegram, gemini, settle, timeout):
+    from api import webhook
+
+    ack_latencies = []
+    async with webhook.lifespan(webhook.app):
+        transport = httpx.ASGITransport(app=webhook.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://webhook') as client:
+            async def submit(update):
+                start = time.perf_counter()
+                response = await client.post('/api/webhook', json=update)
+                response.raise_for_status()
+                ack_latencies.append(time.perf_counter() - start)
+
+            submitted = await paced(plan, rate, submit)
+            await wait_until_settled(plan, telegram, gemini, settle, timeout)
+    return submitted, {'ack_p50_ms': _ms(percentile(ack_latencies, 50)), 'ack_p99_ms': _ms(percentile(ack_latencies, 99))}
+
+
+async def drive_bot(plan, rate, telegram, gemini, settle, timeout):
+    from telegram import Update
+    from analysis_cache import AnalysisCache
+    from gemini_vision import GeminiAIClient
+    from telegram_bot import TelegramBot
+
+    bot = TelegramBot(TOKEN, GeminiAIClient("fake-key", cache=AnalysisCache()))
+    application = bot.application
+    await application.initialize()
+    await application.start()
+    try:
+        async def submit(update):
+            application.update_queue.put_nowait(Update.de_json(update, application.bot))
+
+        submitted = await paced(plan, rate, submit)
+        await wait_until_settled(plan, telegram, gemini, settle, timeout)
+    finally:
+        await application.stop()
+        await application.shutdown()
+        await bot._on_shutdown(application)
+    return submitted, {}
+
+
+def stage_delta(before, after):
+    """Tempo médio e erros de cada etapa durante a execução de um alvo"""
+    stages = {}
+    for stage, current in sorted(after.items()):
+        previous = before.get(stage, {'count': 0, 'seconds': 0.0, 'errors': 0})
+        count = current['count'] - previous['count']
+        if count:
+            stages[stage] = {
+                'count': count,
+                'mean_ms': _ms((current['seconds'] - previous['seconds']) / count),
+                'errors': current['errors'] - previous['errors'],
+            }
+    return stages
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                for table in ('transactions', 'transaction_items')}
+    finally:
+        conn.close()
+
+
+def run_target(target, plan, args):
+    driver = drive_webhook if target == 'webhook' else drive_bot
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeGeminiServer(latency=args.gemini_latency, error_rate=args.gemini_error_rate, seed=args.seed) as gemini, \
+            FakeTelegramServer(latency=args.telegram_latency, file_content=file_content,
+                               error_rate=args.telegram_error_rate, seed=args.seed) as telegram:
+        db_path = os.path.join(tmp, 'financial_data.db')
+        os.environ.update({
+            'DATABASE_PATH': db_path,
+            'TELEGRAM_API_BASE': telegram.base_url,
+            'GEMINI_API_BASE': gemini.base_url,
+            'JOB_WORKER_CONCURRENCY': str(args.concurrency),
+            'BOT_CONCURRENT_UPDATES': str(args.concurrency),
+            'JOB_POLL_INTERVAL': '0.05',
+            'JOB_RETRY_BASE_S': '0.5',
+        })
+        if args.no_local_parser:
+            os.environ['LOCAL_PARSER_MIN_CONFIDENCE'] = '2'
+
+        from metrics import metrics
+        stages_before = metrics.stage_summary()
+        submitted, extra = asyncio.run(driver(plan, args.rate, telegram, gemini, args.settle, args.timeout))
+        stages = stage_delta(stages_before, metrics.stage_summary())
+        finals = final_times(telegram)
+        rows = count_rows(db_path)
+
+    latencies = {kind: [] for kind in args.mix}
+    for kind, chat_id, _ in plan:
+        if chat_id in finals:
+            latencies[kind].append(finals[chat_id] - submitted[chat_id])
+    everything = [value for values in latencies.values() for value in values]
+    completed = len(everything)
+    elapsed = (max(finals.values()) - min(submitted.values())) if finals else 0.0
+    total_rows = sum(rows.values())
+    telegram_calls = sum(telegram.calls.values())
+
+    result = {
+        'messages': len(plan),
+        'completed': completed,
+        'elapsed_s': round(elapsed, 3),
+        'messages_per_s': round(completed / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': _ms(percentile(everything, 50)),
+            'p95': _ms(percentile(everything, 95)),
+            'p99': _ms(percentile(everything, 99)),
+        },
+        'latency_p50_ms_by_kind': {kind: _ms(percentile(values, 50)) for kind, values in latencies.items()},
+        'gemini_calls_per_message': round(gemini.request_count / len(plan), 3),
+        'telegram_calls_per_message': round(telegram_calls / len(plan), 3),
+        'api_calls_per_message': round((gemini.request_count + telegram_calls) / len(plan), 3),
+        'gemini_statuses': {str(status): count for status, count in gemini.statuses.items()},
+        'telegram_errors': telegram.errors,
+        'db_rows': rows,
+        'db_rows_per_s': round(total_rows / elapsed, 1) if elapsed else 0.0,
+        'stages': stages,
+    }
+    result.update(extra)
+    return result
+
+
+def print_result(target, result):
+    latency = result['latency_ms']
+    by_kind = ', '.join(f"{kind} {value}" for kind, value in result['latency_p50_ms_by_kind'].items())
+    print(f"[{target}] concluídas {result['completed']}/{result['messages']} em {result['elapsed_s']:.2f} s | "
+          f"{result['messages_per_s']} msgs/s")
+    print(f"  latência p50 {latency['p50']} ms | p95 {latency['p95']} ms | p99 {latency['p99']} ms "
+          f"(p50 por tipo: {by_kind})")
+    print(f"  chamadas/msg: Gemini {result['gemini_calls_per_message']} | Telegram {result['telegram_calls_per_message']} | "
+          f"total {result['api_calls_per_message']} | banco: {sum(result['db_rows'].values())} linhas "
+          f"({result['db_rows_per_s']} linhas/s)")
+    print("  etapas (média): " + ', '.join(
+        f"{stage} {stage_result['mean_ms']} ms x{stage_result['count']}"
+        + (f" ({stage_result['errors']} erros)" if stage_result['errors'] else '')
+        for stage, stage_result in result['stages'].items()))
+    if 'ack_p50_ms' in result:
+        print(f"  confirmação do webhook: p50 {result['ack_p50_ms']} ms | p99 {result['ack_p99_ms']} ms")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    metrics = (('messages_per_s', lambda r: r['messages_per_s']),
+               ('latência p50', lambda r: r['latency_ms']['p50']),
+               ('latência p95', lambda r: r['latency_ms']['p95']),
+               ('latência p99', lambda r: r['latency_ms']['p99']),
+               ('chamadas/msg', lambda r: r['api_calls_per_message']),
+               ('linhas/s', lambda r: r['db_rows_per_s']))
+    for target, result in results.items():
+        if target not in baseline:
+            continue
+        print(f"[{target}] comparado com {baseline_path}:")
+        for label, get in metrics:
+            before, after = get(baseline[target]), get(result)
+            if before and after is not None:
+                print(f"  {label:15} {before:>9} -> {after:>9} ({(after - before) / before * 100:+.1f}%)")
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in ('text', 'photo', 'voice'):
+            raise argparse.ArgumentTypeError(f"tipo desconhecido: {kind}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("webhook", "bot", "both"), default="both")
+    parser.add_argument("--messages", type=int, default=60)
+    parser.add_argument("--rate", type=float, default=20.0, help="mensagens por segundo enviadas")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("text=6,photo=3,voice=1"))
+    parser.add_argument("--concurrency", type=int, default=8, help="JOB_WORKER_CONCURRENCY / BOT_CONCURRENT_UPDATES")
+    parser.add_argument("--gemini-latency", type=float, default=0.2)
+    parser.add_argument("--telegram-latency", type=float, default=0.01)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--telegram-error-rate", type=float, default=0.0)
+    parser.add_argument("--no-local-parser", action="store_true", help="todos os textos vão ao Gemini")
+    parser.add_argument("--settle", type=float, default=5.0, help="encerra após N s sem atividade")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="salva os resultados em JSON")
+    parser.add_argument("--compare", help="JSON de uma execução anterior")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    # O webhook lê os tokens ao ser importado
+    os.environ.update({'TELEGRAM_BOT_TOKEN': TOKEN, 'GEMINI_API_KEY': 'fake-key'})
+    plan = build_plan(args.messages, args.mix, args.seed)
+    targets = ('webhook', 'bot') if args.target == 'both' else (args.target,)
+
+    print(f"mensagens: {args.messages} a {args.rate} msgs/s | mix: {args.mix} | concorrência: {args.concurrency} | "
+          f"Gemini {args.gemini_latency * 1000:.0f} ms (erros {args.gemini_error_rate:.0%}), "
+          f"Telegram {args.telegram_latency * 1000:.0f} ms (erros {args.telegram_error_rate:.0%})")
+    results = {}
+    for target in targets:
+        results[target] = run_target(target, plan, args)
+        print_result(target, results[target])
+
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'revision': git_revision(), 'timestamp': time.time(), 'config': config, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"resultados salvos em {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
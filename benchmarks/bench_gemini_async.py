@@ -0,0 +1,59 @@
+"""
+Compara a API síncrona e a assíncrona do GeminiAIClient contra um Gemini falso local.
+
+Uso:
+    python benchmarks/bench_gemini_async.py --messages 20 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_servers import FakeGeminiServer  # noqa: E402
+from gemini_vision import GeminiAIClient  # noqa: E402
+
+
+def run_sync(client, texts):
+    start = time.perf_counter()
+    for text in texts:
+        client.analyze_financial_document(text_input=text)
+    return time.perf_counter() - start
+
+
+async def run_async(client, texts):
+    start = time.perf_counter()
+    await asyncio.gather(*(client.analyze_financial_document_async(text_input=t) for t in texts))
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="latência simulada do Gemini (s)")
+    args = parser.parse_args()
+
+    texts = [f"mercado {i},90" for i in range(args.messages)]
+
+    with FakeGeminiServer(latency=args.latency) as server:
+        # Parser local desativado para que todas as mensagens cheguem ao Gemini falso
+        client = GeminiAIClient("fake-key", base_url=server.base_url, local_confidence_threshold=2)
+
+        sync_elapsed = run_sync(client, texts)
+        client.close()
+
+        server.max_in_flight = 0
+        async_elapsed = asyncio.run(run_async(client, texts))
+
+        print(f"mensagens: {args.messages} | latência simulada: {args.latency * 1000:.0f} ms")
+        print(f"síncrono:   {sync_elapsed:.2f} s ({args.messages / sync_elapsed:.1f} msg/s)")
+        print(f"assíncrono: {async_elapsed:.2f} s ({args.messages / async_elapsed:.1f} msg/s), "
+              f"{server.max_in_flight} requisições simultâneas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Mede o efeito dos micro-lotes de texto do GeminiAIClient contra um Gemini falso local:
+número de requisições, bytes enviados e tempo total para uma rajada de mensagens simultâneas.
+
+Uso:
+    python benchmarks/bench_gemini_batching.py --messages 40 --window-ms 100 --max-items 8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_servers import FakeGeminiServer  # noqa: E402
+from gemini_vision import GeminiAIClient  # noqa: E402
+
+
+async def burst(client, texts):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client.analyze_financial_document_async(text_input=t) for t in texts))
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return elapsed, results
+
+
+def run(texts, latency, window, max_items, malformed=False):
+    with FakeGeminiServer(latency=latency, malformed_batches=malformed) as server:
+        # Parser local desativado para que todas as mensagens cheguem ao Gemini falso
+        client = GeminiAIClient(
+            "fake-key", base_url=server.base_url, local_confidence_threshold=2,
+            batch_window=window, batch_max_items=max_items
+        )
+        elapsed, results = asyncio.run(burst(client, texts))
+        # Em lotes, cada chamador deve receber o resultado do próprio texto
+        mismatched = 0
+        if window and not malformed:
+            mismatched = sum(1 for text, result in zip(texts, results) if result['raw_text'] != text)
+        return elapsed, server.request_count, server.bytes_received, client.batch_fallbacks, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2, help="latência simulada do Gemini (s)")
+    parser.add_argument("--window-ms", type=float, default=100)
+    parser.add_argument("--max-items", type=int, default=8)
+    args = parser.parse_args()
+    # Os erros esperados do cenário malformado aparecem na coluna de reenvios
+    logging.basicConfig(level=logging.CRITICAL)
+
+    texts = [f"comprei item número {i} por {i},90" for i in range(args.messages)]
+    window = args.window_ms / 1000
+
+    print(f"mensagens: {args.messages} | latência simulada: {args.latency * 1000:.0f} ms | "
+          f"janela: {args.window_ms:.0f} ms | até {args.max_items} por lote")
+    scenarios = (
+        ("sem lotes", 0, args.max_items, False),
+        ("em lotes", window, args.max_items, False),
+        ("lote malformado", window, args.max_items, True),
+    )
+    for label, scenario_window, max_items, malformed in scenarios:
+        elapsed, requests, sent, fallbacks, mismatched = run(texts, args.latency, scenario_window, max_items, malformed)
+        print(f"{label:16} {elapsed:.2f} s | {requests:3} requisições | {sent / args.messages:7.0f} bytes/msg | "
+              f"{fallbacks} reenvios individuais | {mismatched} resultados trocados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Exercita a camada de resiliência do GeminiAIClient contra um Gemini falso com
+erros programados (429/503): novas tentativas com Retry-After, abertura e
+recuperação do circuit breaker (com fallback para o parser local) e token bucket.
+
+Cada cenário confere os contadores de resilience.stats(); o script termina com
+código 1 se algum cenário falhar.
+
+Uso:
+    python benchmarks/bench_gemini_resilience.py
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_servers import FakeGeminiServer  # noqa: E402
+from gemini_resilience import ResiliencePolicy  # noqa: E402
+from gemini_routing import ModelRouter  # noqa: E402
+from gemini_vision import GeminiAIClient  # noqa: E402
+
+
+def make_client(server, **policy):
+    # Parser local desativado para que todas as mensagens cheguem ao Gemini falso
+    policy.setdefault('base_delay', 0.02)
+    # Uma chave e um só nível: um 429 passa pelo backoff em vez de trocar de chave/modelo
+    return GeminiAIClient(
+        "fake-key", base_url=server.base_url, local_confidence_threshold=2,
+        resilience=ResiliencePolicy(**policy), router=ModelRouter("fake-key", lite_model='')
+    )
+
+
+async def analyze_all(client, texts):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client.analyze_financial_document_async(text_input=t) for t in texts))
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return elapsed, results
+
+
+def transient_errors(latency):
+    """429 com Retry-After seguido de 503: a mensagem passa na terceira tentativa"""
+    with FakeGeminiServer(latency=latency, script=[(429, 0.3), 503]) as server:
+        client = make_client(server, max_retries=3)
+        elapsed, results = asyncio.run(analyze_all(client, ["mercado 10,90"]))
+        stats = client.resilience.stats()
+        ok = (results[0]['establishment'] == 'Mercado Teste' and stats.get('retries') == 2
+              and stats.get('rate_limited') == 1 and stats.get('server_errors') == 1 and elapsed >= 0.3)
+        return ok, f"{elapsed:.2f} s (Retry-After 0.3 s respeitado)", stats
+
+
+def outage(latency, messages):
+    """503 constante: o circuito abre e as demais mensagens vão direto para o parser local"""
+    with FakeGeminiServer(latency=latency, script=[503] * 1000) as server:
+        client = make_client(server, max_retries=2, failure_threshold=3, reset_timeout=60)
+        first_elapsed, _ = asyncio.run(analyze_all(client, ["mercado 10,90"]))
+        elapsed, results = asyncio.run(analyze_all(client, [f"mercado {i},90" for i in range(messages)]))
+        stats = client.resilience.stats()
+        ok = (stats['breaker_state'] == 'open' and stats.get('short_circuited') == messages
+              and stats.get('local_fallbacks') == messages + 1 and server.request_count == 3
+              and all(result['total_amount'] for result in results))
+        return ok, (f"1ª mensagem {first_elapsed:.2f} s; {messages} seguintes em {elapsed * 1000:.1f} ms "
+                    f"com {server.request_count} requisições ao todo"), stats
+
+
+def recovery(latency):
+    """Depois de reset_timeout, uma requisição de teste bem-sucedida fecha o circuito"""
+    with FakeGeminiServer(latency=latency, script=[503, 503]) as server:
+        client = make_client(server, max_retries=0, failure_threshold=2, reset_timeout=0.3)
+        asyncio.run(analyze_all(client, ["mercado 1,90", "mercado 2,90"]))
+        opened = client.resilience.stats()['breaker_state']
+        time.sleep(0.35)
+        _, results = asyncio.run(analyze_all(client, ["mercado 3,90"]))
+        stats = client.resilience.stats()
+        ok = opened == 'open' and stats['breaker_state'] == 'closed' and results[0]['establishment'] == 'Mercado Teste'
+        return ok, f"estado: {opened} -> {stats['breaker_state']}", stats
+
+
+def rate_limit(latency, messages):
+    """Token bucket de 600 req/min (10/s) com rajada de 2: a rajada é espaçada no cliente"""
+    with FakeGeminiServer(latency=latency) as server:
+        client = make_client(server, requests_per_minute=600, burst=2)
+        elapsed, _ = asyncio.run(analyze_all(client, [f"mercado {i},90" for i in range(messages)]))
+        stats = client.resilience.stats()
+        expected = (messages - 2) / 10
+        ok = stats.get('throttled') == messages - 2 and elapsed >= expected * 0.9
+        return ok, f"{messages} mensagens em {elapsed:.2f} s (mínimo teórico {expected:.2f} s)", stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="latência simulada do Gemini (s)")
+    parser.add_argument("--messages", type=int, default=10)
+    args = parser.parse_args()
+    # Os avisos de tentativa/circuito são esperados; o resumo de cada cenário basta
+    logging.basicConfig(level=logging.ERROR)
+
+    scenarios = (
+        ("erros transitórios", lambda: transient_errors(args.latency)),
+        ("indisponibilidade", lambda: outage(args.latency, args.messages)),
+        ("recuperação", lambda: recovery(args.latency)),
+        ("limite de taxa", lambda: rate_limit(args.latency, args.messages)),
+    )
+    failures = 0
+    for label, scenario in scenarios:
+        ok, summary, stats = scenario()
+        failures += not ok
+        print(f"[{'OK' if ok else 'FALHOU'}] {label}: {summary}")
+        print(f"       {stats}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Mede o efeito do pré-processamento de imagens em fotos sintéticas de recibos
+(tamanho enviado ao Gemini, tamanho em base64 e tempo de CPU por imagem).
+
+Uso:
+    python benchmarks/bench_image_preprocessing.py --images 5 --width 3000 --height 4000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from image_preprocessing import preprocess_receipt_image  # noqa: E402
+
+
+def synthetic_receipt(width, height, seed):
+    """Foto colorida com ruído de sensor e linhas de texto, como uma foto de celular"""
+    noise = Image.effect_noise((width, height), 40 + seed % 10).convert('RGB')
+    paper = Image.new('RGB', (width, height), (225, 215, 200))
+    image = Image.blend(paper, noise, 0.25)
+    draw = ImageDraw.Draw(image)
+    for line in range(40):
+        y = 100 + line * (height - 200) // 40
+        draw.text((width // 10, y), f"ITEM {line + seed:03d} ........ R$ {line * 3.17:8.2f}", fill=(20, 20, 20))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=4000)
+    parser.add_argument("--format", default="JPEG", choices=["JPEG", "WEBP"])
+    args = parser.parse_args()
+
+    total_before = total_after = total_time = 0
+    for i in range(args.images):
+        original = synthetic_receipt(args.width, args.height, i)
+        start = time.perf_counter()
+        result = preprocess_receipt_image(original, output_format=args.format)
+        elapsed = time.perf_counter() - start
+
+        total_before += len(original)
+        total_after += result.output_bytes
+        total_time += elapsed
+        print(f"imagem {i}: {len(original):>9,} -> {result.output_bytes:>7,} bytes "
+              f"({result.width}x{result.height}, q={result.quality}) em {elapsed * 1000:.0f} ms")
+
+    base64_before = total_before * 4 // 3
+    base64_after = total_after * 4 // 3
+    print(f"total: {total_before:,} -> {total_after:,} bytes ({total_after / total_before:.1%}); "
+          f"base64: {base64_before:,} -> {base64_after:,}; "
+          f"{total_time / args.images * 1000:.0f} ms/imagem")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Mede o parser local contra um corpus rotulado: acurácia das respostas locais,
+parcela de mensagens que dispensa o Gemini e tempo por mensagem.
+
+Uso:
+    python benchmarks/bench_local_parser.py --threshold 0.8 [--verbose]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_parser import parse_transaction_text  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "local_parser_corpus.jsonl")
+# Data de referência usada nos rótulos do corpus (uma quarta-feira)
+CORPUS_TODAY = date(2025, 9, 10)
+
+
+def is_correct(data, expected):
+    return (
+        abs(data["total_amount"] - expected["total_amount"]) < 0.005
+        and data["category"] == expected["category"]
+        and data["date"] == expected["date"]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=0.8, help="confiança mínima para responder localmente")
+    parser.add_argument("--verbose", action="store_true", help="lista os erros")
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    local = local_correct = overall_correct = 0
+    start = time.perf_counter()
+    results = [parse_transaction_text(entry["text"], today=CORPUS_TODAY) for entry in corpus]
+    elapsed = time.perf_counter() - start
+
+    for entry, result in zip(corpus, results):
+        correct = is_correct(result.data, entry)
+        overall_correct += correct
+        if result.confidence >= args.threshold:
+            local += 1
+            local_correct += correct
+            if not correct and args.verbose:
+                print(f"ERRO LOCAL ({result.confidence}): {entry['text']!r} -> "
+                      f"{result.data['total_amount']} {result.data['category']} {result.data['date']}")
+        elif args.verbose:
+            print(f"para o Gemini ({result.confidence}): {entry['text']!r}")
+
+    print(f"corpus: {len(corpus)} mensagens | limiar de confiança: {args.threshold}")
+    print(f"respondidas localmente: {local} ({local / len(corpus):.0%}) | "
+          f"acurácia local: {local_correct / local if local else 0:.1%}")
+    print(f"acurácia do parser em todo o corpus: {overall_correct / len(corpus):.1%}")
+    print(f"tempo médio: {elapsed / len(corpus) * 1e6:.0f} µs/mensagem")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Custo da instrumentação por etapa (metrics.py): um bloco `with metrics.timed(...)` com a
+coleta ativa e desativada, a partir de várias threads, e o tempo de gerar o texto do
+/metrics. Confere também o exportador HTTP usado pelo bot por polling.
+
+Uso:
+    python benchmarks/bench_metrics.py --iterations 200000 --threads 4
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import MetricsRegistry, start_exporter  # noqa: E402
+
+STAGES = ('download', 'stt', 'gemini', 'json_extract', 'db_write', 'send_message')
+
+
+def timed_loop(registry, iterations):
+    for i in range(iterations):
+        with registry.timed(STAGES[i % len(STAGES)]):
+            pass
+
+
+def empty_loop(iterations):
+    for i in range(iterations):
+        STAGES[i % len(STAGES)]
+
+
+def per_call(func, iterations, threads):
+    workers = [threading.Thread(target=func, args=(iterations,)) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (iterations * threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    enabled, disabled = MetricsRegistry(enabled=True), MetricsRegistry(enabled=False)
+    baseline = per_call(empty_loop, args.iterations, args.threads)
+    on = per_call(lambda n: timed_loop(enabled, n), args.iterations, args.threads) - baseline
+    off = per_call(lambda n: timed_loop(disabled, n), args.iterations, args.threads) - baseline
+
+    expected = args.iterations * args.threads
+    recorded = sum(enabled.stage_seconds.count(stage) for stage in STAGES)
+
+    start = time.perf_counter()
+    text = enabled.render()
+    render = time.perf_counter() - start
+
+    server = start_exporter(0, host='127.0.0.1', registry=enabled)
+    with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+        exported = response.read().decode()
+    server.shutdown()
+
+    print(f"{args.threads} threads x {args.iterations} blocos timed()")
+    print(f"coleta ativa     {on * 1e6:6.2f} µs/bloco | observações: {recorded}/{expected}")
+    print(f"coleta desativada {off * 1e6:5.2f} µs/bloco")
+    print(f"/metrics: {len(text.splitlines())} linhas em {render * 1000:.2f} ms | "
+          f"exportador HTTP: {'ok' if exported == text else 'divergente'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Roteamento de modelos e rodízio de chaves (gemini_routing.py) contra o Gemini falso, com
+latência por modelo (`--flash-latency`, `--lite-latency`) e cota por minuto de cada chave em
+cada modelo (`--key-rpm`, 429 com Retry-After acima dela). Uma carga mista de textos curtos,
+recibos longos em texto e fotos é enviada com até `--concurrency` análises simultâneas:
+
+- tudo no flash com uma chave (como antes do roteador);
+- roteado (textos curtos no modelo leve) com uma chave;
+- roteado com `--keys` chaves.
+
+Para cada configuração: mensagens respondidas pelo Gemini (as demais caíram no parser local
+ou falharam ao esgotar a cota), latência p50/p95 das respondidas por tipo de entrada, 429
+recebidos, trocas de chave/nível e a latência média por nível segundo router.stats().
+
+Uso:
+    python benchmarks/bench_model_routing.py --messages 120 --keys 3 --key-rpm 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_e2e import percentile, receipt_image  # noqa: E402
+from fake_servers import FakeGeminiServer  # noqa: E402
+from gemini_routing import DEFAULT_FLASH_MODEL, DEFAULT_LITE_MODEL, ModelRouter  # noqa: E402
+from gemini_vision import GeminiAIClient  # noqa: E402
+
+SHORT_TEXTS = ("uber 32,50", "paguei 18 reais no café", "farmácia 45,90 ontem", "almoço 62,00")
+# Peso de cada tipo na carga: a maioria das mensagens são textos curtos
+MIX = ('short',) * 6 + ('long',) * 2 + ('image',) * 2
+
+
+def long_receipt(index, items=40):
+    lines = [f"SUPERMERCADO BOM PREÇO - cupom {index}"]
+    lines += [f"{i + 1:03d} PRODUTO {i + 1} UN {1 + i % 3} x {4.5 + i:.2f}" for i in range(items)]
+    lines.append(f"TOTAL R$ {sum((1 + i % 3) * (4.5 + i) for i in range(items)):.2f}")
+    return '\n'.join(lines)
+
+
+def build_workload(messages):
+    workload = []
+    for i in range(messages):
+        kind = MIX[i % len(MIX)]
+        if kind == 'short':
+            workload.append((kind, {'text_input': f"{SHORT_TEXTS[i % len(SHORT_TEXTS)]} #{i}"}))
+        elif kind == 'long':
+            workload.append((kind, {'text_input': long_receipt(i)}))
+        else:
+            workload.append((kind, {'image_bytes': receipt_image(i)}))
+    return workload
+
+
+async def run(client, workload, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(kind, document):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await client.analyze_financial_document_async(**document)
+                answered = result.get('establishment') == 'Mercado Teste'
+            except Exception:
+                answered = False
+            return kind, time.perf_counter() - start, answered
+
+    runs = await asyncio.gather(*(one(kind, document) for kind, document in workload))
+    await client.aclose()
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=120)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--keys", type=int, default=3)
+    parser.add_argument("--key-rpm", type=int, default=20, help="cota por minuto de cada chave em cada modelo")
+    parser.add_argument("--flash-latency", type=float, default=0.8)
+    parser.add_argument("--lite-latency", type=float, default=0.3)
+    args = parser.parse_args()
+    # 429 e fallbacks são esperados com uma chave só
+    logging.basicConfig(level=logging.CRITICAL)
+
+    workload = build_workload(args.messages)
+    keys = ','.join(f"fake-key-{i:04d}" for i in range(args.keys))
+    configurations = (
+        ("flash, 1 chave", dict(api_keys="fake-key-0000", lite_model='')),
+        ("roteado, 1 chave", dict(api_keys="fake-key-0000", lite_model=DEFAULT_LITE_MODEL)),
+        (f"roteado, {args.keys} chaves", dict(api_keys=keys, lite_model=DEFAULT_LITE_MODEL)),
+    )
+    model_latency = {DEFAULT_FLASH_MODEL: args.flash_latency, DEFAULT_LITE_MODEL: args.lite_latency}
+
+    print(f"mensagens: {args.messages} (curtos/longos/fotos 6:2:2) | concorrência {args.concurrency} | "
+          f"cota {args.key_rpm}/min por chave e modelo | flash {args.flash_latency:.1f} s, leve {args.lite_latency:.1f} s")
+    for label, router_options in configurations:
+        with FakeGeminiServer(model_latency=model_latency, key_rpm=args.key_rpm) as server:
+            # Parser local desativado para que todas as mensagens cheguem ao Gemini falso
+            router = ModelRouter(flash_model=DEFAULT_FLASH_MODEL, **router_options)
+            client = GeminiAIClient(keys, base_url=server.base_url, local_confidence_threshold=2, router=router)
+            start = time.perf_counter()
+            runs = asyncio.run(run(client, workload, args.concurrency))
+            elapsed = time.perf_counter() - start
+            stats = router.stats()
+
+        print(f"\n{label}: {elapsed:.1f} s | respondidas pelo Gemini {sum(answered for _, _, answered in runs)}/{len(runs)} | "
+              f"429: {server.statuses[429]} | trocas de chave {stats.get('key_failovers', 0)}, "
+              f"de nível {stats.get('tier_failovers', 0)}")
+        for kind in ('short', 'long', 'image'):
+            latencies = [seconds for run_kind, seconds, answered in runs if run_kind == kind and answered]
+            if not latencies:
+                print(f"  {kind:6} nenhuma respondida")
+                continue
+            print(f"  {kind:6} {len(latencies):3d} respondidas | p50 {percentile(latencies, 50) * 1000:6.0f} ms | "
+                  f"p95 {percentile(latencies, 95) * 1000:6.0f} ms")
+        for name, tier in stats['tiers'].items():
+            mean = f"{tier['mean_ms']:.0f} ms" if tier['mean_ms'] is not None else "-"
+            print(f"  nível {name:5} ({tier['model']}): {tier['routed']} roteadas | {tier['calls']} chamadas | "
+                  f"média {mean} | {tier['rate_limited']} x 429")
+        per_key = ', '.join(f"{key['key']}={key['requests']}" for key in stats['keys'])
+        print(f"  chamadas por chave: {per_key}")
+
+
+if __name__ == "__main__":
+    main()
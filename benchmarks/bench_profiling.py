@@ -0,0 +1,72 @@
+"""
+Custo do perfilamento sob demanda (profiling.py) sobre um handler representativo (parser
+local + resposta formatada do webhook): função intacta (PROFILE_SAMPLE_RATE=0), embrulhada
+com taxa 0 (após desligar em tempo de execução) e perfilada por cProfile e pelo amostrador
+de pilhas nas taxas pedidas. Grava o agregado (.pstats / .collapsed) no diretório indicado.
+
+Uso:
+    python benchmarks/bench_profiling.py --calls 20000 --rates 0.01 0.1 1 --output-dir /tmp/profiles
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_parser import parse_transaction_text  # noqa: E402
+from profiling import RequestProfiler  # noqa: E402
+
+TEXTS = (
+    "Gastei 45,90 no mercado hoje",
+    "uber 23.50 ontem",
+    "Almoço no restaurante R$ 62,00 dia 12/03",
+    "farmácia 18 reais",
+)
+
+
+async def handler(i):
+    result = parse_transaction_text(TEXTS[i % len(TEXTS)])
+    return f"✅ {result!r}"
+
+
+async def run(func, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        await func(i)
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20_000)
+    parser.add_argument("--rates", type=float, nargs="+", default=[0.01, 0.1, 1.0])
+    parser.add_argument("--output-dir", default="/tmp/fintracker-profiles")
+    args = parser.parse_args()
+
+    disabled = RequestProfiler(sample_rate=0)
+    runtime_off = RequestProfiler(sample_rate=0)
+
+    baseline = asyncio.run(run(handler, args.calls))
+    intact = asyncio.run(run(disabled.maybe_wrap(handler), args.calls))
+    wrapped = asyncio.run(run(runtime_off.wrap(handler), args.calls))
+    print(f"handler sem perfil         {baseline * 1e6:7.2f} µs/chamada")
+    print(f"PROFILE_SAMPLE_RATE=0      {intact * 1e6:7.2f} µs/chamada "
+          f"({'função intacta' if disabled.maybe_wrap(handler) is handler else 'embrulhada'})")
+    print(f"embrulhado, taxa 0         {wrapped * 1e6:7.2f} µs/chamada (+{(wrapped - baseline) * 1e6:.2f} µs)")
+
+    for mode in ('cprofile', 'sample'):
+        for rate in args.rates:
+            profiler = RequestProfiler(sample_rate=rate, mode=mode, output_dir=args.output_dir, interval_ms=1)
+            per_call = asyncio.run(run(profiler.wrap(handler), args.calls))
+            stats = profiler.stats()
+            paths = profiler.dump()
+            print(f"{mode:8} taxa {rate:<5}        {per_call * 1e6:7.2f} µs/chamada "
+                  f"(x{per_call / baseline:.1f}) | perfilados {stats['profiled']} | amostras {stats['samples']} | "
+                  f"{', '.join(os.path.basename(path) for path in paths) or 'nada gravado'}")
+            time.sleep(1)  # nomes dos arquivos têm resolução de segundos
+
+
+if __name__ == "__main__":
+    main()
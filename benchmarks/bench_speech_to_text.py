@@ -0,0 +1,103 @@
+"""
+Vazão da transcrição (segundos de áudio por segundo de relógio) com o backend simulado,
+que consome CPU proporcional à duração do áudio (STT_SIMULATED_RTF), para cada tamanho
+do pool de processos (0 = uma thread no processo atual). Os clipes são WAVs sintéticos
+com silêncio no início e no fim, cortado antes do reconhecimento.
+
+Uso:
+    python benchmarks/bench_speech_to_text.py --clips 16 --seconds 8 --rtf 0.1 --workers 0 1 2 4
+"""
+import argparse
+import asyncio
+import io
+import math
+import os
+import sys
+import time
+import wave
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SAMPLE_RATE = 16000
+
+
+def make_clip(seconds, silence=1.0, frequency=220.0):
+    """WAV PCM 16 bits mono: silêncio, tom modulado (imitando fala), silêncio"""
+    speech = int(seconds * SAMPLE_RATE)
+    pad = int(silence * SAMPLE_RATE)
+    samples = array('h', bytes(2 * pad))
+    samples.extend(
+        int(8000 * math.sin(2 * math.pi * frequency * i / SAMPLE_RATE) * (0.6 + 0.4 * math.sin(i / 800)))
+        for i in range(speech)
+    )
+    samples.extend(array('h', bytes(2 * pad)))
+    if sys.byteorder == 'big':
+        samples.byteswap()
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+async def watch_loop_lag(interval, lags):
+    """Atraso do event loop (o que o bot sentiria ao atender outros chats)"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(stt, clips):
+    # Aquece o pool (spawn dos processos) fora da medida
+    await asyncio.gather(*(stt.transcribe_audio_async(clips[0]) for _ in range(max(1, stt.process_workers))))
+    audio_before = stt.audio_seconds
+    lags = []
+    watcher = asyncio.create_task(watch_loop_lag(0.01, lags))
+    start = time.perf_counter()
+    texts = await asyncio.gather(*(stt.transcribe_audio_async(clip) for clip in clips))
+    elapsed = time.perf_counter() - start
+    watcher.cancel()
+    return elapsed, stt.audio_seconds - audio_before, texts, max(lags, default=0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=8.0, help="duração da fala em cada clipe")
+    parser.add_argument("--silence", type=float, default=1.0, help="silêncio no início e no fim (s)")
+    parser.add_argument("--rtf", type=float, default=0.1, help="fator de tempo real do backend simulado")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    args = parser.parse_args()
+
+    # Lido também pelos processos do pool (herdam o ambiente)
+    os.environ['STT_SIMULATED_RTF'] = str(args.rtf)
+    from speech_to_text import SpeechToText, decode_audio, trim_silence
+
+    clips = [make_clip(args.seconds, args.silence, 180 + 20 * i) for i in range(args.clips)]
+
+    start = time.perf_counter()
+    samples, rate = decode_audio(clips[0])
+    trimmed = trim_silence(samples, rate)
+    prepare = time.perf_counter() - start
+    print(f"clipes: {args.clips} x {len(samples) / rate:.1f} s | corte de silêncio: "
+          f"{len(samples) / rate:.1f} s -> {len(trimmed) / rate:.1f} s | decodificação + corte: "
+          f"{prepare * 1000:.1f} ms/clipe | cpus: {os.cpu_count()}")
+
+    for workers in args.workers:
+        stt = SpeechToText(backend='simulated', process_workers=workers)
+        try:
+            elapsed, audio_seconds, texts, max_lag = asyncio.run(run(stt, clips))
+        finally:
+            stt.close()
+        label = "thread" if workers == 0 else f"{workers} processo(s)"
+        print(f"{label:13} {elapsed:6.2f} s | {audio_seconds / elapsed:7.1f} s de áudio/s | "
+              f"atraso máx. do event loop {max_lag * 1000:6.1f} ms | {len(texts)} transcrições")
+
+
+if __name__ == "__main__":
+    main()
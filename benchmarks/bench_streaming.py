@@ -0,0 +1,148 @@
+"""
+Streaming das respostas do Gemini (streamGenerateContent) contra os servidores falsos, com
+um recibo longo de `--items` itens gerado em `--latency` segundos:
+
+- cliente: tempo até o primeiro parcial útil (estabelecimento e total) e até o resultado
+  final, com e sem streaming, conferindo que o resultado final é o mesmo;
+- stream cortado: a primeira resposta de algumas mensagens (menos que o limiar do circuit
+  breaker, senão o circuito abre e tudo cai no fallback) para com um evento `data:` truncado,
+  que deve virar nova tentativa com o mesmo resultado final; o benchmark falha se não virar;
+- bot: tempo até a mensagem de "processando" ser editada com o total e até a confirmação,
+  com BOT_STREAM_RESPONSES=1 e 0, e o número de edições.
+
+Uso:
+    python benchmarks/bench_streaming.py --messages 5 --items 40 --latency 3
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_bot_concurrency import TOKEN, make_update  # noqa: E402
+from bench_structured_output import make_transaction  # noqa: E402
+from fake_servers import FakeGeminiServer, FakeTelegramServer  # noqa: E402
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2] if ordered else float('nan')
+
+
+async def analyze(client, text, stream):
+    start = time.perf_counter()
+    first_useful = None
+
+    def on_partial(partial):
+        nonlocal first_useful
+        if first_useful is None and 'establishment' in partial and 'total_amount' in partial:
+            first_useful = time.perf_counter() - start
+
+    if stream:
+        result = await client.analyze_financial_document_stream(text_input=text, on_partial=on_partial)
+    else:
+        result = await client.analyze_financial_document_async(text_input=text)
+    total = time.perf_counter() - start
+    return (first_useful if first_useful is not None else total), total, result
+
+
+async def run_client(gemini_url, messages, stream, gemini=None):
+    from gemini_vision import GeminiAIClient
+    # Parser local desativado para que todas as mensagens cheguem ao Gemini falso
+    client = GeminiAIClient("fake-key", base_url=gemini_url, local_confidence_threshold=2)
+    if gemini is not None:
+        # Streams cortados ao mesmo tempo são falhas consecutivas: abaixo do limiar do breaker
+        gemini.truncated_streams = min(messages, client.resilience.breaker.failure_threshold - 1)
+    runs = await asyncio.gather(*(analyze(client, f"recibo do mercado #{i}", stream) for i in range(messages)))
+    await client.aclose()
+    return runs
+
+
+async def run_bot(gemini_url, telegram, messages):
+    from telegram import Update
+    from gemini_vision import GeminiAIClient
+    from telegram_bot import TelegramBot
+
+    bot = TelegramBot(TOKEN, GeminiAIClient("fake-key", base_url=gemini_url))
+    application = bot.application
+    await application.initialize()
+    await application.start()
+
+    sent_before, edited_before = len(telegram.sent_at), len(telegram.edited_at)
+    start = time.perf_counter()
+    for i in range(messages):
+        application.update_queue.put_nowait(Update.de_json(make_update(i, 7000 + i, 0), application.bot))
+    # Cada mensagem gera "Processando..." e a confirmação
+    while len(telegram.sent_at) - sent_before < 2 * messages:
+        await asyncio.sleep(0.01)
+
+    first_total, confirmed = {}, {}
+    for request, at in zip(telegram.edited_messages[edited_before:], telegram.edited_at[edited_before:]):
+        if 'R$' in request.get('text', ''):
+            first_total.setdefault(request['chat_id'], at - start)
+    for request, at in zip(telegram.sent_messages[sent_before:], telegram.sent_at[sent_before:]):
+        confirmed[request['chat_id']] = at - start
+
+    await application.stop()
+    await application.shutdown()
+    await bot._on_shutdown(application)
+    return list(first_total.values()), list(confirmed.values()), len(telegram.edited_at) - edited_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--items", type=int, default=40, help="itens do recibo devolvido pelo Gemini falso")
+    parser.add_argument("--latency", type=float, default=3.0, help="tempo de geração da resposta inteira (s)")
+    parser.add_argument("--chunk-chars", type=int, default=80, help="caracteres por evento SSE")
+    parser.add_argument("--edit-interval", type=float, default=1.0, help="BOT_STREAM_EDIT_INTERVAL (s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    transaction = make_transaction(args.items)
+    print(f"mensagens: {args.messages} | recibo com {args.items} itens | geração em {args.latency:.1f} s")
+
+    with FakeGeminiServer(latency=args.latency, transaction=transaction, stream_chunk_chars=args.chunk_chars) as gemini, \
+            FakeTelegramServer(latency=0.005) as telegram:
+        results = {}
+        for stream in (False, True):
+            runs = asyncio.run(run_client(gemini.base_url, args.messages, stream))
+            results[stream] = [result for _, _, result in runs]
+            label = "streaming" if stream else "sem streaming"
+            print(f"[cliente] {label:13} primeiro parcial útil {median([r[0] for r in runs]) * 1000:7.0f} ms | "
+                  f"resultado final {median([r[1] for r in runs]) * 1000:7.0f} ms (medianas)")
+        same = all(a == b for a, b in zip(results[False], results[True]))
+        print(f"[cliente] resultado final idêntico nos dois modos: {'sim' if same else 'NÃO'}")
+
+        before = gemini.stream_requests
+        runs = asyncio.run(run_client(gemini.base_url, args.messages, True, gemini=gemini))
+        requests = gemini.stream_requests - before
+        same = all(result == expected for (_, _, result), expected in zip(runs, results[False]))
+        print(f"[cliente] stream cortado    resultado final {median([r[1] for r in runs]) * 1000:7.0f} ms | "
+              f"{requests} requisições para {args.messages} mensagens | "
+              f"resultado idêntico: {'sim' if same else 'NÃO'}")
+        if not same or gemini.truncated_streams:
+            sys.exit("stream cortado não foi repetido com o mesmo resultado (fallback ou breaker aberto)")
+
+        for stream in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                os.environ.update({
+                    'DATABASE_PATH': os.path.join(tmp, 'financial_data.db'),
+                    'TELEGRAM_API_BASE': telegram.base_url,
+                    'LOCAL_PARSER_MIN_CONFIDENCE': '2',
+                    'BOT_STREAM_RESPONSES': '1' if stream else '0',
+                    'BOT_STREAM_EDIT_INTERVAL': str(args.edit_interval),
+                })
+                first_total, confirmed, edits = asyncio.run(run_bot(gemini.base_url, telegram, args.messages))
+            label = "streaming" if stream else "sem streaming"
+            first = f"{median(first_total) * 1000:7.0f} ms" if first_total else "      -   "
+            print(f"[bot]     {label:13} total na tela {first} | confirmação {median(confirmed) * 1000:7.0f} ms | "
+                  f"{edits / args.messages:.1f} edições/msg")
+
+
+if __name__ == "__main__":
+    main()
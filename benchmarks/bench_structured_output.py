@@ -0,0 +1,132 @@
+"""
+Compara os prompts em texto livre (GEMINI_STRUCTURED_OUTPUT=0, JSON extraído por regex) com
+o modo JSON com responseSchema contra o Gemini falso: tokens de prompt e de resposta por
+requisição (usageMetadata), bytes enviados, taxa de fallback por JSON inválido (o modelo em
+texto livre trunca `--malformed-rate` das respostas) e o custo de extrair e validar o resultado.
+
+Uso:
+    python benchmarks/bench_structured_output.py --messages 40 --items 12 --malformed-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis_schema import AnalysisResult  # noqa: E402
+from fake_servers import DEFAULT_TRANSACTION, IMAGE_TOKENS, FakeGeminiServer, estimate_tokens  # noqa: E402
+from gemini_vision import GeminiAIClient  # noqa: E402
+from metrics import metrics  # noqa: E402
+
+TEXTS = (
+    "paguei 32,50 no uber ontem",
+    "comprei um mouse sem fio Logitech M650 por 200 reais na Kabum",
+    "mercado: arroz 5kg 27,90, feijão 8,49, leite 6 un 29,94, café 18,90, pão 12,00",
+)
+
+
+def make_transaction(items):
+    entries = [
+        {"description": f"Produto {i + 1}", "quantity": 1 + i % 3, "unit_price": 4.5 + i,
+         "total_price": round((1 + i % 3) * (4.5 + i), 2), "category": "Mercado"}
+        for i in range(items)
+    ]
+    return dict(DEFAULT_TRANSACTION, items=entries, total_amount=round(sum(e["total_price"] for e in entries), 2))
+
+
+async def analyze_all(client, texts):
+    results = await asyncio.gather(*(client.analyze_financial_document_async(text_input=text) for text in texts))
+    await client.aclose()
+    return results
+
+
+def image_prompt_tokens(client):
+    """Tokens de prompt de uma análise de imagem (estimados como no Gemini falso)"""
+    body = client._build_image_request(SimpleNamespace(mime_type='image/jpeg', data=b'\0'))
+    tokens = sum(estimate_tokens(part['text']) if 'text' in part else IMAGE_TOKENS
+                 for part in body['contents'][0]['parts'])
+    schema = body.get('generationConfig', {}).get('responseSchema')
+    return tokens + (estimate_tokens(json.dumps(schema)) if schema else 0)
+
+
+def run(structured, texts, transaction, latency, malformed_rate, seed):
+    with FakeGeminiServer(latency=latency, transaction=transaction, malformed_rate=malformed_rate, seed=seed) as server:
+        # Parser local desativado para que todas as mensagens cheguem ao Gemini falso
+        client = GeminiAIClient(
+            "fake-key", base_url=server.base_url, local_confidence_threshold=2, structured_output=structured
+        )
+        fallbacks_before = metrics.fallbacks.value('invalid_json')
+        results = asyncio.run(analyze_all(client, texts))
+        fallbacks = metrics.fallbacks.value('invalid_json') - fallbacks_before
+        complete = sum(1 for result in results if len(result.get('items') or []) == len(transaction['items']))
+        return {
+            'prompt_tokens': client.prompt_tokens / len(texts),
+            'response_tokens': client.response_tokens / len(texts),
+            'image_prompt_tokens': image_prompt_tokens(client),
+            'bytes_sent': server.bytes_received / len(texts),
+            'fallback_rate': fallbacks / len(texts),
+            'complete': complete,
+        }
+
+
+def extraction_cost(transaction, iterations):
+    """µs por resposta: regex + json.loads no texto livre x json.loads + validação no modo JSON"""
+    freeform = f"```json\n{json.dumps(transaction, ensure_ascii=False, indent=2)}\n```"
+    compact = json.dumps(transaction, ensure_ascii=False)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        json.loads(re.search(r'\{.*\}', freeform, re.DOTALL).group())
+    legacy = (time.perf_counter() - start) / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        AnalysisResult.from_dict(json.loads(compact)).to_dict()
+    structured = (time.perf_counter() - start) / iterations
+    return legacy, structured
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--items", type=int, default=12, help="itens na transação devolvida pelo Gemini falso")
+    parser.add_argument("--malformed-rate", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Os fallbacks por JSON inválido são esperados aqui
+    logging.getLogger('gemini_vision').setLevel(logging.CRITICAL)
+
+    texts = [TEXTS[i % len(TEXTS)] + f" #{i}" for i in range(args.messages)]
+    transaction = make_transaction(args.items)
+    modes = {
+        'texto livre': run(False, texts, transaction, args.latency, args.malformed_rate, args.seed),
+        'modo JSON': run(True, texts, transaction, args.latency, args.malformed_rate, args.seed),
+    }
+
+    print(f"mensagens: {args.messages} | itens por transação: {args.items} | "
+          f"respostas truncadas no texto livre: {args.malformed_rate:.0%}")
+    for label, result in modes.items():
+        print(f"{label:12} prompt {result['prompt_tokens']:6.0f} tok | resposta {result['response_tokens']:5.0f} tok | "
+              f"imagem {result['image_prompt_tokens']:4d} tok | {result['bytes_sent']:6.0f} bytes/req | "
+              f"fallback {result['fallback_rate']:5.1%} | {result['complete']}/{args.messages} com todos os itens")
+
+    legacy, structured = modes['texto livre'], modes['modo JSON']
+    for key, label in (('prompt_tokens', 'prompt'), ('response_tokens', 'resposta'), ('image_prompt_tokens', 'imagem')):
+        print(f"redução de tokens ({label}): {1 - structured[key] / legacy[key]:.0%}")
+
+    legacy_cost, structured_cost = extraction_cost(transaction, args.iterations)
+    print(f"extração: regex + json.loads {legacy_cost * 1e6:.1f} µs | json.loads + validação tipada "
+          f"{structured_cost * 1e6:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
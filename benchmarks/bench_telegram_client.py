@@ -0,0 +1,88 @@
+"""
+Compara o acesso à Bot API do webhook: um httpx.AsyncClient novo por chamada (como antes)
+versus o TelegramAPI compartilhado (pool keep-alive + cache de getFile por file_unique_id),
+contra um Telegram falso local. Cada update baixa uma foto e envia uma resposta.
+
+Contra o servidor local não há DNS nem TLS: o custo real de cada conexão nova é maior.
+
+Uso:
+    python benchmarks/bench_telegram_client.py --updates 100 --distinct-files 50 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_servers import FakeTelegramServer  # noqa: E402
+from telegram_api import TelegramAPI  # noqa: E402
+
+TOKEN = "123:fake"
+
+
+class PerCallClient:
+    """Comportamento anterior do webhook: um cliente (e conexões) novo por chamada"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    async def download_file(self, file_id, file_unique_id=None):
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            r = await client.get(f"{self.base_url}/bot{TOKEN}/getFile", params={"file_id": file_id})
+            r.raise_for_status()
+            file_path = r.json()['result']['file_path']
+            r2 = await client.get(f"{self.base_url}/file/bot{TOKEN}/{file_path}")
+            r2.raise_for_status()
+            return r2.content
+
+    async def send_message(self, chat_id, text):
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            await client.post(f"{self.base_url}/bot{TOKEN}/sendMessage", json={"chat_id": chat_id, "text": text})
+
+    async def aclose(self):
+        pass
+
+
+async def run(api, updates, distinct_files, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def handle(i):
+        async with semaphore:
+            file_number = i % distinct_files
+            await api.download_file(f"file-{file_number}-{i}", f"unique-{file_number}")
+            await api.send_message(1000 + i, "✅ Transação registrada com sucesso!")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handle(i) for i in range(updates)))
+    elapsed = time.perf_counter() - start
+    await api.aclose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--distinct-files", type=int, default=50, help="mídias diferentes (o resto são repetições)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.01, help="latência simulada por chamada (s)")
+    args = parser.parse_args()
+
+    print(f"updates: {args.updates} | mídias distintas: {args.distinct_files} | "
+          f"concorrência: {args.concurrency} | latência simulada: {args.latency * 1000:.0f} ms")
+    for label, factory in (
+        ("cliente por chamada", PerCallClient),
+        ("cliente compartilhado", lambda base_url: TelegramAPI(TOKEN, base_url=base_url)),
+    ):
+        with FakeTelegramServer(latency=args.latency) as server:
+            elapsed = asyncio.run(run(factory(server.base_url), args.updates, args.distinct_files, args.concurrency))
+            calls = sum(server.calls.values())
+            print(f"{label:22} {elapsed:.2f} s | {server.connections:4} conexões | {calls:4} chamadas "
+                  f"(getFile {server.calls['getFile']}) | {calls / args.updates:.2f} chamadas/update")
+
+
+if __name__ == "__main__":
+    main()
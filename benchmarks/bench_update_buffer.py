@@ -0,0 +1,88 @@
+"""
+Custo por requisição do registro de updates para debug: gravação síncrona do
+last_update.json (como antes) versus o buffer circular em memória, mais o custo
+de ler (com redação) e do flush em JSONL sob demanda.
+
+Uso:
+    python benchmarks/bench_update_buffer.py --updates 5000 --sample-rate 1.0
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from update_buffer import UpdateBuffer  # noqa: E402
+
+
+def make_update(update_id):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'from': {'id': 77, 'first_name': 'Maria', 'username': 'maria'},
+            'chat': {'id': 77, 'type': 'private', 'first_name': 'Maria'},
+            'date': 1700000000 + update_id,
+            'text': f'mercado pão de açúcar {update_id},90',
+        }
+    }
+
+
+def dump_last_update(update, path):
+    """Comportamento anterior do webhook"""
+    dirp = os.path.dirname(path)
+    if dirp:
+        os.makedirs(dirp, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(update, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--capacity", type=int, default=100)
+    parser.add_argument("--sample-rate", type=float, default=1.0)
+    args = parser.parse_args()
+
+    updates = [make_update(i) for i in range(args.updates)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'last_update.json')
+        start = time.perf_counter()
+        for update in updates:
+            dump_last_update(update, path)
+        dump_cost = (time.perf_counter() - start) / args.updates
+
+        buffer = UpdateBuffer(capacity=args.capacity, sample_rate=args.sample_rate,
+                              dump_path=os.path.join(tmp, 'recent_updates.jsonl'))
+        files_before = set(os.listdir(tmp))
+        start = time.perf_counter()
+        for update in updates:
+            buffer.record(update)
+        record_cost = (time.perf_counter() - start) / args.updates
+        hot_path_files = set(os.listdir(tmp)) - files_before
+
+        start = time.perf_counter()
+        snapshot = buffer.snapshot()
+        snapshot_cost = time.perf_counter() - start
+
+        start = time.perf_counter()
+        dump_path, count = asyncio.run(buffer.flush())
+        flush_cost = time.perf_counter() - start
+        flushed_lines = sum(1 for _ in open(dump_path, encoding='utf-8'))
+
+    print(f"updates: {args.updates} | buffer: {args.capacity} | amostragem: {args.sample_rate}")
+    print(f"last_update.json (síncrono) {dump_cost * 1e6:8.1f} µs/update")
+    print(f"buffer em memória          {record_cost * 1e6:8.2f} µs/update "
+          f"({dump_cost / record_cost:.0f}x) | arquivos criados no caminho quente: {len(hot_path_files)}")
+    print(f"snapshot com redação: {len(snapshot)} updates em {snapshot_cost * 1000:.2f} ms | "
+          f"exemplo: {snapshot[0]['update']['message']['text'] if snapshot else '-'}")
+    print(f"flush JSONL: {count} linhas ({flushed_lines} no arquivo) em {flush_cost * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
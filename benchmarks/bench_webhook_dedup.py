@@ -0,0 +1,94 @@
+"""
+Reentregas e edições no webhook: cada update é enviado várias vezes (como nas
+retentativas do Telegram) e parte das mensagens é editada depois. Confere quantas
+transações e chamadas ao Gemini resultam e mede o custo da verificação de duplicatas.
+
+Uso:
+    python benchmarks/bench_webhook_dedup.py --updates 30 --deliveries 3 --edits 5
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_servers import FakeGeminiServer  # noqa: E402
+
+CHAT_ID = 4242
+
+
+def message_update(update_id, message_id, text, edited=False):
+    key = 'edited_message' if edited else 'message'
+    return {'update_id': update_id, key: {'message_id': message_id, 'chat': {'id': CHAT_ID}, 'text': text}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=30)
+    parser.add_argument("--deliveries", type=int, default=3, help="vezes que cada update é entregue")
+    parser.add_argument("--edits", type=int, default=5, help="mensagens editadas depois de gravadas")
+    parser.add_argument("--latency", type=float, default=0.05, help="latência simulada do Gemini (s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp, FakeGeminiServer(latency=args.latency) as server:
+        os.environ.update({
+            'DATABASE_PATH': os.path.join(tmp, 'financial_data.db'),
+            'GEMINI_API_KEY': 'fake-key',
+            'GEMINI_API_BASE': server.base_url,
+            # Parser local desativado para que todas as mensagens cheguem ao Gemini falso
+            'LOCAL_PARSER_MIN_CONFIDENCE': '2',
+            'JOB_POLL_INTERVAL': '0.05',
+        })
+        os.environ.pop('TELEGRAM_BOT_TOKEN', None)
+
+        from fastapi.testclient import TestClient
+        from api import webhook
+
+        def drain():
+            while webhook.get_job_queue().stats()['pending'] or webhook.get_job_queue().stats()['running']:
+                time.sleep(0.01)
+
+        with TestClient(webhook.app) as client:
+            for update_id in range(args.updates):
+                for _ in range(args.deliveries):
+                    client.post('/api/webhook', json=message_update(update_id, update_id, f'mercado {update_id},90'))
+            drain()
+
+            # Edições (também reentregues): o valor muda na transação original
+            for message_id in range(args.edits):
+                update = message_update(10_000 + message_id, message_id, f'mercado {message_id + 100},90', edited=True)
+                for _ in range(args.deliveries):
+                    client.post('/api/webhook', json=update)
+            drain()
+
+            # Custo da verificação: update novo (grava no SQLite) e duplicata (LRU em memória)
+            store = webhook.get_idempotency()
+            samples = 2000
+            start = time.perf_counter()
+            for update_id in range(1_000_000, 1_000_000 + samples):
+                store.claim_update(update_id)
+            new_cost = (time.perf_counter() - start) / samples
+            start = time.perf_counter()
+            for update_id in range(1_000_000, 1_000_000 + samples):
+                store.claim_update(update_id)
+            duplicate_cost = (time.perf_counter() - start) / samples
+
+        transactions = webhook.get_db().get_transactions(CHAT_ID, limit=10 * args.updates)
+        raw_texts = {t[7] for t in transactions}
+        edited_ok = sum(1 for m in range(args.edits) if f'mercado {m + 100},90' in raw_texts)
+
+    expected_calls = args.updates + args.edits
+    print(f"updates: {args.updates} x {args.deliveries} entregas | edições: {args.edits} x {args.deliveries}")
+    print(f"transações gravadas: {len(transactions)} (esperado {args.updates}) | "
+          f"edições aplicadas: {edited_ok}/{args.edits}")
+    print(f"chamadas ao Gemini: {server.request_count} (esperado {expected_calls}, "
+          f"sem deduplicação {expected_calls * args.deliveries})")
+    print(f"verificação: update novo {new_cost * 1e6:.0f} µs | duplicata {duplicate_cost * 1e6:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Latência de confirmação do webhook: processamento inline (como antes da fila)
+versus gravar o update na fila de jobs e responder, com o worker em segundo plano.
+
+Usa um Gemini falso local e bancos temporários; sem TELEGRAM_BOT_TOKEN as
+respostas ao usuário são apenas registradas em log.
+
+Uso:
+    python benchmarks/bench_webhook_queue.py --updates 50 --latency 0.2 --concurrency 8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_servers import FakeGeminiServer  # noqa: E402
+
+
+def make_update(update_id):
+    return {
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'chat': {'id': 1000 + update_id % 10}, 'text': f'mercado {update_id},90'}
+    }
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="latência simulada do Gemini (s)")
+    parser.add_argument("--concurrency", type=int, default=8, help="jobs simultâneos do worker")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp, FakeGeminiServer(latency=args.latency) as server:
+        os.environ.update({
+            'DATABASE_PATH': os.path.join(tmp, 'financial_data.db'),
+            'GEMINI_API_KEY': 'fake-key',
+            'GEMINI_API_BASE': server.base_url,
+            # Parser local desativado para que todas as mensagens cheguem ao Gemini falso
+            'LOCAL_PARSER_MIN_CONFIDENCE': '2',
+            'JOB_WORKER_CONCURRENCY': str(args.concurrency),
+            'JOB_POLL_INTERVAL': '0.05',
+        })
+        os.environ.pop('TELEGRAM_BOT_TOKEN', None)
+
+        from fastapi.testclient import TestClient
+        from api import webhook
+
+        async def inline():
+            latencies = []
+            for update_id in range(args.updates):
+                start = time.perf_counter()
+                await webhook.process_update(make_update(update_id))
+                latencies.append(time.perf_counter() - start)
+            await webhook.shutdown()
+            return latencies
+
+        inline_latencies = asyncio.run(inline())
+
+        # `with` executa o lifespan: o worker roda no event loop do TestClient
+        with TestClient(webhook.app) as client:
+            ack_latencies = []
+            start = time.perf_counter()
+            for update_id in range(args.updates, 2 * args.updates):
+                request_start = time.perf_counter()
+                client.post('/api/webhook', json=make_update(update_id))
+                ack_latencies.append(time.perf_counter() - request_start)
+            while webhook.get_job_queue().stats()['pending'] or webhook.get_job_queue().stats()['running']:
+                time.sleep(0.01)
+            drained = time.perf_counter() - start
+            stats = webhook.worker.stats()
+
+        rows = webhook.get_db().get_transactions(1000, limit=10 * args.updates)
+
+    print(f"updates: {args.updates} | latência simulada do Gemini: {args.latency * 1000:.0f} ms | "
+          f"worker com {args.concurrency} jobs simultâneos")
+    for label, latencies in (("inline", inline_latencies), ("fila (ack)", ack_latencies)):
+        print(f"{label:11} p50 {statistics.median(latencies) * 1000:7.1f} ms | "
+              f"p95 {percentile(latencies, 95) * 1000:7.1f} ms | máx {max(latencies) * 1000:7.1f} ms")
+    print(f"fila drenada em {drained:.2f} s ({args.updates / drained:.1f} updates/s) | "
+          f"processados {stats['processed']}, erros {stats['errors']} | "
+          f"{len(rows)} transações gravadas para o chat 1000")
+
+
+if __name__ == "__main__":
+    main()
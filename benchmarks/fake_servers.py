@@ -0,0 +1,422 @@
+"""
+Servidores HTTP locais que imitam APIs externas, usados pelos benchmarks.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_TRANSACTION = {
+    "establishment": "Mercado Teste",
+    "date": "2025-09-08",
+    "total_amount": 120.90,
+    "category": "Mercado",
+    "items": [
+        {
+            "description": "Compras do mês",
+            "quantity": 1,
+            "unit_price": 120.90,
+            "total_price": 120.90,
+            "category": "Mercado"
+        }
+    ],
+    "raw_text": "mercado 120,90"
+}
+
+
+# Entradas numeradas de uma requisição em lote ('1. "texto"') e texto de uma requisição simples
+BATCH_ENTRY_RE = re.compile(r'^\s*(\d+)\. (".*")\s*$', re.MULTILINE)
+SINGLE_TEXT_RE = re.compile(r'TEXTO PARA ANÁLISE: (.*)')
+
+# Tokens cobrados por imagem e aproximação de caracteres por token (usageMetadata)
+IMAGE_TOKENS = 258
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def apply_schema(value, schema):
+    """Mantém só as propriedades do responseSchema, na ordem de propertyOrdering"""
+    if schema.get("type") == "ARRAY" and isinstance(value, list):
+        return [apply_schema(entry, schema["items"]) for entry in value]
+    if schema.get("type") == "OBJECT" and isinstance(value, dict):
+        properties = schema.get("properties", {})
+        order = schema.get("propertyOrdering") or list(properties)
+        return {name: apply_schema(value[name], properties[name]) for name in order if name in value}
+    return value
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # O padrão (5) descarta conexões em rajadas e causa retransmissões de SYN de 1 s
+    request_queue_size = 128
+
+
+class FakeGeminiServer:
+    """
+    Imita os endpoints generateContent e streamGenerateContent (?alt=sse) da API Gemini.
+
+    Cada requisição espera `latency` segundos (simulando o tempo de inferência)
+    e devolve `transaction` (com o texto analisado em raw_text) como texto JSON
+    dentro de um candidato. Requisições em lote (entradas numeradas) recebem um
+    array com uma cópia por entrada, ou um objeto solto se `malformed_batches`
+    for verdadeiro.
+
+    Com generationConfig.responseMimeType = application/json a resposta é o JSON compacto,
+    só com os campos do responseSchema; sem ele, imita o texto livre do modelo (bloco
+    markdown indentado) e `malformed_rate` dessas respostas vem truncada. O usageMetadata
+    estima os tokens (~4 caracteres por token, 258 por imagem).
+
+    No streaming o texto sai em eventos SSE de `stream_chunk_chars` caracteres, espaçados
+    para que a resposta inteira leve os mesmos `latency` segundos (geração a ritmo constante).
+    As próximas `truncated_streams` respostas em streaming param na metade com um evento
+    `data:` cortado (JSON inválido) antes de encerrar o corpo.
+
+    `script` é uma lista de respostas de erro consumidas, em ordem, pelas próximas
+    requisições: um status (429, 503...) ou uma tupla (status, Retry-After).
+    `error_rate` responde 503 a essa fração das requisições (sorteio com `seed`).
+
+    `model_latency` ({modelo: segundos}) substitui `latency` para os modelos indicados e
+    `key_rpm` imita a cota por minuto de cada chave em cada modelo: acima dela a resposta é
+    429 com Retry-After até a chamada mais antiga sair da janela. `models` e `keys` contam
+    as requisições recebidas por modelo e por chave (x-goog-api-key).
+    """
+
+    def __init__(self, latency=0.2, transaction=None, host="127.0.0.1", port=0, malformed_batches=False,
+                 script=None, error_rate=0.0, seed=0, malformed_rate=0.0, stream_chunk_chars=80,
+                 model_latency=None, key_rpm=0, truncated_streams=0):
+        self.latency = latency
+        self.truncated_streams = truncated_streams
+        self.model_latency = dict(model_latency or {})
+        self.key_rpm = key_rpm
+        self.models = Counter()
+        self.keys = Counter()
+        self._key_calls = {}
+        self.transaction = transaction or DEFAULT_TRANSACTION
+        self.malformed_batches = malformed_batches
+        self.script = list(script or [])
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_requests = 0
+        self._random = random.Random(seed)
+        self.statuses = Counter()
+        self.request_count = 0
+        self.bytes_received = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._httpd = _HTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1beta"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                model = self.path.split('/models/', 1)[-1].split(':', 1)[0]
+                key = self.headers.get("x-goog-api-key", "")
+                latency = server.model_latency.get(model, server.latency)
+                with server._lock:
+                    server.request_count += 1
+                    server.bytes_received += length
+                    server.models[model] += 1
+                    server.keys[key] += 1
+                    scripted = server.script.pop(0) if server.script else None
+                    if scripted is None and server.error_rate and server._random.random() < server.error_rate:
+                        scripted = 503
+                    if scripted is None and server.key_rpm:
+                        scripted = server._check_quota(key, model)
+                    if scripted is None:
+                        server._in_flight += 1
+                        server.max_in_flight = max(server.max_in_flight, server._in_flight)
+                if scripted is not None:
+                    self._send_scripted_error(scripted)
+                    return
+                try:
+                    if ':streamGenerateContent' in self.path:
+                        self._send_stream(request, latency)
+                        return
+                    time.sleep(latency)
+                    text = server._render(request, server._answer(request))
+                    payload = {
+                        "candidates": [{"content": {"parts": [{"text": text}]}}],
+                        "usageMetadata": server._usage(request, text),
+                    }
+                    body = json.dumps(payload).encode()
+                    with server._lock:
+                        server.statuses[200] += 1
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+
+            def _send_stream(self, request, latency):
+                text = server._render(request, server._answer(request))
+                size = server.stream_chunk_chars
+                pieces = [text[i:i + size] for i in range(0, len(text), size)] or ['']
+                with server._lock:
+                    server.statuses[200] += 1
+                    server.stream_requests += 1
+                    truncated = server.truncated_streams > 0
+                    if truncated:
+                        server.truncated_streams -= 1
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for index, piece in enumerate(pieces):
+                    time.sleep(latency / len(pieces))
+                    event = {"candidates": [{"content": {"parts": [{"text": piece}], "role": "model"}}]}
+                    if index == len(pieces) - 1:
+                        event["candidates"][0]["finishReason"] = "STOP"
+                        event["usageMetadata"] = server._usage(request, text)
+                    data = f"data: {json.dumps(event)}\r\n\r\n".encode()
+                    if truncated and index == len(pieces) // 2:
+                        # Evento cortado no meio do JSON e fim do corpo
+                        data = data[:len(data) // 2] + b"\r\n\r\n"
+                        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                        break
+                    self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _send_scripted_error(self, scripted):
+                status, retry_after = scripted if isinstance(scripted, tuple) else (scripted, None)
+                body = json.dumps({"error": {"code": status, "message": "erro programado"}}).encode()
+                with server._lock:
+                    server.statuses[status] += 1
+                self.send_response(status)
+                if retry_after is not None:
+                    self.send_header("Retry-After", str(retry_after))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _check_quota(self, key, model):
+        """(429, Retry-After) se a chave já usou a cota do modelo no último minuto (com o lock)"""
+        now = time.monotonic()
+        calls = [at for at in self._key_calls.get((key, model), ()) if now - at < 60]
+        if len(calls) >= self.key_rpm:
+            self._key_calls[(key, model)] = calls
+            return 429, max(1, int(60 - (now - calls[0]) + 1))
+        calls.append(now)
+        self._key_calls[(key, model)] = calls
+        return None
+
+    def _answer(self, request):
+        try:
+            prompt = request["contents"][0]["parts"][0]["text"]
+        except (KeyError, IndexError, TypeError):
+            return self.transaction
+
+        entries = BATCH_ENTRY_RE.findall(prompt)
+        if not entries:
+            single = SINGLE_TEXT_RE.search(prompt)
+            return dict(self.transaction, raw_text=single.group(1).strip()) if single else self.transaction
+        if self.malformed_batches:
+            return self.transaction
+        return [
+            dict(self.transaction, index=int(index), raw_text=json.loads(text))
+            for index, text in entries
+        ]
+
+    def _render(self, request, answer):
+        config = request.get("generationConfig") or {}
+        if config.get("responseMimeType") == "application/json":
+            schema = config.get("responseSchema")
+            return json.dumps(apply_schema(answer, schema) if schema else answer, ensure_ascii=False)
+        text = f"```json\n{json.dumps(answer, ensure_ascii=False, indent=2)}\n```"
+        with self._lock:
+            malformed = self.malformed_rate and self._random.random() < self.malformed_rate
+        return text[:len(text) * 2 // 3] if malformed else text
+
+    def _usage(self, request, text):
+        prompt_tokens = 0
+        for content in request.get("contents", []):
+            for part in content.get("parts", []):
+                prompt_tokens += estimate_tokens(part["text"]) if "text" in part else IMAGE_TOKENS
+        schema = (request.get("generationConfig") or {}).get("responseSchema")
+        if schema:
+            prompt_tokens += estimate_tokens(json.dumps(schema))
+        response_tokens = estimate_tokens(text)
+        return {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": response_tokens,
+            "totalTokenCount": prompt_tokens + response_tokens,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeTelegramServer:
+    """
+    Imita a Bot API do Telegram: getMe, sendMessage, editMessageText, getFile e o download
+    de arquivos (/file/bot<token>/<caminho>). Conta requisições por método, conexões TCP abertas
+    e guarda as mensagens enviadas e editadas (com o instante de chegada em `sent_at`/`edited_at`).
+
+    `file_content` são os bytes de todo download ou uma função file_path -> bytes.
+    `error_rate` responde 502 a essa fração das chamadas (sorteio com `seed`).
+    """
+
+    def __init__(self, latency=0.02, file_content=None, host="127.0.0.1", port=0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.file_content = file_content or b"\xff" * 1024
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.calls = Counter()
+        self.errors = 0
+        self.connections = 0
+        self.sent_messages = []
+        self.sent_at = []
+        self.edited_messages = []
+        self.edited_at = []
+        self._lock = threading.Lock()
+        self._httpd = _HTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def _reply(self, body, content_type="application/json"):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _inject_error(self):
+                with server._lock:
+                    failed = bool(server.error_rate) and server._random.random() < server.error_rate
+                    server.errors += failed
+                if failed:
+                    self.send_error(502)
+                return failed
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                time.sleep(server.latency)
+                if self._inject_error():
+                    return
+                if url.path.startswith("/file/"):
+                    with server._lock:
+                        server.calls["download"] += 1
+                    content = server.file_content
+                    if callable(content):
+                        content = content(url.path.split("/", 3)[-1])
+                    self._reply(content, "application/octet-stream")
+                elif url.path.endswith("/getFile"):
+                    file_id = parse_qs(url.query).get("file_id", [""])[0]
+                    with server._lock:
+                        server.calls["getFile"] += 1
+                    result = {"file_id": file_id, "file_path": f"files/{file_id}"}
+                    self._reply(json.dumps({"ok": True, "result": result}).encode())
+                else:
+                    self.send_error(404)
+
+            def _read_params(self):
+                # httpx/TelegramAPI enviam JSON; o python-telegram-bot envia formulário
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                if "json" in self.headers.get("Content-Type", ""):
+                    return json.loads(body or b"{}")
+                return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+            def do_POST(self):
+                request = self._read_params()
+                time.sleep(server.latency)
+                if self._inject_error():
+                    return
+                method = urlparse(self.path).path.rsplit("/", 1)[-1]
+                with server._lock:
+                    server.calls[method] += 1
+                    if method == "sendMessage":
+                        server.sent_messages.append(request)
+                        server.sent_at.append(time.perf_counter())
+                    elif method == "editMessageText":
+                        server.edited_messages.append(request)
+                        server.edited_at.append(time.perf_counter())
+                    message_id = len(server.sent_messages)
+                if method == "getMe":
+                    result = {"id": 1, "is_bot": True, "first_name": "FinTracker", "username": "fintracker_bot"}
+                elif method in ("sendMessage", "editMessageText"):
+                    chat_id = int(request.get("chat_id") or 0)
+                    result = {"message_id": int(request.get("message_id") or message_id), "date": int(time.time()),
+                              "chat": {"id": chat_id, "type": "private"}, "text": request.get("text", "")}
+                elif method == "getFile":
+                    file_id = request.get("file_id", "")
+                    result = {"file_id": file_id, "file_unique_id": file_id, "file_path": f"files/{file_id}"}
+                else:
+                    result = True
+                self._reply(json.dumps({"ok": True, "result": result}).encode())
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,99 @@
+"""
+Camada de execução do bot por polling: pool limitado para as chamadas bloqueantes
+dos handlers e um processador de updates concorrente que preserva a ordem por chat.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# Limite de updates aguardando a vez (acima dele o PTB segura novos updates)
+MAX_PENDING_UPDATES = 4096
+
+
+class BlockingExecutor:
+    """
+    Pool de threads limitado para E/S bloqueante (SQLite) dos handlers.
+    Trabalho de CPU (transcrição) fica no pool de processos do SpeechToText.
+    """
+
+    def __init__(self, thread_workers=None):
+        self.thread_workers = int(thread_workers or os.getenv('BOT_THREAD_WORKERS', min(32, (os.cpu_count() or 1) + 4)))
+        self._threads = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix='bot-blocking')
+
+    async def run(self, func, *args, **kwargs):
+        """Executa func no pool de threads, fora do event loop"""
+        return await asyncio.get_running_loop().run_in_executor(self._threads, partial(func, *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        self._threads.shutdown(wait=wait)
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processa até `max_concurrent_updates` updates ao mesmo tempo, mas os de um mesmo chat
+    em ordem de chegada (dois recibos do mesmo usuário são gravados na ordem enviada).
+
+    O semáforo do PTB é dimensionado para a fila de espera: se ele limitasse os updates
+    em execução, mensagens de um único chat ocupariam todas as vagas esperando a vez.
+    O limite real é aplicado depois de obter a vez do chat.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        self._running_limit = max_concurrent_updates
+        super().__init__(max(MAX_PENDING_UPDATES, max_concurrent_updates))
+        self._running = None
+        self._chat_locks = {}
+        self.processed = 0
+
+    @property
+    def max_concurrent_updates(self):
+        return self._running_limit
+
+    async def initialize(self):
+        self._running = asyncio.Semaphore(self._running_limit)
+
+    async def shutdown(self):
+        pass
+
+    @staticmethod
+    def _chat_key(update):
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        if self._running is None:
+            await self.initialize()
+
+        chat_id = self._chat_key(update)
+        if chat_id is None:
+            async with self._running:
+                await coroutine
+            self.processed += 1
+            return
+
+        # asyncio.Lock atende os waiters em ordem FIFO; a entrada é removida com o último
+        entry = self._chat_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0], self._running:
+                await coroutine
+            self.processed += 1
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._chat_locks.pop(chat_id, None)
+
+    def stats(self):
+        return {
+            'max_concurrent_updates': self._running_limit,
+            'processed': self.processed,
+            'chats_waiting': len(self._chat_locks),
+        }
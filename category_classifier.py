@@ -0,0 +1,163 @@
+"""
+Classificador de categorias por palavras-chave, compilado uma única vez na importação.
+
+As palavras-chave (sem acentos) são organizadas em uma trie, convertida em uma única
+expressão regular fatorada por prefixo, com limites de palavra e plural opcional em "s".
+Cada texto é percorrido uma única vez pelo motor de regex (em C), independentemente
+do número de palavras-chave; cada ocorrência soma o peso da palavra à sua categoria.
+`classify_many` classifica cada texto distinto de um lote uma única vez (descrições
+de itens se repetem muito).
+"""
+import re
+import unicodedata
+
+DEFAULT_CATEGORY = "Outros"
+
+# Peso 1.0 para termos inequívocos; pesos menores para termos genéricos
+CATEGORY_KEYWORDS = {
+    'Mercado': {
+        'mercado': 1.0, 'supermercado': 1.0, 'hipermercado': 1.0, 'atacadao': 1.0, 'assai': 1.0,
+        'carrefour': 1.0, 'feira': 0.8, 'hortifruti': 1.0, 'sacolao': 1.0, 'acougue': 1.0,
+        'compras do mes': 1.0, 'compras': 0.4
+    },
+    'Alimentação': {
+        'restaurante': 1.0, 'lanche': 1.0, 'lanchonete': 1.0, 'pizza': 1.0, 'pizzaria': 1.0,
+        'hamburguer': 1.0, 'burger': 0.8, 'comida': 0.6, 'almoco': 1.0, 'jantar': 1.0, 'cafe': 0.6,
+        'cafe da manha': 1.0, 'padaria': 1.0, 'ifood': 1.0, 'rappi': 1.0, 'sorvete': 1.0, 'acai': 1.0,
+        'marmita': 1.0, 'pastel': 1.0, 'delivery': 0.6
+    },
+    'Transporte': {
+        'combustivel': 1.0, 'gasolina': 1.0, 'etanol': 1.0, 'diesel': 1.0, 'posto': 0.8, 'onibus': 1.0,
+        'metro': 1.0, 'taxi': 1.0, 'uber': 1.0, '99 pop': 1.0, 'estacionamento': 1.0, 'pedagio': 1.0,
+        'passagem': 0.6, 'bilhete unico': 1.0, 'ipva': 1.0, 'seguro do carro': 1.0, 'oficina': 0.6
+    },
+    'Moradia': {
+        'aluguel': 1.0, 'condominio': 1.0, 'conta de luz': 1.2, 'luz': 0.5, 'agua': 0.7,
+        'conta de agua': 1.2, 'internet': 0.8, 'energia': 0.8, 'iptu': 1.0, 'botijao': 1.0,
+        'gas de cozinha': 1.0
+    },
+    'Saúde': {
+        'farmacia': 1.0, 'drogaria': 1.0, 'remedio': 1.0, 'medico': 1.0, 'medica': 1.0, 'hospital': 1.0,
+        'consulta': 0.8, 'dentista': 1.0, 'exame': 0.8, 'academia': 0.8, 'plano de saude': 1.2
+    },
+    'Lazer': {
+        'cinema': 1.0, 'shopping': 0.5, 'parque': 0.8, 'viagem': 1.0, 'hotel': 1.0, 'show': 0.8,
+        'ingresso': 0.8, 'cerveja': 0.8, 'balada': 1.0, 'bar': 0.6
+    },
+    'Educação': {
+        'livro': 1.0, 'curso': 1.0, 'faculdade': 1.0, 'escola': 1.0, 'material escolar': 1.2,
+        'material': 0.3, 'mensalidade': 0.5
+    },
+    'Tecnologia': {
+        'celular': 1.0, 'notebook': 1.0, 'mouse': 1.0, 'teclado': 1.0, 'fone': 0.8, 'fone de ouvido': 1.2,
+        'computador': 1.0, 'monitor': 1.0, 'carregador': 0.8
+    },
+    'Serviços': {
+        'netflix': 1.0, 'spotify': 1.0, 'assinatura': 0.6, 'barbeiro': 1.0, 'cabeleireiro': 1.0,
+        'lavanderia': 1.0, 'conserto': 0.8, 'mecanico': 0.8, 'manutencao': 0.6
+    }
+}
+
+
+def _build_fold_table():
+    """Caractere latino acentuado -> letra sem acento"""
+    table = {}
+    for code in range(0xC0, 0x250):
+        char = chr(code)
+        base = ''.join(c for c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(c))
+        if base != char and base.isascii():
+            table[char] = base
+    return table
+
+
+_FOLD_TABLE = _build_fold_table()
+# Só os caracteres acentuados passam pelo Python; str.translate consultaria a tabela em cada caractere
+_ACCENTED_RE = re.compile('[' + ''.join(_FOLD_TABLE) + ']')
+
+
+def _unaccent(match):
+    return _FOLD_TABLE[match.group()]
+
+
+def fold(text):
+    """Minúsculas sem acentos ("Almoço" -> "almoco")"""
+    text = text.lower()
+    return text if text.isascii() else _ACCENTED_RE.sub(_unaccent, text)
+
+
+# Lookbehinds de largura fixa, um por dia: "segunda-", "terca-"... (texto já sem acentos)
+_WEEKDAY_LOOKBEHIND = ''.join(f'(?<!{day}-)' for day in ('segunda', 'terca', 'quarta', 'quinta', 'sexta'))
+
+
+def _trie_pattern(node):
+    """Converte um nó da trie em regex; a chave '' marca fim de palavra-chave"""
+    alternatives = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not alternatives:
+        return ''
+    pattern = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+    # Continuações (mais longas) são tentadas antes de terminar no nó atual
+    return f'(?:{pattern})?' if '' in node else pattern
+
+
+class CategoryClassifier:
+    """Casa as palavras-chave de CATEGORY_KEYWORDS com uma regex compilada a partir de uma trie"""
+
+    def __init__(self, category_keywords=None):
+        category_keywords = category_keywords or CATEGORY_KEYWORDS
+        self.categories = list(category_keywords)
+        # palavra-chave sem acentos -> (índice da categoria, peso)
+        self._keywords = {}
+
+        trie = {}
+        for category_index, keywords in enumerate(category_keywords.values()):
+            for keyword, weight in keywords.items():
+                keyword = fold(keyword)
+                self._keywords[keyword] = (category_index, weight)
+                node = trie
+                for char in keyword:
+                    node = node.setdefault(char, {})
+                node[''] = {}
+
+        # Casamento mais longo primeiro ("conta de luz" antes de "luz"), plural simples opcional.
+        # O hífen conta como limite ("x-burguer"), exceto nos dias da semana ("sexta-feira" não é feira)
+        self._pattern = re.compile(rf'(?<!\w){_WEEKDAY_LOOKBEHIND}({_trie_pattern(trie)})s?(?!\w)')
+
+    def _result(self, found):
+        """(categoria, pontuação) das palavras-chave encontradas em um texto"""
+        if not found:
+            return DEFAULT_CATEGORY, 0.0
+        if len(found) == 1:
+            category_index, weight = self._keywords[found[0]]
+            return self.categories[category_index], weight
+
+        scores = {}
+        for keyword in found:
+            category_index, weight = self._keywords[keyword]
+            scores[category_index] = scores.get(category_index, 0.0) + weight
+        # Empate: a categoria declarada primeiro vence
+        category_index = max(scores, key=lambda index: (scores[index], -index))
+        return self.categories[category_index], scores[category_index]
+
+    def classify_with_score(self, text):
+        """Retorna (categoria, pontuação); ("Outros", 0.0) quando nada casa"""
+        return self._result(self._pattern.findall(fold(text or '')))
+
+    def classify(self, text):
+        return self.classify_with_score(text)[0]
+
+    def classify_many(self, texts):
+        """
+        Classifica um lote de textos; retorna [(categoria, pontuação)] na mesma ordem.
+        Cada texto distinto é normalizado e passa pela regex uma única vez, sem as
+        chamadas de classify_with_score por texto.
+        """
+        findall, result = self._pattern.findall, self._result
+        known = {}
+        for text in texts:
+            if text not in known:
+                known[text] = result(findall(fold(text or '')))
+        return [known[text] for text in texts]
+
+
+# Instância compartilhada, construída na importação
+classifier = CategoryClassifier()
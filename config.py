@@ -5,7 +5,8 @@ class Config:
     def __init__(self):
         load_dotenv()
         self.TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-        self.GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+        # GEMINI_API_KEYS (separadas por vírgula) distribui as chamadas entre várias chaves
+        self.GEMINI_API_KEY = os.getenv("GEMINI_API_KEYS") or os.getenv("GEMINI_API_KEY")
         
         if not self.TELEGRAM_BOT_TOKEN:
             raise ValueError("TELEGRAM_BOT_TOKEN não encontrado no arquivo .env")
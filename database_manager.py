@@ -1,20 +1,86 @@
 import sqlite3
 import json
 import os
+import queue
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime
 import logging
 
+import migrations
+from metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+# Tamanho do cache de prepared statements de cada conexão
+STATEMENT_CACHE_SIZE = 256
+
+INSERT_ITEM_SQL = '''
+    INSERT INTO transaction_items 
+    (transaction_id, description, quantity, unit_price, total_price, category)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_TRANSACTION_SQL = '''
+    INSERT INTO transactions 
+    (id, chat_id, establishment_name, transaction_date, total_amount, category, items_json, raw_text, input_method)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Maior id já usado (AUTOINCREMENT nunca reaproveita ids de linhas apagadas)
+LAST_TRANSACTION_ID_SQL = '''
+    SELECT MAX(
+        IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'transactions'), 0),
+        IFNULL((SELECT MAX(id) FROM transactions), 0)
+    )
+'''
+
+
+def encode_cursor(transaction_row):
+    """Cursor de paginação a partir de uma linha de transactions: 'processed_at|id'"""
+    return f"{transaction_row[8]}|{transaction_row[0]}"
+
+
+def decode_cursor(cursor):
+    processed_at, _, transaction_id = cursor.rpartition('|')
+    return processed_at, int(transaction_id)
+
 
 class DatabaseManager:
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, read_pool_size=None, cache_size=None, mmap_size=None,
+                 write_behind=None, batch_size=None, max_latency=None):
         # Em ambientes serverless (Vercel) use /tmp para escrita
         if db_path:
             self.db_path = db_path
         else:
             self.db_path = os.getenv('DATABASE_PATH', '/tmp/financial_data.db')
 
+        # cache_size negativo é em KiB (padrão: 8 MiB por conexão)
+        self.read_pool_size = int(read_pool_size or os.getenv('DATABASE_READ_POOL_SIZE', 4))
+        self.cache_size = int(cache_size if cache_size is not None else os.getenv('DATABASE_CACHE_SIZE', -8192))
+        self.mmap_size = int(mmap_size if mmap_size is not None else os.getenv('DATABASE_MMAP_SIZE', 64 * 1024 * 1024))
+
+        # Uma única conexão de escrita para todo o processo, protegida por lock,
+        # e um pequeno pool de conexões somente leitura (WAL permite ler durante escritas)
+        self._in_memory = self.db_path == ':memory:'
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._readers = queue.LifoQueue(maxsize=self.read_pool_size)
+
+        # Modo write-behind: transações vão para uma fila e uma thread grava em lotes
+        # (um commit por lote, limitado por batch_size itens ou max_latency segundos)
+        if write_behind is None:
+            write_behind = os.getenv('DATABASE_WRITE_BEHIND', '0').lower() in ('1', 'true', 'yes')
+        self.write_behind = write_behind
+        self.batch_size = int(batch_size or os.getenv('DATABASE_BATCH_SIZE', 256))
+        self.max_latency = float(max_latency if max_latency is not None
+                                 else float(os.getenv('DATABASE_BATCH_LATENCY_MS', 2)) / 1000)
+        self._write_queue = queue.Queue()
+        self._writer_thread = None
+
         # Tentar criar diretório se necessário
         dirpath = os.path.dirname(self.db_path)
         if dirpath and not os.path.exists(dirpath):
@@ -25,88 +91,210 @@ class DatabaseManager:
 
         self.init_db()
 
-    def _get_conn(self):
-        return sqlite3.connect(self.db_path, check_same_thread=False)
+    def _connect(self, readonly=False):
+        """Abre uma conexão e aplica os PRAGMAs de desempenho"""
+        if readonly:
+            uri = f"file:{urllib.parse.quote(os.path.abspath(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE, isolation_level=None)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+            conn.execute('PRAGMA journal_mode=WAL')
+
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA cache_size={self.cache_size}')
+        conn.execute(f'PRAGMA mmap_size={self.mmap_size}')
+        return conn
+
+    @contextmanager
+    def _write_conn(self):
+        """
+        Conexão de escrita compartilhada. Faz commit ao final do bloco
+        e rollback em caso de exceção.
+        """
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def _read_conn(self):
+        """Conexão somente leitura emprestada do pool"""
+        if self._in_memory:
+            # Banco em memória só existe na conexão de escrita
+            with self._write_conn() as conn:
+                yield conn
+            return
+
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect(readonly=True)
 
-    def init_db(self):
-        """Inicializa o banco de dados com tabelas necessárias"""
-        conn = self._get_conn()
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id TEXT NOT NULL,
-                establishment_name TEXT,
-                transaction_date DATE,
-                total_amount REAL,
-                category TEXT,
-                items_json TEXT,
-                raw_text TEXT,
-                processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'processed',
-                input_method TEXT DEFAULT 'image'
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transaction_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                transaction_id INTEGER,
-                description TEXT,
-                quantity REAL,
-                unit_price REAL,
-                total_price REAL,
-                category TEXT,
-                FOREIGN KEY (transaction_id) REFERENCES transactions (id)
-            )
-        ''')
-
-        # Verificar se a coluna input_method existe, se não, adicionar
         try:
-            cursor.execute("PRAGMA table_info(transactions)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if 'input_method' not in columns:
-                cursor.execute('ALTER TABLE transactions ADD COLUMN input_method TEXT DEFAULT "image"')
-                logger.info("Coluna input_method adicionada à tabela transactions")
-        except Exception as e:
-            logger.error(f"Erro ao verificar/adicionar coluna: {str(e)}")
+            yield conn
+        except Exception:
+            conn.close()
+            raise
+        else:
+            try:
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        """Fecha a conexão de escrita e as conexões de leitura do pool"""
+        self.flush()
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
 
-        conn.commit()
-        conn.close()
+    def init_db(self):
+        """Inicializa o banco de dados aplicando as migrações pendentes"""
+        with self._write_conn() as conn:
+            migrations.migrate(conn)
 
     def save_transaction(self, chat_id, transaction_data, input_method="image"):
         """
-        Salva uma transação processada no banco de dados
+        Salva uma transação processada no banco de dados.
+        Retorna o id da nova transação, ou False em caso de erro.
         """
         try:
-            conn = self._get_conn()
-            cursor = conn.cursor()
+            if self.write_behind:
+                return self.submit_transaction(chat_id, transaction_data, input_method).result()
+            return self._insert_transactions([(chat_id, transaction_data, input_method)])[0]
 
-            cursor.execute('''
-                INSERT INTO transactions 
-                (chat_id, establishment_name, transaction_date, total_amount, category, items_json, raw_text, input_method)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                str(chat_id),
-                transaction_data.get('establishment'),
-                transaction_data.get('date'),
-                transaction_data.get('total_amount'),
-                transaction_data.get('category'),
-                json.dumps(transaction_data.get('items', [])),
-                transaction_data.get('raw_text', ''),
-                input_method
-            ))
-
-            transaction_id = cursor.lastrowid
-
-            if 'items' in transaction_data:
-                for item in transaction_data['items']:
-                    cursor.execute('''
-                        INSERT INTO transaction_items 
-                        (transaction_id, description, quantity, unit_price, total_price, category)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (
+        except Exception as e:
+            logger.error(f"Erro ao salvar transação no banco: {str(e)}")
+            return False
+
+    def submit_transaction(self, chat_id, transaction_data, input_method="image", callback=None):
+        """
+        Enfileira uma transação e retorna um Future com o id da nova linha.
+
+        No modo write-behind a gravação é feita em lote pela thread de escrita;
+        caso contrário é feita imediatamente e o Future já volta resolvido.
+        `callback(future)` é chamado quando a gravação termina.
+        """
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+
+        if not self.write_behind:
+            try:
+                future.set_result(self._insert_transactions([(chat_id, transaction_data, input_method)])[0])
+            except Exception as e:
+                logger.error(f"Erro ao salvar transação no banco: {str(e)}")
+                future.set_exception(e)
+            return future
+
+        self._ensure_writer_thread()
+        self._write_queue.put(((chat_id, transaction_data, input_method), future))
+        return future
+
+    def flush(self):
+        """Aguarda a gravação de todas as transações enfileiradas e encerra a thread de escrita"""
+        thread = self._writer_thread
+        if thread is not None and thread.is_alive():
+            self._write_queue.put(None)
+            thread.join()
+        self._writer_thread = None
+
+    def _ensure_writer_thread(self):
+        if self._writer_thread is None or not self._writer_thread.is_alive():
+            with self._write_lock:
+                if self._writer_thread is None or not self._writer_thread.is_alive():
+                    self._writer_thread = threading.Thread(
+                        target=self._write_behind_loop, name="db-write-behind", daemon=True
+                    )
+                    self._writer_thread.start()
+
+    def _write_behind_loop(self):
+        """Drena a fila de escrita em lotes de até batch_size ou max_latency segundos"""
+        while True:
+            entry = self._write_queue.get()
+            if entry is None:
+                return
+
+            batch = [entry]
+            stop = False
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = self._write_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                    break
+                batch.append(entry)
+
+            self._write_batch(batch)
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        try:
+            ids = self._insert_transactions([transaction for transaction, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Erro ao salvar transação no banco: {str(e)}")
+                batch[0][1].set_exception(e)
+                return
+            # Uma linha inválida não deve derrubar o lote inteiro
+            logger.error(f"Erro ao salvar lote de {len(batch)} transações, gravando uma a uma: {str(e)}")
+            for entry in batch:
+                self._write_batch([entry])
+            return
+
+        for (_, future), transaction_id in zip(batch, ids):
+            future.set_result(transaction_id)
+
+    def _insert_transactions(self, entries):
+        """
+        Grava uma lista de (chat_id, transaction_data, input_method) em uma única transação,
+        usando executemany para transações e itens. Retorna os ids na mesma ordem.
+        """
+        with metrics.timed('db_write'), self._write_conn() as conn:
+            cursor = conn.cursor()
+            # Reserva o lock de escrita antes de ler o último id
+            cursor.execute('BEGIN IMMEDIATE')
+            first_id = cursor.execute(LAST_TRANSACTION_ID_SQL).fetchone()[0] + 1
+            ids = list(range(first_id, first_id + len(entries)))
+
+            transaction_rows = []
+            item_rows = []
+            for transaction_id, (chat_id, transaction_data, input_method) in zip(ids, entries):
+                transaction_rows.append((
+                    transaction_id,
+                    str(chat_id),
+                    transaction_data.get('establishment'),
+                    transaction_data.get('date'),
+                    transaction_data.get('total_amount'),
+                    transaction_data.get('category'),
+                    json.dumps(transaction_data.get('items', [])),
+                    transaction_data.get('raw_text', ''),
+                    input_method
+                ))
+                for item in transaction_data.get('items') or []:
+                    item_rows.append((
                         transaction_id,
                         item.get('description'),
                         item.get('quantity', 1),
@@ -115,62 +303,156 @@ class DatabaseManager:
                         item.get('category')
                     ))
 
-            conn.commit()
-            conn.close()
+            cursor.executemany(INSERT_TRANSACTION_SQL, transaction_rows)
+            if item_rows:
+                cursor.executemany(INSERT_ITEM_SQL, item_rows)
+
+        return ids
+
+    def update_transaction(self, transaction_id, chat_id, transaction_data):
+        """
+        Substitui os dados e os itens de uma transação existente do chat (ex.: mensagem editada).
+        Retorna True se a transação foi encontrada e atualizada.
+        """
+        try:
+            with metrics.timed('db_write'), self._write_conn() as conn:
+                cursor = conn.cursor()
+                cursor.execute('BEGIN IMMEDIATE')
+                updated = cursor.execute('''
+                    UPDATE transactions
+                    SET establishment_name = ?, transaction_date = ?, total_amount = ?, category = ?,
+                        items_json = ?, raw_text = ?
+                    WHERE id = ? AND chat_id = ?
+                ''', (
+                    transaction_data.get('establishment'),
+                    transaction_data.get('date'),
+                    transaction_data.get('total_amount'),
+                    transaction_data.get('category'),
+                    json.dumps(transaction_data.get('items', [])),
+                    transaction_data.get('raw_text', ''),
+                    transaction_id,
+                    str(chat_id)
+                )).rowcount
+                if not updated:
+                    return False
+
+                cursor.execute('DELETE FROM transaction_items WHERE transaction_id = ?', (transaction_id,))
+                cursor.executemany(INSERT_ITEM_SQL, [
+                    (
+                        transaction_id,
+                        item.get('description'),
+                        item.get('quantity', 1),
+                        item.get('unit_price'),
+                        item.get('total_price'),
+                        item.get('category')
+                    )
+                    for item in transaction_data.get('items') or []
+                ])
             return True
 
         except Exception as e:
-            logger.error(f"Erro ao salvar transação no banco: {str(e)}")
+            logger.error(f"Erro ao atualizar transação {transaction_id}: {str(e)}")
             return False
 
     def get_transactions(self, chat_id, limit=10):
         """Recupera transações de um chat específico"""
         try:
-            conn = self._get_conn()
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT * FROM transactions 
-                WHERE chat_id = ? 
-                ORDER BY processed_at DESC 
-                LIMIT ?
-            ''', (str(chat_id), limit))
-
-            transactions = cursor.fetchall()
-            conn.close()
-            return transactions
+            with self._read_conn() as conn:
+                return conn.execute('''
+                    SELECT * FROM transactions 
+                    WHERE chat_id = ? 
+                    ORDER BY processed_at DESC 
+                    LIMIT ?
+                ''', (str(chat_id), limit)).fetchall()
 
         except Exception as e:
             logger.error(f"Erro ao buscar transações: {str(e)}")
             return []
 
-    def get_financial_summary(self, chat_id):
-        """Retorna um resumo financeiro para um chat"""
-        try:
-            conn = self._get_conn()
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT category, SUM(total_amount) as total
-                FROM transactions 
-                WHERE chat_id = ? 
-                GROUP BY category
-            ''', (str(chat_id),))
+    def get_transactions_page(self, chat_id, limit=10, cursor=None, backward=False,
+                              date_from=None, date_to=None, category=None, input_method=None):
+        """
+        Página de transações de um chat, da mais recente para a mais antiga, com paginação
+        por keyset sobre (processed_at, id) — custo constante por página, sem OFFSET.
 
-            by_category = cursor.fetchall()
+        `cursor` vem de next_cursor (página mais antiga) ou de prev_cursor com
+        backward=True (página mais recente). Filtros opcionais: intervalo de
+        transaction_date (YYYY-MM-DD), categoria e input_method.
+        Retorna {'transactions': [...], 'next_cursor': str|None, 'prev_cursor': str|None}.
+        """
+        try:
+            conditions = ['chat_id = ?']
+            params = [str(chat_id)]
+
+            if date_from:
+                conditions.append('transaction_date >= ?')
+                params.append(date_from)
+            if date_to:
+                conditions.append('transaction_date <= ?')
+                params.append(date_to)
+            if category:
+                conditions.append('category = ? COLLATE NOCASE')
+                params.append(category)
+            if input_method:
+                conditions.append('input_method = ?')
+                params.append(input_method)
+
+            if cursor:
+                conditions.append('(processed_at, id) > (?, ?)' if backward else '(processed_at, id) < (?, ?)')
+                params.extend(decode_cursor(cursor))
+
+            order = 'ASC' if backward else 'DESC'
+            with self._read_conn() as conn:
+                rows = conn.execute(f'''
+                    SELECT * FROM transactions 
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY processed_at {order}, id {order}
+                    LIMIT ?
+                ''', (*params, limit + 1)).fetchall()
+
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            if backward:
+                rows.reverse()
+
+            if not rows:
+                return {'transactions': [], 'next_cursor': None, 'prev_cursor': None}
+
+            # Indo para trás sempre existe uma página mais antiga (a de onde viemos), e vice-versa
+            has_older = has_more if not backward else True
+            has_newer = has_more if backward else cursor is not None
 
-            cursor.execute('''
-                SELECT strftime('%Y-%m', transaction_date) as month, 
-                       SUM(total_amount) as total
-                FROM transactions 
-                WHERE chat_id = ? 
-                GROUP BY month
-                ORDER BY month DESC
-            ''', (str(chat_id),))
+            return {
+                'transactions': rows,
+                'next_cursor': encode_cursor(rows[-1]) if has_older else None,
+                'prev_cursor': encode_cursor(rows[0]) if has_newer else None
+            }
 
-            by_month = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Erro ao buscar página de transações: {str(e)}")
+            return {'transactions': [], 'next_cursor': None, 'prev_cursor': None}
 
-            conn.close()
+    def get_financial_summary(self, chat_id):
+        """
+        Retorna um resumo financeiro para um chat, lido do agregado chat_category_month
+        (custo proporcional a categorias x meses, não ao histórico de transações)
+        """
+        try:
+            with self._read_conn() as conn:
+                by_category = conn.execute('''
+                    SELECT NULLIF(category, '') as category, SUM(total_amount) as total
+                    FROM chat_category_month 
+                    WHERE chat_id = ? 
+                    GROUP BY category
+                ''', (str(chat_id),)).fetchall()
+
+                by_month = conn.execute('''
+                    SELECT NULLIF(month, '') as month, SUM(total_amount) as total
+                    FROM chat_category_month 
+                    WHERE chat_id = ? 
+                    GROUP BY month
+                    ORDER BY month DESC
+                ''', (str(chat_id),)).fetchall()
 
             return {
                 'by_category': by_category,
@@ -181,33 +463,98 @@ class DatabaseManager:
             logger.error(f"Erro ao gerar resumo financeiro: {str(e)}")
             return None
 
+    def rebuild_aggregates(self):
+        """Recalcula chat_category_month a partir da tabela transactions"""
+        try:
+            with self._write_conn() as conn:
+                conn.execute('DELETE FROM chat_category_month')
+                conn.execute(migrations.REBUILD_AGGREGATES_SQL)
+            logger.info("Agregados chat_category_month reconstruídos")
+            return True
+
+        except Exception as e:
+            logger.error(f"Erro ao reconstruir agregados: {str(e)}")
+            return False
+
+    def check_aggregates(self):
+        """
+        Compara chat_category_month com um GROUP BY sobre transactions.
+        Retorna as linhas divergentes (lista vazia = consistente).
+        """
+        with self._read_conn() as conn:
+            return conn.execute(migrations.CHECK_AGGREGATES_SQL).fetchall()
+
+    def recategorize_items(self, classifier=None, only_uncategorized=True, batch_size=5000):
+        """
+        Reclassifica transaction_items.category a partir da descrição, em lotes por id.
+        Por padrão só preenche itens sem categoria (NULL, vazio, 'Outros' ou 'Não especificado'),
+        preservando as categorias específicas vindas do Gemini. Retorna o número de itens alterados.
+        """
+        if classifier is None:
+            from category_classifier import classifier
+
+        uncategorized = (None, '', 'Outros', 'Não especificado')
+        updated = 0
+        last_id = 0
+        try:
+            while True:
+                with self._read_conn() as conn:
+                    rows = conn.execute('''
+                        SELECT id, description, category FROM transaction_items
+                        WHERE id > ? ORDER BY id LIMIT ?
+                    ''', (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                results = classifier.classify_many([row[1] for row in rows])
+                changes = [
+                    (category, row[0])
+                    for row, (category, score) in zip(rows, results)
+                    if score > 0 and category != row[2]
+                    and (not only_uncategorized or row[2] in uncategorized)
+                ]
+                if changes:
+                    with self._write_conn() as conn:
+                        conn.executemany('UPDATE transaction_items SET category = ? WHERE id = ?', changes)
+                    updated += len(changes)
+
+            logger.info(f"{updated} itens reclassificados")
+            return updated
+
+        except Exception as e:
+            logger.error(f"Erro ao reclassificar itens: {str(e)}")
+            return updated
+
     def clear_database(self, chat_id=None):
         """
         Limpa o banco de dados - se chat_id for fornecido, limpa apenas para esse chat
         """
         try:
-            conn = self._get_conn()
-            cursor = conn.cursor()
+            with self._write_conn() as conn:
+                cursor = conn.cursor()
 
-            if chat_id:
-                cursor.execute('''
-                    DELETE FROM transaction_items 
-                    WHERE transaction_id IN (
-                        SELECT id FROM transactions WHERE chat_id = ?
-                    )
-                ''', (str(chat_id),))
+                if chat_id:
+                    cursor.execute('''
+                        DELETE FROM transaction_items 
+                        WHERE transaction_id IN (
+                            SELECT id FROM transactions WHERE chat_id = ?
+                        )
+                    ''', (str(chat_id),))
 
-                cursor.execute('DELETE FROM transactions WHERE chat_id = ?', (str(chat_id),))
+                    cursor.execute('DELETE FROM transactions WHERE chat_id = ?', (str(chat_id),))
 
-                logger.info(f"Dados do chat {chat_id} removidos do banco de dados")
-            else:
-                cursor.execute('DELETE FROM transaction_items')
-                cursor.execute('DELETE FROM transactions')
-                cursor.execute('VACUUM')  # Otimizar o banco após exclusão
-                logger.info("Todo o banco de dados foi limpo")
+                    logger.info(f"Dados do chat {chat_id} removidos do banco de dados")
+                else:
+                    cursor.execute('DELETE FROM transaction_items')
+                    cursor.execute('DELETE FROM transactions')
+                    logger.info("Todo o banco de dados foi limpo")
+
+            if not chat_id:
+                # VACUUM não pode rodar dentro de uma transação
+                with self._write_lock:
+                    self._writer.execute('VACUUM')  # Otimizar o banco após exclusão
 
-            conn.commit()
-            conn.close()
             return True
 
         except Exception as e:
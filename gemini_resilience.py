@@ -0,0 +1,202 @@
+"""
+Camada de resiliência das chamadas ao Gemini: limite de taxa no cliente (token bucket),
+novas tentativas com backoff exponencial com jitter (respeitando Retry-After) e
+circuit breaker. O estado fica exposto como contadores em `stats()`.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Respostas transitórias: vale tentar de novo
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class GeminiUnavailable(Exception):
+    """A API não pôde ser usada: circuito aberto ou tentativas esgotadas"""
+
+
+def parse_retry_after(value):
+    """Segundos indicados pelo cabeçalho Retry-After (número ou data HTTP), ou None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket compartilhado entre threads e tarefas.
+    `reserve()` consome um token e retorna quanto o chamador deve esperar antes de
+    enviar; o saldo pode ficar negativo, o que ordena as esperas de quem chega depois.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    @property
+    def tokens(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._updated
+            return min(self.capacity, self._tokens + elapsed * self.rate)
+
+
+class CircuitBreaker:
+    """
+    Abre após `failure_threshold` falhas consecutivas; depois de `reset_timeout` segundos
+    deixa passar uma única requisição de teste (meio-aberto), que fecha ou reabre o circuito.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # Nova requisição de teste também se a anterior nunca informou o resultado
+            now = time.monotonic()
+            if now - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        """Registra uma falha; retorna True se o circuito abriu agora"""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+
+class ResiliencePolicy:
+    """Combina token bucket, backoff e circuit breaker para um GeminiAIClient"""
+
+    def __init__(self, max_retries=None, base_delay=None, max_delay=None, requests_per_minute=None,
+                 burst=None, failure_threshold=None, reset_timeout=None):
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('GEMINI_MAX_RETRIES', 3))
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv('GEMINI_BACKOFF_BASE_MS', 500)) / 1000
+        # Esperas (inclusive Retry-After) acima disso não são feitas: melhor cair no fallback
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv('GEMINI_BACKOFF_MAX_S', 20))
+
+        # Cota da API em requisições por minuto (0 desativa o limite no cliente)
+        if requests_per_minute is None:
+            requests_per_minute = float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', 0))
+        self.bucket = None
+        if requests_per_minute > 0:
+            burst = burst or int(os.getenv('GEMINI_RATE_BURST', max(1, int(requests_per_minute // 6))))
+            self.bucket = TokenBucket(requests_per_minute / 60, burst)
+
+        self.breaker = CircuitBreaker(
+            failure_threshold or int(os.getenv('GEMINI_BREAKER_THRESHOLD', 5)),
+            reset_timeout if reset_timeout is not None else float(os.getenv('GEMINI_BREAKER_RESET_S', 30))
+        )
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def before_attempt(self):
+        """
+        Chamado antes de cada tentativa. Levanta GeminiUnavailable com o circuito aberto;
+        senão retorna quantos segundos esperar pelo token bucket.
+        """
+        if not self.breaker.allow():
+            self.count('short_circuited')
+            raise GeminiUnavailable("circuito aberto")
+
+        self.count('attempts')
+        if self.bucket is None:
+            return 0.0
+        delay = self.bucket.reserve()
+        if delay > 0:
+            self.count('throttled')
+            self.count('throttled_ms', int(delay * 1000))
+        return delay
+
+    def record_success(self):
+        self.breaker.record_success()
+
+    def retry_delay(self, attempt, status_code=None, retry_after=None, error=None):
+        """
+        Registra uma falha transitória (status em RETRYABLE_STATUS ou erro de conexão)
+        e retorna a espera antes da próxima tentativa, ou None se não houver mais tentativas.
+        """
+        logger.warning(f"Tentativa {attempt + 1} ao Gemini falhou: {status_code or error}")
+        if status_code == 429:
+            self.count('rate_limited')
+        elif status_code is not None:
+            self.count('server_errors')
+        else:
+            self.count('transport_errors')
+
+        if self.breaker.record_failure():
+            self.count('breaker_opened')
+            logger.warning(f"Circuito do Gemini aberto por {self.breaker.reset_timeout:.0f} s")
+        if self.breaker.state != CircuitBreaker.CLOSED or attempt >= self.max_retries:
+            self.count('gave_up')
+            return None
+
+        # Full jitter: uniforme entre 0 e o teto exponencial; Retry-After tem precedência
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        elif delay > self.max_delay:
+            self.count('gave_up')
+            return None
+
+        self.count('retries')
+        return delay
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['breaker_state'] = self.breaker.state
+        stats['consecutive_failures'] = self.breaker.consecutive_failures
+        if self.bucket is not None:
+            stats['tokens'] = round(self.bucket.tokens, 2)
+        return stats
@@ -0,0 +1,248 @@
+"""
+Roteamento das chamadas ao Gemini: escolhe o nível de modelo pela entrada (textos curtos
+de uma linha no modelo leve, imagens e textos longos no flash) e distribui as tentativas
+entre várias chaves de API, contando o uso de cada chave por modelo no último minuto.
+Um 429 põe o par chave/modelo em espera e a próxima tentativa vai para outra chave
+livre ou, sem nenhuma, para outro nível. Decisões, trocas e latência por nível ficam
+em `stats()` e nas métricas.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+
+from gemini_resilience import parse_retry_after
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLASH_MODEL = "gemini-2.5-flash"
+DEFAULT_LITE_MODEL = "gemini-2.5-flash-lite"
+
+# Janela das cotas por minuto de cada chave
+QUOTA_WINDOW = 60.0
+
+
+def split_keys(api_keys):
+    """Lista de chaves a partir de uma string separada por vírgulas ou de uma sequência"""
+    if isinstance(api_keys, str):
+        api_keys = api_keys.split(',')
+    keys = []
+    for key in api_keys or ():
+        key = key.strip()
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+def mask_key(key):
+    return f"...{key[-4:]}" if len(key) > 8 else "..."
+
+
+class GeminiRequest(dict):
+    """Corpo do generateContent com o tamanho da entrada usado pelo roteador (não é enviado)"""
+    __slots__ = ('kind', 'input_chars', 'input_lines')
+
+    def __init__(self, body, kind, texts=()):
+        super().__init__(body)
+        self.kind = kind
+        self.input_chars = max((len(text) for text in texts), default=0)
+        self.input_lines = max((text.count('\n') + 1 for text in texts), default=0)
+
+
+@dataclass
+class ModelTier:
+    name: str
+    model: str
+    # Requisições por minuto permitidas a cada chave neste modelo (0: só o que os 429 ensinarem)
+    requests_per_minute: float = 0
+
+
+@dataclass
+class Route:
+    tier: str
+    model: str
+    key_index: int
+    key: str
+
+
+class ModelRouter:
+    """
+    `choose(corpo)` decide o nível uma vez por requisição; `acquire(nível)` devolve a rota
+    (modelo e chave) de cada tentativa e `rate_limited(rota, Retry-After)` registra um 429,
+    retornando se ainda há chave livre em algum nível para tentar de novo na hora.
+    """
+
+    def __init__(self, api_keys, flash_model=None, lite_model=None, lite_max_chars=None,
+                 flash_rpm=None, lite_rpm=None, cooldown=None):
+        self.keys = split_keys(api_keys)
+        if not self.keys:
+            raise ValueError("Nenhuma chave de API do Gemini informada")
+
+        self.tiers = {'flash': ModelTier(
+            'flash', flash_model or os.getenv('GEMINI_MODEL', DEFAULT_FLASH_MODEL),
+            flash_rpm if flash_rpm is not None else float(os.getenv('GEMINI_FLASH_RPM', 0))
+        )}
+        # GEMINI_LITE_MODEL vazio desativa o nível leve (tudo vai para o flash)
+        if lite_model is None:
+            lite_model = os.getenv('GEMINI_LITE_MODEL', DEFAULT_LITE_MODEL)
+        if lite_model:
+            self.tiers['lite'] = ModelTier(
+                'lite', lite_model,
+                lite_rpm if lite_rpm is not None else float(os.getenv('GEMINI_LITE_RPM', 0))
+            )
+        # Textos de uma linha com até tantos caracteres vão para o nível leve
+        self.lite_max_chars = lite_max_chars if lite_max_chars is not None else int(os.getenv('GEMINI_LITE_MAX_CHARS', 160))
+        # Espera de um par chave/modelo após um 429 sem Retry-After
+        self.cooldown = cooldown if cooldown is not None else float(os.getenv('GEMINI_KEY_COOLDOWN_S', 60))
+
+        # (chave, modelo) -> instantes das chamadas no último minuto / fim da espera após 429
+        self._usage = {}
+        self._cooling_until = {}
+        self._next_key = 0
+        self.decisions = Counter()
+        self.counters = Counter()
+        self._key_requests = Counter()
+        self._key_rate_limited = Counter()
+        # nível -> [chamadas, segundos, 429]
+        self._latency = {name: [0, 0.0, 0] for name in self.tiers}
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        """Pares chave/modelo: limite de trocas imediatas por requisição"""
+        return len(self.keys) * len(self.tiers)
+
+    def choose(self, request_body):
+        """Nível da requisição pelo tipo e tamanho da entrada"""
+        kind = getattr(request_body, 'kind', None)
+        if kind is None:
+            has_image = any('inline_data' in part for part in request_body['contents'][0]['parts'])
+            kind = 'image' if has_image else 'text'
+
+        if 'lite' not in self.tiers:
+            tier, reason = 'flash', 'default'
+        elif kind == 'image':
+            tier, reason = 'flash', 'image'
+        elif getattr(request_body, 'input_lines', 0) > 1 or getattr(request_body, 'input_chars', 0) > self.lite_max_chars:
+            tier, reason = 'flash', 'long_text'
+        elif hasattr(request_body, 'input_chars'):
+            tier, reason = 'lite', 'short_text'
+        else:
+            # Corpo montado fora do cliente: sem o tamanho da entrada, vale o modelo completo
+            tier, reason = 'flash', 'default'
+
+        with self._lock:
+            self.decisions[(tier, reason)] += 1
+        metrics.gemini_route(tier, reason)
+        logger.debug(f"Requisição {kind} roteada para {tier} ({reason})")
+        return tier
+
+    def acquire(self, tier, previous=None):
+        """
+        Rota da próxima tentativa: no nível pedido, a chave livre com menos chamadas no último
+        minuto (empates em rodízio); sem nenhuma, os outros níveis; se todas estiverem em
+        espera ou sem cota, a que libera primeiro no nível pedido.
+        """
+        with self._lock:
+            now = time.monotonic()
+            route = None
+            for name in [tier] + [name for name in self.tiers if name != tier]:
+                index = self._free_key(self.tiers[name], now)
+                if index is not None:
+                    route = self._take(self.tiers[name], index, now)
+                    break
+            if route is None:
+                self.counters['exhausted'] += 1
+                model = self.tiers[tier].model
+                index = min(range(len(self.keys)), key=lambda i: self._cooling_until.get((i, model), 0))
+                route = self._take(self.tiers[tier], index, now)
+
+            if previous is not None:
+                kind = 'tier' if route.tier != previous.tier else 'key' if route.key_index != previous.key_index else None
+                if kind:
+                    self.counters[f'{kind}_failovers'] += 1
+                    metrics.gemini_failover(kind)
+            return route
+
+    def _free_key(self, tier, now):
+        best = None
+        for offset in range(len(self.keys)):
+            index = (self._next_key + offset) % len(self.keys)
+            if self._cooling_until.get((index, tier.model), 0) > now:
+                continue
+            used = self._recent_calls(index, tier.model, now)
+            if tier.requests_per_minute and used >= tier.requests_per_minute:
+                continue
+            if best is None or used < best[0]:
+                best = (used, index)
+        return best[1] if best else None
+
+    def _recent_calls(self, index, model, now):
+        calls = self._usage.get((index, model))
+        if not calls:
+            return 0
+        while calls and now - calls[0] >= QUOTA_WINDOW:
+            calls.popleft()
+        return len(calls)
+
+    def _take(self, tier, index, now):
+        self._usage.setdefault((index, tier.model), deque()).append(now)
+        self._key_requests[index] += 1
+        self._next_key = (index + 1) % len(self.keys)
+        return Route(tier.name, tier.model, index, self.keys[index])
+
+    def rate_limited(self, route, retry_after=None):
+        """Põe o par chave/modelo em espera; retorna True se ainda há par livre para tentar já"""
+        delay = parse_retry_after(retry_after)
+        with self._lock:
+            now = time.monotonic()
+            self._cooling_until[(route.key_index, route.model)] = now + (delay if delay is not None else self.cooldown)
+            self._key_rate_limited[route.key_index] += 1
+            self._latency[route.tier][2] += 1
+            free = any(self._free_key(tier, now) is not None for tier in self.tiers.values())
+        logger.warning(f"429 no {route.model} com a chave {mask_key(route.key)}; "
+                       f"{'trocando de chave/modelo' if free else 'nenhuma chave livre'}")
+        return free
+
+    def observe(self, route, seconds):
+        """Latência de uma tentativa no nível da rota"""
+        with self._lock:
+            series = self._latency[route.tier]
+            series[0] += 1
+            series[1] += seconds
+        metrics.gemini_tier_call(route.tier, seconds)
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            tiers = {
+                name: {
+                    'model': tier.model,
+                    'routed': sum(count for (chosen, _), count in self.decisions.items() if chosen == name),
+                    'calls': self._latency[name][0],
+                    'mean_ms': round(self._latency[name][1] / self._latency[name][0] * 1000, 1) if self._latency[name][0] else None,
+                    'rate_limited': self._latency[name][2],
+                }
+                for name, tier in self.tiers.items()
+            }
+            keys = [
+                {
+                    'key': mask_key(key),
+                    'requests': self._key_requests[index],
+                    'rate_limited': self._key_rate_limited[index],
+                    'last_minute': {tier.model: self._recent_calls(index, tier.model, now) for tier in self.tiers.values()},
+                    'cooling_s': {
+                        tier.model: round(self._cooling_until[(index, tier.model)] - now, 1)
+                        for tier in self.tiers.values()
+                        if self._cooling_until.get((index, tier.model), 0) > now
+                    },
+                }
+                for index, key in enumerate(self.keys)
+            ]
+            reasons = Counter()
+            for (_, reason), count in self.decisions.items():
+                reasons[reason] += count
+            return {'tiers': tiers, 'reasons': dict(reasons), **self.counters, 'keys': keys}
@@ -1,32 +1,62 @@
+import asyncio
 import base64
-import requests
+import os
+import httpx
 import logging
 import json
 import re
+import time
 from datetime import datetime
 
+from analysis_schema import BATCH_SCHEMA, IMAGE_SCHEMA, NOT_SPECIFIED, TEXT_SCHEMA, AnalysisResult
+from incremental_json import IncrementalJSONParser
+from gemini_resilience import RETRYABLE_STATUS, GeminiUnavailable, ResiliencePolicy
+from gemini_routing import GeminiRequest, ModelRouter
+from local_parser import parse_transaction_text
+from metrics import metrics
+
 logger = logging.getLogger(__name__)
 
-class GeminiAIClient:
-    def __init__(self, api_key):
-        self.api_key = api_key
-        self.vision_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
-        self.text_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
-    
-    def analyze_financial_document(self, image_bytes=None, text_input=None):
-        """
-        Analisa documentos financeiros (imagem ou texto) e extrai informações estruturadas
-        """
-        if image_bytes:
-            return self._analyze_image_document(image_bytes)
-        elif text_input:
-            return self._analyze_text_document(text_input)
-        else:
-            raise Exception("Nenhum dado fornecido para análise")
-    
-    def _analyze_text_document(self, text_input):
-        """Analisa texto de transação financeira com prompt mais específico"""
-        financial_prompt = f"""
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+# Incrementar sempre que os prompts mudarem: faz parte da chave do cache de análises
+PROMPT_VERSION = "2"
+
+# Prompts em texto livre anteriores ao modo JSON (GEMINI_STRUCTURED_OUTPUT=0), com
+# exemplo completo e o JSON extraído da resposta por regex
+LEGACY_PROMPT_VERSION = "1"
+
+LEGACY_IMAGE_PROMPT = """
+        Você é um especialista em análise de documentos financeiros. A imagem é um recibo, nota fiscal
+        ou comprovante. Extraia as seguintes informações em formato JSON STRICT:
+
+        {{
+          "establishment": "Nome do estabelecimento ou loja",
+          "date": "YYYY-MM-DD (use {today} se não estiver visível)",
+          "total_amount": 0.00,
+          "category": "Tecnologia/Eletrônico/Informática/Alimentação/Transporte/Moradia/Saúde/Lazer/Educação/Mercado/Serviços/Outros",
+          "items": [
+            {{
+              "description": "Descrição do item como aparece no documento",
+              "quantity": 1,
+              "unit_price": 0.00,
+              "total_price": 0.00,
+              "category": "Categoria específica do item"
+            }}
+          ],
+          "raw_text": "Texto relevante lido no documento"
+        }}
+
+        REGRAS ESTRITAS:
+        1. SEMPRE retorne um JSON válido
+        2. Para valores monetários, converta para números com duas casas decimais
+        3. total_amount é o valor total pago, não subtotais ou troco
+        4. Se não encontrar informações, use "Não especificado" para textos e 0.00 para valores
+
+        Retorne APENAS o JSON válido, sem markdown ou texto adicional.
+"""
+
+LEGACY_TEXT_PROMPT = """
         Você é um especialista em análise de transações financeiras. Analise o texto abaixo e extraia as seguintes informações em formato JSON STRICT:
 
         {{
@@ -75,58 +105,751 @@ class GeminiAIClient:
         TEXTO PARA ANÁLISE: {text_input}
 
         Retorne APENAS o JSON válido, sem markdown ou texto adicional.
-        """
-        
-        request_body = {
-            "contents": [{
-                "parts": [{"text": financial_prompt}]
-            }]
-        }
+"""
+
+LEGACY_BATCH_PROMPT = """
+        Você é um especialista em análise de transações financeiras. Cada entrada abaixo é uma
+        transação independente. Para CADA entrada, extraia as informações em um objeto JSON STRICT:
 
-        return self._make_gemini_request(request_body)
+        {{
+          "index": 1,
+          "establishment": "Nome do estabelecimento ou loja",
+          "date": "YYYY-MM-DD (use a data de hoje se não for especificada)",
+          "total_amount": 0.00,
+          "category": "Tecnologia/Eletrônico/Informática/Alimentação/Transporte/Moradia/Saúde/Lazer/Educação/Mercado/Serviços/Outros",
+          "items": [
+            {{
+              "description": "Descrição detalhada do item",
+              "quantity": 1,
+              "unit_price": 0.00,
+              "total_price": 0.00,
+              "category": "Categoria específica do item"
+            }}
+          ],
+          "raw_text": "Texto original da entrada"
+        }}
+
+        REGRAS ESTRITAS:
+        1. Retorne um array JSON com exatamente {count} objetos, um por entrada, na mesma ordem
+        2. "index" é o número da entrada correspondente
+        3. Para valores monetários, converta para números com duas casas decimais
+        4. Categorize inteligentemente baseado no contexto de cada entrada
+        5. Se não encontrar informações, use "Não especificado" para textos e 0.00 para valores
+
+        ENTRADAS PARA ANÁLISE:
+{entries}
+
+        Retorne APENAS o array JSON válido, sem markdown ou texto adicional.
+"""
+
+
+class GeminiAIClient:
+    def __init__(self, api_key, base_url=None, timeout=45, max_connections=20, cache=None,
+                 local_confidence_threshold=None, batch_window=None, batch_max_items=None, resilience=None,
+                 structured_output=None, router=None):
+        # Uma chave ou várias separadas por vírgula (GEMINI_API_KEYS), distribuídas pelo roteador
+        self.api_key = api_key
+        # Modo JSON com responseSchema; GEMINI_STRUCTURED_OUTPUT=0 volta aos prompts em texto livre
+        if structured_output is None:
+            structured_output = os.getenv('GEMINI_STRUCTURED_OUTPUT', '1').lower() in ('1', 'true', 'yes')
+        self.structured_output = structured_output
+        self.prompt_version = PROMPT_VERSION if structured_output else LEGACY_PROMPT_VERSION
+        # Tokens informados pela API (usageMetadata)
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        # Limite de taxa, novas tentativas e circuit breaker (contadores em resilience.stats())
+        self.resilience = resilience or ResiliencePolicy()
+        # Nível de modelo por requisição e rodízio de chaves com troca após 429 (router.stats())
+        self.router = router or ModelRouter(api_key)
+        # AnalysisCache opcional: reenvios da mesma imagem/texto não chamam a API
+        self.cache = cache
+        # Textos simples com confiança >= limiar são resolvidos pelo parser local (> 1 desativa)
+        if local_confidence_threshold is None:
+            local_confidence_threshold = float(os.getenv('LOCAL_PARSER_MIN_CONFIDENCE', 0.8))
+        self.local_confidence_threshold = local_confidence_threshold
+        self.local_fast_path_hits = 0
+        # GEMINI_API_BASE permite apontar para um servidor local (benchmarks)
+        self.base_url = (base_url or os.getenv('GEMINI_API_BASE', GEMINI_API_BASE)).rstrip('/')
+        self.timeout = timeout
+        self.max_connections = max_connections
+
+        # Conexões keep-alive reutilizadas entre requisições
+        self._session = None
+        self._async_client = None
+        self._async_client_loop = None
+
+        # Micro-lotes de textos na API assíncrona: textos que chegam dentro da janela
+        # (ou até batch_max_items) vão juntos em uma única chamada (0 desativa)
+        if batch_window is None:
+            batch_window = float(os.getenv('GEMINI_BATCH_WINDOW_MS', 0)) / 1000
+        self.batch_window = batch_window
+        self.batch_max_items = batch_max_items or int(os.getenv('GEMINI_BATCH_MAX_ITEMS', 8))
+        self.batched_requests = 0
+        self.batch_fallbacks = 0
+        self._batch_pending = []
+        self._batch_timer = None
+        self._batch_tasks = set()
     
-    def _make_gemini_request(self, request_body):
-        """Faz requisição para a API Gemini"""
+    def analyze_financial_document(self, image_bytes=None, text_input=None):
+        """
+        Analisa documentos financeiros (imagem ou texto) e extrai informações estruturadas
+        """
+        if text_input and not image_bytes:
+            local_result = self._local_fast_path(text_input)
+            if local_result is not None:
+                return local_result
+
+        cache_key = self._cache_key(image_bytes, text_input)
+        cached = self._cache_lookup(cache_key, text_input)
+        if cached is not None:
+            return cached
+
+        if image_bytes:
+            return self._analyze_image_document(image_bytes, cache_key=cache_key)
+        elif text_input:
+            return self._analyze_text_document(text_input, cache_key=cache_key)
+        else:
+            raise Exception("Nenhum dado fornecido para análise")
+
+    async def analyze_financial_document_async(self, image_bytes=None, text_input=None):
+        """
+        Versão assíncrona de analyze_financial_document, sem bloquear o event loop
+        """
+        if text_input and not image_bytes:
+            local_result = self._local_fast_path(text_input)
+            if local_result is not None:
+                return local_result
+
+        cache_key = self._cache_key(image_bytes, text_input)
+        cached = self._cache_lookup(cache_key, text_input)
+        if cached is not None:
+            return cached
+
+        if image_bytes:
+            return await self._analyze_image_document_async(image_bytes, cache_key=cache_key)
+        elif text_input:
+            return await self._analyze_text_document_async(text_input, cache_key=cache_key)
+        else:
+            raise Exception("Nenhum dado fornecido para análise")
+
+    async def analyze_financial_document_stream(self, image_bytes=None, text_input=None, on_partial=None):
+        """
+        Versão de analyze_financial_document_async com streamGenerateContent: `on_partial(campos)`
+        é chamada (sem await; deve ser rápida) cada vez que um campo ou item termina de chegar, com
+        o dicionário parcial (establishment, total_amount, category, items já completos...).
+        O resultado final é o mesmo da versão sem streaming. Parser local e cache respondem na
+        hora, sem parciais; textos não entram nos micro-lotes.
+        """
+        if not self.structured_output:
+            # Sem o modo JSON não há objeto de topo confiável para ler aos pedaços
+            return await self.analyze_financial_document_async(image_bytes=image_bytes, text_input=text_input)
+
+        if text_input and not image_bytes:
+            local_result = self._local_fast_path(text_input)
+            if local_result is not None:
+                return local_result
+
+        cache_key = self._cache_key(image_bytes, text_input)
+        cached = self._cache_lookup(cache_key, text_input)
+        if cached is not None:
+            return cached
+
+        if image_bytes:
+            from image_preprocessing import preprocess_receipt_image_async
+            image = await preprocess_receipt_image_async(image_bytes)
+            request_body, fallback_text = self._build_image_request(image), None
+        elif text_input:
+            request_body, fallback_text = self._build_text_request(text_input), text_input
+        else:
+            raise Exception("Nenhum dado fornecido para análise")
+        return await self._make_gemini_stream_request(request_body, cache_key, fallback_text, on_partial)
+
+    def _local_fast_path(self, text_input):
+        """Resultado do parser local se a confiança for suficiente, senão None"""
+        result = parse_transaction_text(text_input)
+        if result.confidence < self.local_confidence_threshold:
+            return None
+
+        self.local_fast_path_hits += 1
+        metrics.fallback('local_fast_path')
+        logger.debug(f"Texto resolvido localmente (confiança {result.confidence})")
+        return result.data
+
+    def _cache_key(self, image_bytes, text_input):
+        if self.cache is None:
+            return None
+        if image_bytes:
+            return self.cache.image_key(image_bytes, self.prompt_version)
+        if text_input:
+            return self.cache.text_key(text_input, self.prompt_version)
+        return None
+
+    def _cache_lookup(self, cache_key, text_input):
+        """Resultado em cache para a chave, ajustado para o reenvio atual, ou None"""
+        if cache_key is None:
+            return None
+
+        entry = self.cache.get(cache_key)
+        if entry is None:
+            return None
+
+        result, analyzed_on = entry
+        # Se a IA usou "hoje" como data na análise original, o reenvio recebe a data de hoje
+        if result.get('date') == analyzed_on:
+            result['date'] = datetime.now().strftime('%Y-%m-%d')
+        if text_input:
+            result['raw_text'] = text_input
+
+        metrics.fallback('cache_hit')
+        logger.debug("Análise servida pelo cache")
+        return result
+
+    def _analyze_text_document(self, text_input, cache_key=None):
+        """Analisa texto de transação financeira com prompt mais específico"""
+        return self._make_gemini_request(
+            self._build_text_request(text_input), cache_key=cache_key, fallback_text=text_input
+        )
+
+    async def _analyze_text_document_async(self, text_input, cache_key=None):
+        """Versão assíncrona de _analyze_text_document (agrupada em lotes se batch_window > 0)"""
+        if self.batch_window > 0 and self.batch_max_items > 1:
+            return await self._enqueue_text_batch(text_input, cache_key)
+        return await self._make_gemini_request_async(
+            self._build_text_request(text_input), cache_key=cache_key, fallback_text=text_input
+        )
+
+    def _enqueue_text_batch(self, text_input, cache_key):
+        """Adiciona o texto ao lote pendente e retorna o future com o seu resultado"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch_pending.append((text_input, cache_key, future))
+
+        if len(self._batch_pending) >= self.batch_max_items:
+            self._dispatch_text_batch()
+        elif self._batch_timer is None:
+            self._batch_timer = loop.call_later(self.batch_window, self._dispatch_text_batch)
+        return future
+
+    def _dispatch_text_batch(self):
+        """Fecha o lote pendente e o envia em segundo plano"""
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        batch, self._batch_pending = self._batch_pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._send_text_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _send_text_batch(self, batch):
+        """Envia um lote e entrega a cada chamador o seu resultado (ou exceção)"""
+        if len(batch) == 1:
+            text_input, cache_key, future = batch[0]
+            await self._resolve_single(text_input, cache_key, future)
+            return
+
         try:
-            headers = {
-                "Content-Type": "application/json",
-                "x-goog-api-key": self.api_key
-            }
-            
-            url = self.vision_url if any('inline_data' in part for part in request_body['contents'][0]['parts']) else self.text_url
-            
-            response = requests.post(
-                url,
-                headers=headers,
-                json=request_body,
-                timeout=45
+            results = await self._request_text_batch([text_input for text_input, _, _ in batch])
+        except GeminiUnavailable as e:
+            # Nada de reenvios individuais: o lote inteiro vai para o parser local
+            for text_input, _, future in batch:
+                if not future.done():
+                    future.set_result(self._local_fallback(text_input, e))
+            return
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batched_requests += 1
+        fallbacks = []
+        for (text_input, cache_key, future), result in zip(batch, results):
+            if result is None:
+                fallbacks.append((text_input, cache_key, future))
+                continue
+            if cache_key and self.cache is not None:
+                self.cache.set(cache_key, result)
+            if not future.done():
+                future.set_result(result)
+
+        # Resposta malformada (inteira ou em parte): os textos afetados seguem em chamadas individuais
+        if fallbacks:
+            self.batch_fallbacks += len(fallbacks)
+            metrics.fallback('batch_retry', len(fallbacks))
+            logger.warning(f"Lote de {len(batch)} textos com {len(fallbacks)} resultados inválidos; reenviando individualmente")
+            await asyncio.gather(*(self._resolve_single(*entry) for entry in fallbacks))
+
+    async def _resolve_single(self, text_input, cache_key, future):
+        try:
+            result = await self._make_gemini_request_async(
+                self._build_text_request(text_input), cache_key=cache_key, fallback_text=text_input
             )
-            
-            logger.debug(f"Status da API Gemini: {response.status_code}")
-            
-            if response.status_code != 200:
-                logger.error(f"Erro na API Gemini: {response.text}")
-                raise Exception(f"Erro na API: {response.status_code}")
-            
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    async def _request_text_batch(self, texts):
+        """
+        Analisa vários textos em uma única chamada.
+        Retorna uma lista alinhada com `texts`; posições sem resultado válido ficam None
+        (todas, se a resposta não for um array JSON).
+        """
+        request_body = self._build_text_batch_request(texts)
+        try:
+            response = await self._post_async(request_body)
+        except GeminiUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Erro na análise do lote: {str(e)}")
+            raise Exception(f"Falha na análise: {str(e)}")
+
+        logger.debug(f"Status da API Gemini (lote de {len(texts)}): {response.status_code}")
+        if response.status_code != 200:
+            logger.error(f"Erro na API Gemini: {response.text}")
+            raise Exception(f"Erro na API: {response.status_code}")
+
+        results = [None] * len(texts)
+        extract_start = time.perf_counter()
+        try:
             response_data = response.json()
+            self._record_usage(response_data)
             extracted_text = self._extract_text_from_response(response_data)
-            
-            # Extrair JSON da resposta
-            json_match = re.search(r'\{.*\}', extracted_text, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group())
-                except json.JSONDecodeError:
-                    logger.error("JSON inválido retornado pela IA")
-                    return self._fallback_financial_processing(extracted_text)
+            if self.structured_output:
+                parsed = json.loads(extracted_text)
             else:
-                logger.error("Nenhum JSON encontrado na resposta")
-                return self._fallback_financial_processing(extracted_text)
-                
+                # O array precisa ser o valor de topo: um objeto solto também contém "[" (em "items")
+                start, brace = extracted_text.find('['), extracted_text.find('{')
+                if start == -1 or -1 < brace < start:
+                    parsed = None
+                else:
+                    parsed = json.loads(extracted_text[start:extracted_text.rfind(']') + 1])
+        except Exception:
+            parsed = None
+        metrics.observe('json_extract', time.perf_counter() - extract_start)
+        if not isinstance(parsed, list):
+            metrics.error('json_extract')
+            logger.error("Nenhum array JSON encontrado na resposta do lote")
+            return results
+
+        # Cada objeto traz o "index" da entrada; sem ele, vale a posição no array
+        # (somente se o array tiver exatamente um objeto por entrada)
+        for position, item in enumerate(parsed):
+            if not isinstance(item, dict):
+                continue
+            index = item.pop('index', None)
+            if not isinstance(index, int):
+                if len(parsed) != len(texts):
+                    continue
+                index = position + 1
+            if 1 <= index <= len(texts) and results[index - 1] is None:
+                results[index - 1] = AnalysisResult.from_dict(item, raw_text=texts[index - 1]).to_dict()
+        return results
+
+    def _analyze_image_document(self, image_bytes, cache_key=None):
+        """Analisa a foto de um recibo ou nota fiscal"""
+        # Pillow só é importado quando chega a primeira imagem (cold start do webhook)
+        from image_preprocessing import preprocess_receipt_image
+        image = preprocess_receipt_image(image_bytes)
+        return self._make_gemini_request(self._build_image_request(image), cache_key=cache_key)
+
+    async def _analyze_image_document_async(self, image_bytes, cache_key=None):
+        """Versão assíncrona de _analyze_image_document (pré-processamento roda no pool de workers)"""
+        from image_preprocessing import preprocess_receipt_image_async
+        image = await preprocess_receipt_image_async(image_bytes)
+        return await self._make_gemini_request_async(self._build_image_request(image), cache_key=cache_key)
+
+    def _build_image_request(self, image):
+        """Monta o corpo da requisição de análise de imagem a partir de um PreprocessedImage"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        if self.structured_output:
+            prompt = (
+                "A imagem é um recibo, nota fiscal ou comprovante. Extraia a transação: total_amount é "
+                "o valor total pago (não subtotais nem troco), date em YYYY-MM-DD "
+                f"({today} se não estiver visível), um item por produto e raw_text com o texto relevante lido. "
+                f'Sem a informação, use "{NOT_SPECIFIED}" ou 0.'
+            )
+        else:
+            prompt = LEGACY_IMAGE_PROMPT.format(today=today)
+        image_part = {
+            "inline_data": {
+                "mime_type": image.mime_type,
+                "data": base64.b64encode(image.data).decode('ascii')
+            }
+        }
+        return self._request_body([{"text": prompt}, image_part], IMAGE_SCHEMA, 'image')
+
+    def _build_text_request(self, text_input):
+        """Monta o corpo da requisição de análise de texto"""
+        if self.structured_output:
+            today = datetime.now().strftime('%Y-%m-%d')
+            prompt = (
+                "Extraia a transação financeira descrita no texto: valores em reais como números, "
+                f"date em YYYY-MM-DD ({today} se não for informada), categoria pelo contexto. "
+                f'Sem a informação, use "{NOT_SPECIFIED}" ou 0.\n\n'
+                f"TEXTO PARA ANÁLISE: {text_input}"
+            )
+        else:
+            prompt = LEGACY_TEXT_PROMPT.format(text_input=text_input)
+        return self._request_body([{"text": prompt}], TEXT_SCHEMA, 'text', [text_input])
+
+    def _build_text_batch_request(self, texts):
+        """Monta o corpo da requisição que analisa vários textos, com as instruções uma única vez"""
+        entries = '\n'.join(f"{index}. {json.dumps(text, ensure_ascii=False)}" for index, text in enumerate(texts, 1))
+        if self.structured_output:
+            today = datetime.now().strftime('%Y-%m-%d')
+            prompt = (
+                f"Cada entrada abaixo é uma transação financeira independente. Retorne {len(texts)} objetos, "
+                'um por entrada e na mesma ordem, com "index" igual ao número da entrada: valores em reais '
+                f"como números, date em YYYY-MM-DD ({today} se não for informada), categoria pelo contexto. "
+                f'Sem a informação, use "{NOT_SPECIFIED}" ou 0.\n\n'
+                f"ENTRADAS PARA ANÁLISE:\n{entries}"
+            )
+        else:
+            prompt = LEGACY_BATCH_PROMPT.format(count=len(texts), entries=entries)
+        return self._request_body([{"text": prompt}], BATCH_SCHEMA, 'batch', texts)
+
+    def _request_body(self, parts, schema, kind, texts=()):
+        """
+        Corpo do generateContent; no modo estruturado a resposta é JSON validado pelo responseSchema.
+        O tipo e os textos da entrada ficam no GeminiRequest para o roteador escolher o modelo.
+        """
+        body = {"contents": [{"parts": parts}]}
+        if self.structured_output:
+            body["generationConfig"] = {
+                "responseMimeType": "application/json",
+                "responseSchema": schema,
+            }
+        return GeminiRequest(body, kind, texts)
+
+    def _headers(self, route):
+        return {
+            "Content-Type": "application/json",
+            "x-goog-api-key": route.key
+        }
+
+    def _request_url(self, route, stream=False):
+        if stream:
+            return f"{self.base_url}/models/{route.model}:streamGenerateContent?alt=sse"
+        return f"{self.base_url}/models/{route.model}:generateContent"
+
+    def _get_session(self):
+        """Sessão requests com keep-alive para a API síncrona"""
+        # requests só é importado pela API síncrona; o webhook usa apenas httpx
+        import requests
+        if self._session is None:
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.max_connections)
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+        return self._session
+
+    def _get_async_client(self):
+        """
+        Cliente httpx compartilhado (pool de conexões keep-alive).
+        É recriado se o event loop mudar, pois conexões não podem ser reaproveitadas entre loops.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client.is_closed or self._async_client_loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0
+                )
+            )
+            self._async_client_loop = loop
+        return self._async_client
+
+    def close(self):
+        """Fecha a sessão síncrona"""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    async def aclose(self):
+        """Envia o lote pendente e fecha o pool de conexões assíncrono"""
+        if self._batch_pending:
+            batch = self._batch_pending
+            self._dispatch_text_batch()
+            await asyncio.gather(*(future for _, _, future in batch), return_exceptions=True)
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_client_loop = None
+
+    def _post(self, request_body):
+        """
+        POST síncrono com limite de taxa, novas tentativas e circuit breaker.
+        Retorna a resposta final (200 ou erro não transitório) ou levanta GeminiUnavailable.
+        """
+        import requests
+        # Serializado uma vez: o tamanho vai para as métricas e o corpo é reaproveitado nas tentativas
+        body = json.dumps(request_body).encode()
+        tier = self.router.choose(request_body)
+        route = None
+        attempt = failovers = 0
+        while True:
+            delay = self.resilience.before_attempt()
+            if delay:
+                time.sleep(delay)
+            route = self.router.acquire(tier, previous=route)
+            start = time.perf_counter()
+            try:
+                response = self._get_session().post(
+                    self._request_url(route),
+                    headers=self._headers(route),
+                    data=body,
+                    timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record_attempt(start, len(body), None, route)
+                delay = self.resilience.retry_delay(attempt, error=e)
+            else:
+                self._record_attempt(start, len(body), response, route)
+                if response.status_code not in RETRYABLE_STATUS:
+                    self.resilience.record_success()
+                    return response
+                if self._failover(route, response, failovers):
+                    failovers += 1
+                    continue
+                delay = self.resilience.retry_delay(
+                    attempt, response.status_code, response.headers.get('Retry-After')
+                )
+
+            if delay is None:
+                raise GeminiUnavailable(f"tentativas esgotadas após {attempt + 1} chamadas")
+            attempt += 1
+            time.sleep(delay)
+
+    async def _post_async(self, request_body, consume=None):
+        """
+        Versão assíncrona de _post. Com `consume`, a requisição vai para streamGenerateContent
+        e uma resposta 200 é lida dentro da tentativa por `await consume(response)`
+        (uma queda de conexão no meio do stream conta como falha da tentativa).
+        """
+        body = json.dumps(request_body).encode()
+        tier = self.router.choose(request_body)
+        route = None
+        attempt = failovers = 0
+        while True:
+            delay = self.resilience.before_attempt()
+            if delay:
+                await asyncio.sleep(delay)
+            route = self.router.acquire(tier, previous=route)
+            start = time.perf_counter()
+            try:
+                client = self._get_async_client()
+                request = client.build_request(
+                    'POST', self._request_url(route, stream=consume is not None),
+                    headers=self._headers(route), content=body
+                )
+                response = await client.send(request, stream=consume is not None)
+                if consume is not None:
+                    try:
+                        if response.status_code == 200:
+                            await consume(response)
+                        else:
+                            await response.aread()
+                    finally:
+                        await response.aclose()
+            except httpx.TransportError as e:
+                self._record_attempt(start, len(body), None, route)
+                delay = self.resilience.retry_delay(attempt, error=e)
+            else:
+                self._record_attempt(start, len(body), response, route, received=response.num_bytes_downloaded)
+                if response.status_code not in RETRYABLE_STATUS:
+                    self.resilience.record_success()
+                    return response
+                if self._failover(route, response, failovers):
+                    failovers += 1
+                    continue
+                delay = self.resilience.retry_delay(
+                    attempt, response.status_code, response.headers.get('Retry-After')
+                )
+
+            if delay is None:
+                raise GeminiUnavailable(f"tentativas esgotadas após {attempt + 1} chamadas")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _failover(self, route, response, failovers):
+        """
+        Depois de um 429: True se outra chave ou nível está livre e a requisição deve ser
+        repetida na hora, sem backoff e sem contar falha no circuit breaker (no máximo uma
+        troca por par chave/modelo)
+        """
+        if response.status_code != 429:
+            return False
+        free = self.router.rate_limited(route, response.headers.get('Retry-After'))
+        if not free or failovers >= self.router.capacity:
+            return False
+        self.resilience.count('failovers')
+        return True
+
+    def _record_attempt(self, start, sent_bytes, response, route, received=None):
+        """Latência (total e por nível), bytes e erros de uma tentativa (response None: erro de conexão)"""
+        elapsed = time.perf_counter() - start
+        metrics.observe('gemini', elapsed)
+        self.router.observe(route, elapsed)
+        if received is None:
+            received = len(response.content) if response is not None else 0
+        metrics.gemini_traffic(sent_bytes, received)
+        if response is None or response.status_code != 200:
+            metrics.error('gemini')
+
+    def _local_fallback(self, text_input, error):
+        """Resultado do parser local quando o Gemini está indisponível (não vai para o cache)"""
+        self.resilience.count('local_fallbacks')
+        metrics.fallback('gemini_unavailable')
+        logger.warning(f"Gemini indisponível ({error}); usando o parser local")
+        return self._fallback_financial_processing(text_input)
+
+    def _make_gemini_request(self, request_body, cache_key=None, fallback_text=None):
+        """
+        Faz requisição para a API Gemini.
+        Com a API indisponível, textos (fallback_text) são analisados pelo parser local.
+        """
+        try:
+            response = self._post(request_body)
+            return self._parse_gemini_response(
+                response.status_code, response.text, response.json, cache_key, raw_text=fallback_text
+            )
+
+        except GeminiUnavailable as e:
+            if fallback_text is not None:
+                return self._local_fallback(fallback_text, e)
+            logger.error(f"Erro na análise do documento: {str(e)}")
+            raise Exception(f"Falha na análise: {str(e)}")
+        except Exception as e:
+            logger.error(f"Erro na análise do documento: {str(e)}")
+            raise Exception(f"Falha na análise: {str(e)}")
+
+    async def _make_gemini_request_async(self, request_body, cache_key=None, fallback_text=None):
+        """Faz requisição para a API Gemini sem bloquear o event loop"""
+        try:
+            response = await self._post_async(request_body)
+            return self._parse_gemini_response(
+                response.status_code, response.text, response.json, cache_key, raw_text=fallback_text
+            )
+
+        except GeminiUnavailable as e:
+            if fallback_text is not None:
+                return self._local_fallback(fallback_text, e)
+            logger.error(f"Erro na análise do documento: {str(e)}")
+            raise Exception(f"Falha na análise: {str(e)}")
         except Exception as e:
             logger.error(f"Erro na análise do documento: {str(e)}")
             raise Exception(f"Falha na análise: {str(e)}")
+
+    async def _make_gemini_stream_request(self, request_body, cache_key=None, fallback_text=None, on_partial=None):
+        """Como _make_gemini_request_async, lendo os eventos SSE e repassando os campos parciais"""
+        chunks = []
+        usage = {}
+
+        async def consume(response):
+            # Nova tentativa recomeça a leitura do zero
+            chunks.clear()
+            parser = IncrementalJSONParser()
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                try:
+                    event = json.loads(line[5:])
+                except ValueError as e:
+                    # Stream cortado ou corrompido: falha de transporte da tentativa (métricas,
+                    # circuit breaker e nova tentativa), não um erro genérico da análise
+                    raise httpx.RemoteProtocolError(f"Evento SSE malformado do Gemini: {e}")
+                usage.update(event.get('usageMetadata') or {})
+                try:
+                    text = event['candidates'][0]['content']['parts'][0]['text']
+                except (KeyError, IndexError):
+                    # Eventos finais podem trazer só finishReason/usageMetadata
+                    continue
+                chunks.append(text)
+                if parser.feed(text) and on_partial is not None:
+                    on_partial(dict(parser.partial))
+
+        try:
+            response = await self._post_async(request_body, consume=consume)
+        except GeminiUnavailable as e:
+            if fallback_text is not None:
+                return self._local_fallback(fallback_text, e)
+            logger.error(f"Erro na análise do documento: {str(e)}")
+            raise Exception(f"Falha na análise: {str(e)}")
+        except Exception as e:
+            logger.error(f"Erro na análise do documento: {str(e)}")
+            raise Exception(f"Falha na análise: {str(e)}")
+
+        if response.status_code != 200:
+            logger.error(f"Erro na API Gemini: {response.text}")
+            raise Exception(f"Falha na análise: Erro na API: {response.status_code}")
+
+        with metrics.timed('json_extract'):
+            self._record_usage({'usageMetadata': usage})
+            extracted_text = ''.join(chunks)
+            result = self._validate_result(extracted_text, fallback_text)
+        return self._finish_result(result, extracted_text, cache_key)
+
+    def _parse_gemini_response(self, status_code, response_text, load_json, cache_key=None, raw_text=None):
+        """
+        Interpreta a resposta HTTP da API Gemini (comum às versões síncrona e assíncrona).
+        Só resultados JSON válidos vão para o cache; respostas de fallback não.
+        raw_text é o texto analisado (para imagens, vale o texto lido pelo modelo).
+        """
+        logger.debug(f"Status da API Gemini: {status_code}")
+
+        if status_code != 200:
+            logger.error(f"Erro na API Gemini: {response_text}")
+            raise Exception(f"Erro na API: {status_code}")
+
+        with metrics.timed('json_extract'):
+            response_data = load_json()
+            self._record_usage(response_data)
+            extracted_text = self._extract_text_from_response(response_data)
+            result = self._validate_result(extracted_text, raw_text)
+        return self._finish_result(result, extracted_text, cache_key)
+
+    def _finish_result(self, result, extracted_text, cache_key=None):
+        """Guarda o resultado válido no cache ou cai no parser local com o texto da resposta"""
+        if result is None:
+            metrics.error('json_extract')
+            metrics.fallback('invalid_json')
+            return self._fallback_financial_processing(extracted_text)
+        if cache_key and self.cache is not None:
+            self.cache.set(cache_key, result)
+        return result
     
+    def _validate_result(self, extracted_text, raw_text=None):
+        """Resultado validado (dict de AnalysisResult) ou None se o JSON for inválido"""
+        if self.structured_output:
+            # No modo JSON a resposta inteira é o objeto
+            candidate = extracted_text
+        else:
+            json_match = re.search(r'\{.*\}', extracted_text, re.DOTALL)
+            if not json_match:
+                logger.error("Nenhum JSON encontrado na resposta")
+                return None
+            candidate = json_match.group()
+        try:
+            return AnalysisResult.from_dict(json.loads(candidate), raw_text=raw_text).to_dict()
+        except ValueError as e:
+            logger.error(f"JSON inválido retornado pela IA: {e}")
+            return None
+
+    def _record_usage(self, response_data):
+        """Soma os tokens de prompt e de resposta do usageMetadata"""
+        usage = response_data.get('usageMetadata') or {}
+        prompt_tokens = usage.get('promptTokenCount', 0)
+        response_tokens = usage.get('candidatesTokenCount', 0)
+        self.prompt_tokens += prompt_tokens
+        self.response_tokens += response_tokens
+        metrics.gemini_usage(prompt_tokens, response_tokens)
+
     def _extract_text_from_response(self, response):
         """Extrai texto da resposta da API Gemini"""
         try:
@@ -139,32 +862,4 @@ class GeminiAIClient:
         """
         Processamento de fallback para quando o JSON não é retornado corretamente
         """
-        # Extrair informações básicas usando regex
-        date_match = re.search(r'(\d{2}/\d{2}/\d{4}|\d{4}-\d{2}-\d{2})', text)
-        total_match = re.search(r'R\$\s*(\d+[\.,]?\d*)|\b(\d+[\.,]?\d*)\s*reais\b', text)
-        
-        # Determinar categoria baseada no texto
-        category = "Outros"
-        category_keywords = {
-            'Mercado': ['mercado', 'supermercado', 'compras', 'hipermercado'],
-            'Alimentação': ['restaurante', 'lanche', 'pizza', 'hambúrguer', 'comida', 'almoço', 'jantar'],
-            'Transporte': ['combustível', 'gasolina', 'posto', 'ônibus', 'metro', 'táxi', 'uber'],
-            'Moradia': ['aluguel', 'condomínio', 'conta de luz', 'água', 'internet', 'energia'],
-            'Saúde': ['farmácia', 'remédio', 'médico', 'hospital', 'consulta'],
-            'Lazer': ['cinema', 'shopping', 'parque', 'viagem', 'hotel'],
-            'Educação': ['livro', 'curso', 'faculdade', 'escola', 'material']
-        }
-        
-        for cat, keywords in category_keywords.items():
-            if any(keyword in text.lower() for keyword in keywords):
-                category = cat
-                break
-        
-        return {
-            "establishment": "Estabelecimento não identificado",
-            "date": date_match.group(1) if date_match else datetime.now().strftime('%Y-%m-%d'),
-            "total_amount": float(total_match.group(1).replace(',', '.')) if total_match and total_match.group(1) else 0.0,
-            "category": category,
-            "items": [],
-            "raw_text": text[:1000]  # Limitar texto para evitar problemas no banco
-        }
+        return parse_transaction_text(text).data
@@ -0,0 +1,192 @@
+"""
+Registro de updates já recebidos do Telegram, para descartar reentregas e
+retentativas do webhook antes de qualquer download ou chamada ao Gemini.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Sem transação associada (mensagem vista, mas ainda não gravada ou sem valor)
+NO_TRANSACTION = 0
+
+
+class IdempotencyStore:
+    """
+    LRU em memória na frente de um SQLite pequeno (ao lado do banco de transações) com:
+    - seen_updates: update_id já aceitos;
+    - message_transactions: (chat_id, message_id) -> id da transação criada pela mensagem,
+      usado para aplicar edições na transação original.
+    Entradas expiram após `ttl` segundos (o Telegram só reenvia updates recentes).
+    """
+
+    def __init__(self, db_path=None, ttl=None, memory_size=None):
+        if db_path:
+            self.db_path = db_path
+        else:
+            transactions_db = os.getenv('DATABASE_PATH', '/tmp/financial_data.db')
+            self.db_path = os.getenv(
+                'IDEMPOTENCY_PATH',
+                os.path.join(os.path.dirname(transactions_db), 'idempotency.db')
+            )
+        self.ttl = float(ttl or os.getenv('IDEMPOTENCY_TTL', 48 * 3600))
+        self.memory_size = int(memory_size or os.getenv('IDEMPOTENCY_MEMORY_SIZE', 10000))
+
+        self.duplicates = 0
+        self._updates = OrderedDict()
+        self._messages = OrderedDict()
+        self._claims_since_purge = 0
+
+        dirpath = os.path.dirname(self.db_path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS seen_updates (
+                update_id INTEGER PRIMARY KEY,
+                created_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS message_transactions (
+                chat_id TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                transaction_id INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (chat_id, message_id)
+            ) WITHOUT ROWID
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_seen_updates_created ON seen_updates (created_at)')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_message_transactions_created ON message_transactions (created_at)'
+        )
+
+    def _remember(self, lru, key, value):
+        lru[key] = value
+        lru.move_to_end(key)
+        if len(lru) > self.memory_size:
+            lru.popitem(last=False)
+
+    def claim_update(self, update_id):
+        """True na primeira vez que o update_id aparece; False para duplicatas"""
+        now = time.time()
+        with self._lock:
+            if update_id in self._updates and now - self._updates[update_id] <= self.ttl:
+                self.duplicates += 1
+                return False
+
+            self._maybe_purge(now)
+            inserted = self._conn.execute('''
+                INSERT INTO seen_updates (update_id, created_at) VALUES (?, ?)
+                ON CONFLICT (update_id) DO UPDATE SET created_at = excluded.created_at
+                WHERE seen_updates.created_at < ?
+            ''', (update_id, now, now - self.ttl)).rowcount
+            if not inserted:
+                self.duplicates += 1
+                return False
+
+            self._remember(self._updates, update_id, now)
+            return True
+
+    def claim_message(self, chat_id, message_id):
+        """True na primeira vez que a mensagem (chat_id, message_id) aparece; False para duplicatas"""
+        key = (str(chat_id), message_id)
+        now = time.time()
+        with self._lock:
+            if key in self._messages and now - self._messages[key][1] <= self.ttl:
+                self.duplicates += 1
+                return False
+
+            inserted = self._conn.execute('''
+                INSERT INTO message_transactions (chat_id, message_id, transaction_id, created_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (chat_id, message_id) DO UPDATE
+                SET transaction_id = excluded.transaction_id, created_at = excluded.created_at
+                WHERE message_transactions.created_at < ?
+            ''', (key[0], message_id, NO_TRANSACTION, now, now - self.ttl)).rowcount
+            if not inserted:
+                self.duplicates += 1
+                return False
+
+            self._remember(self._messages, key, (NO_TRANSACTION, now))
+            return True
+
+    def release(self, update_id=None, chat_id=None, message_id=None):
+        """
+        Desfaz claims de um update que não chegou a ser aceito (ex.: falha ao enfileirar),
+        para que a reentrega do Telegram não seja descartada como duplicata.
+        A mensagem só é liberada se ainda não tiver transação associada.
+        """
+        with self._lock:
+            if update_id is not None:
+                self._updates.pop(update_id, None)
+                self._conn.execute('DELETE FROM seen_updates WHERE update_id = ?', (update_id,))
+            if message_id is not None:
+                key = (str(chat_id), message_id)
+                cached = self._messages.get(key)
+                if cached is not None and cached[0] == NO_TRANSACTION:
+                    del self._messages[key]
+                self._conn.execute(
+                    'DELETE FROM message_transactions WHERE chat_id = ? AND message_id = ? AND transaction_id = ?',
+                    (key[0], message_id, NO_TRANSACTION)
+                )
+
+    def set_transaction(self, chat_id, message_id, transaction_id):
+        """Associa a transação criada à mensagem de origem"""
+        key = (str(chat_id), message_id)
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO message_transactions (chat_id, message_id, transaction_id, created_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (chat_id, message_id) DO UPDATE SET transaction_id = excluded.transaction_id
+            ''', (key[0], message_id, transaction_id, now))
+            self._remember(self._messages, key, (transaction_id, now))
+
+    def get_transaction(self, chat_id, message_id):
+        """Id da transação criada pela mensagem, ou None"""
+        key = (str(chat_id), message_id)
+        now = time.time()
+        with self._lock:
+            cached = self._messages.get(key)
+            if cached is not None and now - cached[1] <= self.ttl:
+                return cached[0] or None
+
+            row = self._conn.execute('''
+                SELECT transaction_id, created_at FROM message_transactions
+                WHERE chat_id = ? AND message_id = ? AND created_at >= ?
+            ''', (key[0], message_id, now - self.ttl)).fetchone()
+            if row is None:
+                return None
+            self._remember(self._messages, key, (row[0], row[1]))
+            return row[0] or None
+
+    def _maybe_purge(self, now):
+        """Remove entradas expiradas a cada 1000 updates aceitos"""
+        self._claims_since_purge += 1
+        if self._claims_since_purge < 1000:
+            return
+        self._claims_since_purge = 0
+        cutoff = now - self.ttl
+        self._conn.execute('DELETE FROM seen_updates WHERE created_at < ?', (cutoff,))
+        self._conn.execute('DELETE FROM message_transactions WHERE created_at < ?', (cutoff,))
+
+    def stats(self):
+        return {
+            'duplicates': self.duplicates,
+            'updates_in_memory': len(self._updates),
+            'messages_in_memory': len(self._messages)
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
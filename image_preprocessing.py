@@ -0,0 +1,94 @@
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 1600))
+BYTE_BUDGET = int(os.getenv('IMAGE_BYTE_BUDGET', 350_000))
+OUTPUT_FORMAT = os.getenv('IMAGE_FORMAT', 'JPEG').upper()
+
+# Qualidades testadas, em ordem, até caber no orçamento de bytes
+QUALITY_STEPS = (85, 75, 65, 55, 45)
+MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+
+_executor = None
+
+
+@dataclass
+class PreprocessedImage:
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    width: int
+    height: int
+    quality: int
+
+    @property
+    def output_bytes(self):
+        return len(self.data)
+
+
+def preprocess_receipt_image(image_bytes, max_dimension=None, byte_budget=None, output_format=None):
+    """
+    Prepara a foto de um recibo para o Gemini: corrige a rotação pelo EXIF,
+    converte para tons de cinza, normaliza o contraste, reduz para no máximo
+    `max_dimension` pixels no maior lado e recodifica (JPEG/WebP) até caber
+    em `byte_budget` bytes.
+    """
+    max_dimension = max_dimension or MAX_DIMENSION
+    byte_budget = byte_budget or BYTE_BUDGET
+    output_format = (output_format or OUTPUT_FORMAT).upper()
+
+    with Image.open(io.BytesIO(image_bytes)) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('L')
+        image = ImageOps.autocontrast(image, cutoff=1)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    while True:
+        for quality in QUALITY_STEPS:
+            buffer = io.BytesIO()
+            image.save(buffer, format=output_format, quality=quality, optimize=True)
+            if buffer.tell() <= byte_budget:
+                break
+
+        # Nem a menor qualidade coube: reduz a resolução e tenta de novo
+        if buffer.tell() <= byte_budget or max(image.size) <= 512:
+            break
+        image = image.resize((int(image.width * 0.8), int(image.height * 0.8)), Image.LANCZOS)
+
+    result = PreprocessedImage(
+        data=buffer.getvalue(),
+        mime_type=MIME_TYPES.get(output_format, 'image/jpeg'),
+        original_bytes=len(image_bytes),
+        width=image.width,
+        height=image.height,
+        quality=quality
+    )
+    logger.info(
+        f"Imagem pré-processada: {result.original_bytes} -> {result.output_bytes} bytes "
+        f"({result.width}x{result.height}, {output_format} q={quality})"
+    )
+    return result
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # Pillow libera o GIL na decodificação, redimensionamento e codificação
+        workers = int(os.getenv('IMAGE_PREPROCESS_WORKERS', min(4, os.cpu_count() or 1)))
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-preprocess')
+    return _executor
+
+
+async def preprocess_receipt_image_async(image_bytes, **kwargs):
+    """Executa preprocess_receipt_image no pool de workers, fora do event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), partial(preprocess_receipt_image, bytes(image_bytes), **kwargs))
@@ -0,0 +1,119 @@
+"""
+Parser incremental para o objeto JSON de topo de uma resposta em streaming: recebe o
+texto em pedaços e devolve cada campo assim que o seu valor termina ("establishment",
+"total_amount"...), e cada elemento dos arrays de topo ("items") assim que fecha,
+sem esperar o restante do documento.
+"""
+import json
+
+WHITESPACE = ' \t\r\n'
+
+
+class _Frame:
+    """Objeto ou array aberto: chave atual (objetos), início do valor atual e índice (arrays)"""
+    __slots__ = ('kind', 'expect_key', 'key', 'key_start', 'start', 'primitive', 'index')
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.expect_key = kind == '{'
+        self.key = None
+        self.key_start = None
+        self.start = None
+        self.primitive = False
+        self.index = 0
+
+
+class IncrementalJSONParser:
+    """
+    `feed(pedaço)` devolve a lista de eventos completados pelo pedaço: (('campo',), valor)
+    para campos do objeto de topo e (('campo', i), valor) para elementos de arrays de topo.
+    `partial` acumula o que já foi lido; os arrays em andamento trazem os elementos completos.
+    Texto antes do primeiro "{" (ex.: cercas de markdown) é ignorado.
+    """
+
+    def __init__(self):
+        self.partial = {}
+        self.done = False
+        self._text = ''
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk):
+        events = []
+        text = self._text = self._text + chunk
+        stack = self._stack
+        for i in range(self._pos, len(text)):
+            if self.done:
+                break
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    frame = stack[-1]
+                    if frame.expect_key:
+                        frame.key = json.loads(text[frame.key_start:i + 1])
+                        frame.expect_key = False
+                    else:
+                        self._value_end(i + 1, events)
+                continue
+            if c in WHITESPACE:
+                continue
+            if not stack:
+                if c == '{':
+                    stack.append(_Frame(c))
+                continue
+
+            frame = stack[-1]
+            if c == '"':
+                self._in_string = True
+                if frame.expect_key:
+                    frame.key_start = i
+                else:
+                    frame.start = i
+            elif c == '{' or c == '[':
+                frame.start = i
+                stack.append(_Frame(c))
+            elif c == '}' or c == ']':
+                if frame.primitive:
+                    self._value_end(i, events)
+                stack.pop()
+                if stack:
+                    self._value_end(i + 1, events)
+                else:
+                    self.done = True
+            elif c == ',':
+                if frame.primitive:
+                    self._value_end(i, events)
+                frame.expect_key = frame.kind == '{'
+            elif c == ':':
+                continue
+            elif frame.start is None:
+                # Número, true, false ou null: termina na próxima vírgula ou fechamento
+                frame.start = i
+                frame.primitive = True
+        self._pos = len(text)
+        return events
+
+    def _value_end(self, end, events):
+        stack = self._stack
+        frame = stack[-1]
+        start, frame.start, frame.primitive = frame.start, None, False
+        depth = len(stack)
+        if depth == 1:
+            value = json.loads(self._text[start:end])
+            self.partial[frame.key] = value
+            events.append(((frame.key,), value))
+        elif depth == 2 and frame.kind == '[':
+            key = stack[0].key
+            value = json.loads(self._text[start:end])
+            self.partial.setdefault(key, []).append(value)
+            events.append(((key, frame.index), value))
+            frame.index += 1
+        elif frame.kind == '[':
+            frame.index += 1
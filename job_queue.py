@@ -0,0 +1,314 @@
+"""
+Fila de jobs persistente em SQLite para o webhook: o update é gravado e confirmado
+ao Telegram em milissegundos; um worker (no próprio processo ou em `worker.py`)
+reivindica os jobs com lease, processa com paralelismo limitado e repete falhas
+com backoff exponencial.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, replace
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: dict
+    attempts: int
+    max_attempts: int
+
+    @property
+    def final_attempt(self):
+        return self.attempts >= self.max_attempts
+
+
+class JobQueue:
+    """
+    Tabela de jobs em um SQLite ao lado do banco de transações.
+
+    Estados: 'pending' (aguardando run_at), 'running' (lease até lease_until) e
+    'failed' (tentativas esgotadas, mantido para inspeção). Jobs concluídos são apagados.
+    Um lease vencido (worker morto ou travado) devolve o job para a fila.
+
+    Jobs com o mesmo `ordering_key` (ex.: o chat) rodam um de cada vez, na ordem de `sequence`
+    (ex.: update_id): um job só é reivindicado quando nenhum anterior da mesma chave está
+    pendente ou em execução.
+    """
+
+    def __init__(self, db_path=None, lease_seconds=None, max_attempts=None, retry_base=None):
+        if db_path:
+            self.db_path = db_path
+        else:
+            transactions_db = os.getenv('DATABASE_PATH', '/tmp/financial_data.db')
+            self.db_path = os.getenv(
+                'JOB_QUEUE_PATH',
+                os.path.join(os.path.dirname(transactions_db), 'jobs.db')
+            )
+        self.lease_seconds = float(lease_seconds or os.getenv('JOB_LEASE_SECONDS', 120))
+        self.max_attempts = int(max_attempts or os.getenv('JOB_MAX_ATTEMPTS', 5))
+        self.retry_base = float(retry_base if retry_base is not None else os.getenv('JOB_RETRY_BASE_S', 2))
+
+        dirpath = os.path.dirname(self.db_path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_at REAL NOT NULL,
+                lease_until REAL,
+                worker_id TEXT,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                ordering_key TEXT,
+                sequence INTEGER
+            )
+        ''')
+        # Filas criadas antes da ordenação por chave
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        for column, column_type in (('ordering_key', 'TEXT'), ('sequence', 'INTEGER')):
+            if column not in columns:
+                self._conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {column_type}')
+        # Próximos jobs prontos / leases vencidos, em ordem de execução
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs (status, run_at)')
+        # Jobs anteriores da mesma chave (bloqueiam os seguintes)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_ordering ON jobs (ordering_key, sequence)')
+
+    def enqueue(self, kind, payload, delay=0, ordering_key=None, sequence=None):
+        """
+        Grava um job (payload serializável em JSON) e retorna o seu id. Com `ordering_key`,
+        espera os jobs da mesma chave com `sequence` menor (sem sequence, vale a ordem de chegada).
+        """
+        now = time.time()
+        with self._lock:
+            job_id = self._conn.execute('''
+                INSERT INTO jobs (kind, payload, max_attempts, run_at, created_at, ordering_key, sequence)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (kind, json.dumps(payload, ensure_ascii=False), self.max_attempts, now + delay, now,
+                  None if ordering_key is None else str(ordering_key), sequence)).lastrowid
+            if sequence is None:
+                self._conn.execute('UPDATE jobs SET sequence = id WHERE id = ?', (job_id,))
+            return job_id
+
+    def claim(self, worker_id, limit=1, job_id=None, ordered=True):
+        """
+        Reivindica até `limit` jobs prontos (ou com lease vencido) para o worker; com `job_id`,
+        só esse job, se ainda estiver disponível. `ordered=False` ignora a espera pelos jobs
+        anteriores da mesma chave.
+        BEGIN IMMEDIATE garante que dois workers, mesmo em processos diferentes, não peguem o mesmo job.
+        """
+        now = time.time()
+        only_id = ' AND id = ?' if job_id is not None else ''
+        in_order = '''
+            AND (ordering_key IS NULL OR NOT EXISTS (
+                SELECT 1 FROM jobs AS earlier
+                WHERE earlier.ordering_key = jobs.ordering_key AND earlier.sequence < jobs.sequence
+                AND earlier.status IN ('pending', 'running')
+            ))''' if ordered else ''
+        params = (now, now) + ((job_id,) if job_id is not None else ()) + (limit,)
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(f'''
+                    SELECT id, kind, payload, attempts, max_attempts FROM jobs
+                    WHERE ((status = 'pending' AND run_at <= ?) OR (status = 'running' AND lease_until < ?)){only_id}{in_order}
+                    ORDER BY run_at, id
+                    LIMIT ?
+                ''', params).fetchall()
+                self._conn.executemany('''
+                    UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, worker_id = ?
+                    WHERE id = ?
+                ''', [(now + self.lease_seconds, worker_id, row[0]) for row in rows])
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+        return [
+            Job(id=row[0], kind=row[1], payload=json.loads(row[2]), attempts=row[3] + 1, max_attempts=row[4])
+            for row in rows
+        ]
+
+    def extend_leases(self, worker_id, job_ids):
+        """Renova o lease dos jobs ainda em execução pelo worker"""
+        if not job_ids:
+            return
+        lease_until = time.time() + self.lease_seconds
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                [(lease_until, job_id, worker_id) for job_id in job_ids]
+            )
+
+    def complete(self, job, worker_id):
+        with self._lock:
+            self._conn.execute('DELETE FROM jobs WHERE id = ? AND worker_id = ?', (job.id, worker_id))
+
+    def fail(self, job, worker_id, error):
+        """Agenda nova tentativa com backoff exponencial (com jitter) ou marca o job como 'failed'"""
+        if job.final_attempt:
+            status, run_at = 'failed', time.time()
+            logger.error(f"Job {job.id} ({job.kind}) falhou após {job.attempts} tentativas: {error}")
+        else:
+            delay = self.retry_base * 2 ** (job.attempts - 1)
+            status, run_at = 'pending', time.time() + random.uniform(delay / 2, delay)
+            logger.warning(f"Job {job.id} ({job.kind}) falhou (tentativa {job.attempts}), nova tentativa em "
+                           f"{run_at - time.time():.1f} s: {error}")
+
+        with self._lock:
+            self._conn.execute('''
+                UPDATE jobs SET status = ?, run_at = ?, lease_until = NULL, last_error = ?
+                WHERE id = ? AND worker_id = ?
+            ''', (status, run_at, str(error)[:1000], job.id, worker_id))
+
+    def status(self, job_id):
+        """'pending', 'running', 'failed' ou None (concluído ou inexistente)"""
+        with self._lock:
+            row = self._conn.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {'pending': 0, 'running': 0, 'failed': 0, **dict(rows)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobWorker:
+    """
+    Processa os jobs da fila no event loop atual, com no máximo `concurrency`
+    handlers simultâneos. `handler(job)` é uma corrotina; exceções agendam nova tentativa.
+    """
+
+    def __init__(self, job_queue, handler, concurrency=None, poll_interval=None):
+        self.queue = job_queue
+        self.handler = handler
+        self.concurrency = int(concurrency or os.getenv('JOB_WORKER_CONCURRENCY', 4))
+        self.poll_interval = float(poll_interval or os.getenv('JOB_POLL_INTERVAL', 0.5))
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.processed = 0
+        self.errors = 0
+        self._running = {}
+        self._wakeup = None
+        self._task = None
+        self._stopping = False
+
+    def start(self):
+        """Inicia o loop do worker como tarefa no event loop atual"""
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    def notify(self):
+        """Acorda o worker sem esperar o próximo poll (ex.: logo após enqueue no mesmo processo)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self, timeout=30):
+        """Para de reivindicar jobs e espera os que estão em execução"""
+        self._stopping = True
+        self.notify()
+        if self._task is not None:
+            await self._task
+        if self._running:
+            await asyncio.wait(list(self._running.values()), timeout=timeout)
+
+    async def _run(self):
+        last_heartbeat = time.monotonic()
+        while not self._stopping:
+            free = self.concurrency - len(self._running)
+            jobs = []
+            if free > 0:
+                try:
+                    jobs = await asyncio.to_thread(self.queue.claim, self.worker_id, free)
+                except Exception as e:
+                    logger.error(f"Erro ao reivindicar jobs: {e}")
+
+            for job in jobs:
+                task = asyncio.get_running_loop().create_task(self._process(job))
+                self._running[job.id] = task
+                task.add_done_callback(lambda _, job_id=job.id: self._job_finished(job_id))
+
+            # Renova os leases dos jobs longos antes que vençam
+            if self._running and time.monotonic() - last_heartbeat >= self.queue.lease_seconds / 3:
+                await asyncio.to_thread(self.queue.extend_leases, self.worker_id, list(self._running))
+                last_heartbeat = time.monotonic()
+
+            # Com vagas e jobs encontrados, tenta pegar mais na hora; senão espera um aviso ou o poll
+            if jobs and len(self._running) < self.concurrency:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def run_now(self, job_id):
+        """
+        Processa no chamador, sem o loop do worker, só o job `job_id`, como última tentativa:
+        sem worker rodando (lifespan não executado, serverless) ninguém executaria uma
+        retentativa agendada, então uma falha cai direto no tratamento final do handler.
+        Um job anterior do mesmo chat em andamento (outro request) é esperado por até
+        lease_seconds; depois disso o job roda fora de ordem para não ficar sem ninguém que o execute.
+        Retorna True se o job ainda estava disponível.
+        """
+        deadline = time.monotonic() + self.queue.lease_seconds
+        while True:
+            jobs = await asyncio.to_thread(self.queue.claim, self.worker_id, 1, job_id)
+            if jobs or await asyncio.to_thread(self.queue.status, job_id) != 'pending':
+                break
+            if time.monotonic() >= deadline:
+                logger.warning(f"Job {job_id} processado fora de ordem: o anterior da mesma chave não terminou")
+                jobs = await asyncio.to_thread(self.queue.claim, self.worker_id, 1, job_id, False)
+                break
+            await asyncio.sleep(self.poll_interval)
+        for job in jobs:
+            await self._process(replace(job, max_attempts=job.attempts))
+        return bool(jobs)
+
+    def _job_finished(self, job_id):
+        self._running.pop(job_id, None)
+        # Uma vaga abriu: o loop pode reivindicar o próximo job
+        self.notify()
+
+    async def _process(self, job):
+        try:
+            await self.handler(job)
+        except Exception as e:
+            self.errors += 1
+            await asyncio.to_thread(self.queue.fail, job, self.worker_id, e)
+        else:
+            self.processed += 1
+            await asyncio.to_thread(self.queue.complete, job, self.worker_id)
+
+    def stats(self):
+        return {
+            'worker_id': self.worker_id,
+            'running': len(self._running),
+            'processed': self.processed,
+            'errors': self.errors,
+            **self.queue.stats()
+        }
@@ -0,0 +1,224 @@
+"""
+Parser local e determinístico para descrições curtas de gastos
+("gastei 50 reais no uber", "mercado 120,90").
+
+Entradas com confiança alta são respondidas sem chamar o Gemini;
+as ambíguas (vários valores, sem categoria, textos longos) seguem para a API.
+"""
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from category_classifier import DEFAULT_CATEGORY, classifier, fold
+
+DEFAULT_ESTABLISHMENT = "Estabelecimento não identificado"
+
+WEEKDAYS = {
+    'segunda': 0, 'terca': 1, 'quarta': 2, 'quinta': 3, 'sexta': 4, 'sabado': 5, 'domingo': 6
+}
+
+# Verbos e palavras que não fazem parte do nome do estabelecimento
+STOP_WORDS = {
+    'gastei', 'paguei', 'comprei', 'gasto', 'compra', 'pagamento', 'foi', 'deu', 'custou', 'saiu', 'fiz',
+    'de', 'da', 'do', 'das', 'dos', 'no', 'na', 'nos', 'nas', 'em', 'num', 'numa', 'com', 'por', 'pra',
+    'para', 'pelo', 'pela', 'e', 'o', 'a', 'os', 'as', 'um', 'uma', 'reais', 'real', 'conto', 'contos',
+    'pila', 'pilas', 'mil', 'r$', 'rs', 'hoje', 'ontem', 'anteontem', 'dia', 'passada', 'passado',
+    'feira', 'valor', 'total', 'eu', 'me', 'meu', 'minha'
+} | set(WEEKDAYS) | {f'{day}-feira' for day in ('segunda', 'terca', 'quarta', 'quinta', 'sexta')}
+
+ESTABLISHMENT_PREPOSITIONS = ('no', 'na', 'num', 'numa', 'em', 'pelo', 'pela')
+
+CURRENCY_BEFORE_RE = re.compile(r'(?:r\$|rs)\s*$')
+CURRENCY_AFTER_RE = re.compile(r'^\s*(reais|real|contos?|pilas?|mil)\b')
+AMOUNT_RE = re.compile(r'(?<![\w/.,:-])(\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d+(?:[.,]\d{1,2})?)(?![\w/:]|[.,]\d)')
+DATE_SLASH_RE = re.compile(r'\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b')
+DATE_ISO_RE = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+DAY_OF_MONTH_RE = re.compile(r'\bdia (\d{1,2})\b')
+TIME_RE = re.compile(r'\b\d{1,2}(?::\d{2}|h\d{0,2})\b')
+WORD_RE = re.compile(r"[\w$]+(?:[-'][\w]+)*")
+PREVIOUS_WORD_RE = re.compile(r"([\w$]+)\W*$")
+NEXT_WORD_RE = re.compile(r"^\W*([\w$]+)")
+
+
+@dataclass
+class LocalParseResult:
+    data: dict
+    confidence: float
+
+
+def parse_amount(token):
+    """Converte valores no formato brasileiro: "1.234,56", "12,9", "1.234", "12.50" """
+    if ',' in token:
+        return float(token.replace('.', '').replace(',', '.'))
+    if re.fullmatch(r'\d{1,3}(?:\.\d{3})+', token):
+        return float(token.replace('.', ''))
+    return float(token)
+
+
+def _price_evidence(masked, match):
+    """
+    Para um número sem marcador de moeda: 'decimal' ("23,50"), 'quantity' quando vem antes de
+    um substantivo ("3 cervejas", "comprei 10 pães"), 'keyword' quando está colado ao nome do
+    estabelecimento/categoria ("uber 23", "50 no uber") ou 'bare'
+    """
+    if re.search(r'[.,]', match.group(1)):
+        return 'decimal'
+    following = NEXT_WORD_RE.match(masked[match.end():])
+    if following and following.group(1) not in STOP_WORDS and not following.group(1)[0].isdigit():
+        return 'quantity'
+    if following and following.group(1) in ESTABLISHMENT_PREPOSITIONS:
+        return 'keyword'
+    previous = PREVIOUS_WORD_RE.search(masked[:match.start()])
+    if previous and previous.group(1) not in STOP_WORDS and not previous.group(1)[0].isdigit():
+        return 'keyword'
+    return 'bare'
+
+
+def _find_amounts(folded):
+    """
+    Lista de (valor, tem_marcador_de_moeda, evidência) fora de datas e horários;
+    a evidência de preço dos números sem moeda vem de _price_evidence
+    """
+    masked = DATE_ISO_RE.sub(lambda m: ' ' * len(m.group()), folded)
+    masked = DATE_SLASH_RE.sub(lambda m: ' ' * len(m.group()), masked)
+    masked = DAY_OF_MONTH_RE.sub(lambda m: ' ' * len(m.group()), masked)
+    masked = TIME_RE.sub(lambda m: ' ' * len(m.group()), masked)
+
+    amounts = []
+    for match in AMOUNT_RE.finditer(masked):
+        value = parse_amount(match.group(1))
+        after = CURRENCY_AFTER_RE.match(masked[match.end():])
+        has_currency = bool(after or CURRENCY_BEFORE_RE.search(masked[:match.start()]))
+        if after and after.group(1) == 'mil':
+            value *= 1000
+        evidence = 'currency' if has_currency else _price_evidence(masked, match)
+        amounts.append((round(value, 2), has_currency, evidence))
+    return amounts
+
+
+def _find_date(folded, today):
+    match = DATE_ISO_RE.search(folded)
+    if match:
+        try:
+            return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            pass
+
+    match = DATE_SLASH_RE.search(folded)
+    if match:
+        day, month, year = int(match.group(1)), int(match.group(2)), match.group(3)
+        year = int(year) + (2000 if len(year) == 2 else 0) if year else today.year
+        try:
+            found = date(year, month, day)
+            # "15/12" dito em janeiro se refere ao ano anterior
+            if not match.group(3) and found > today:
+                found = found.replace(year=year - 1)
+            return found
+        except ValueError:
+            pass
+
+    if re.search(r'\banteontem\b', folded):
+        return today - timedelta(days=2)
+    if re.search(r'\bontem\b', folded):
+        return today - timedelta(days=1)
+
+    for name, weekday in WEEKDAYS.items():
+        if re.search(rf'\b{name}\b', folded):
+            # Ocorrência mais recente que não esteja no futuro
+            return today - timedelta(days=(today.weekday() - weekday) % 7)
+
+    match = DAY_OF_MONTH_RE.search(folded)
+    if match:
+        day = int(match.group(1))
+        try:
+            found = today.replace(day=day)
+            if found > today:
+                previous_month = today.replace(day=1) - timedelta(days=1)
+                found = previous_month.replace(day=day)
+            return found
+        except ValueError:
+            pass
+
+    return None
+
+
+def _find_establishment(text):
+    """Nome após 'no/na/em...' ou palavras iniciais antes do valor ("mercado 120,90")"""
+    words = WORD_RE.findall(text)
+    folded_words = [fold(w) for w in words]
+
+    def take_name(start):
+        name = []
+        for word, folded_word in zip(words[start:], folded_words[start:]):
+            if folded_word in STOP_WORDS or folded_word[0].isdigit() or len(name) == 3:
+                break
+            name.append(word)
+        return ' '.join(name)
+
+    for i, folded_word in enumerate(folded_words[:-1]):
+        if folded_word in ESTABLISHMENT_PREPOSITIONS:
+            name = take_name(i + 1)
+            if name:
+                return name
+
+    return take_name(0) or None
+
+
+def parse_transaction_text(text, today=None):
+    """
+    Extrai valor, data, estabelecimento e categoria de uma descrição curta de gasto.
+    Retorna um LocalParseResult com os dados no mesmo formato da análise do Gemini
+    e uma confiança entre 0 e 1.
+    """
+    today = today or date.today()
+    folded = fold(text)
+    word_count = len(WORD_RE.findall(folded))
+
+    amounts = _find_amounts(folded)
+    with_currency = [value for value, has_currency, _ in amounts if has_currency]
+    confidence = 0.0
+
+    # Um único valor com marcador de moeda é inequívoco; sem marcador, só conta como preço
+    # com decimais ou colado ao estabelecimento/categoria ("uber 23"): "3 cervejas" é
+    # quantidade e fica abaixo do limiar. Vários valores com moeda geralmente são itens
+    # diferentes: deixa para o Gemini
+    if len(with_currency) == 1:
+        total_amount = with_currency[0]
+        confidence += 0.6 if len(amounts) == 1 else 0.3
+    elif len(amounts) == 1:
+        total_amount, _, evidence = amounts[0]
+        confidence += {'decimal': 0.5, 'keyword': 0.5, 'bare': 0.2}.get(evidence, 0.0)
+    else:
+        total_amount = max((value for value, _, _ in amounts), default=0.0)
+
+    category = classifier.classify(text)
+    if category != DEFAULT_CATEGORY:
+        confidence += 0.3
+
+    establishment = _find_establishment(text)
+    if establishment:
+        confidence += 0.1
+
+    if word_count <= 8:
+        confidence += 0.1
+    elif word_count > 15:
+        confidence -= 0.3
+
+    transaction_date = _find_date(folded, today) or today
+    description = establishment or text.strip()[:100]
+
+    data = {
+        "establishment": establishment.title() if establishment else DEFAULT_ESTABLISHMENT,
+        "date": transaction_date.isoformat(),
+        "total_amount": total_amount,
+        "category": category,
+        "items": [{
+            "description": description,
+            "quantity": 1,
+            "unit_price": total_amount,
+            "total_price": total_amount,
+            "category": category
+        }] if total_amount else [],
+        "raw_text": text[:1000]
+    }
+    return LocalParseResult(data=data, confidence=round(max(0.0, min(confidence, 1.0)), 2))
@@ -1,5 +1,6 @@
 from telegram_bot import TelegramBot
 from gemini_vision import GeminiAIClient
+from analysis_cache import AnalysisCache
 from config import Config
 import logging
 
@@ -11,7 +12,7 @@ logging.basicConfig(
 
 def main():
     config = Config()
-    gemini_client = GeminiAIClient(config.GEMINI_API_KEY)
+    gemini_client = GeminiAIClient(config.GEMINI_API_KEY, cache=AnalysisCache())
     bot = TelegramBot(config.TELEGRAM_BOT_TOKEN, gemini_client)
     
     # logger.info("Bot iniciado com processamento de imagem, texto, áudio e banco de dados")
@@ -0,0 +1,248 @@
+"""
+Métricas leves compartilhadas pelo bot e pelo webhook: histogramas de latência por etapa
+(download, stt, gemini, json_extract, db_write, send_message), erros por etapa, bytes e
+tokens trocados com o Gemini, roteamento por nível de modelo e caminhos alternativos de
+análise (parser local, cache, fallback).
+
+Exportadas no formato de texto do Prometheus pela rota /metrics do webhook e, no bot
+por polling, por um servidor HTTP opcional (METRICS_PORT). METRICS_ENABLED=0 desativa
+a coleta (os timers viram no-op).
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Limites dos buckets de latência (s): de downloads locais a chamadas lentas ao Gemini
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label_values -> [contagem por bucket (+Inf no fim), soma, total]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, label_values, ("le", le))} {cumulative}')
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class _StageTimer:
+    """Context manager de timed(): registra a duração e, se houver exceção, o erro da etapa"""
+    __slots__ = ('registry', 'stage', 'start')
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.stage_seconds.observe(time.perf_counter() - self.start, self.stage)
+        if exc_type is not None:
+            self.registry.stage_errors.inc(self.stage)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class MetricsRegistry:
+    def __init__(self, enabled=None, prefix='fintracker'):
+        if enabled is None:
+            enabled = os.getenv('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+        self.enabled = enabled
+        self.stage_seconds = Histogram(
+            f'{prefix}_stage_seconds', 'Duração de cada etapa do processamento', ('stage',)
+        )
+        self.stage_errors = Counter(f'{prefix}_stage_errors_total', 'Erros por etapa do processamento', ('stage',))
+        self.gemini_bytes = Counter(
+            f'{prefix}_gemini_bytes_total', 'Bytes enviados e recebidos da API Gemini', ('direction',)
+        )
+        self.gemini_tokens = Counter(
+            f'{prefix}_gemini_tokens_total', 'Tokens de prompt e de resposta informados pela API Gemini', ('kind',)
+        )
+        self.fallbacks = Counter(
+            f'{prefix}_fallback_total', 'Análises resolvidas fora da chamada normal ao Gemini', ('path',)
+        )
+        self.gemini_routes = Counter(
+            f'{prefix}_gemini_routes_total', 'Nível de modelo escolhido para cada requisição ao Gemini', ('tier', 'reason')
+        )
+        self.gemini_tier_seconds = Histogram(
+            f'{prefix}_gemini_tier_seconds', 'Duração de cada tentativa ao Gemini por nível de modelo', ('tier',)
+        )
+        self.gemini_failovers = Counter(
+            f'{prefix}_gemini_failovers_total', 'Trocas de chave ou de nível de modelo após 429', ('kind',)
+        )
+        self._metrics = [
+            self.stage_seconds, self.stage_errors, self.gemini_bytes, self.gemini_tokens, self.fallbacks,
+            self.gemini_routes, self.gemini_tier_seconds, self.gemini_failovers,
+        ]
+
+    def timed(self, stage):
+        """`with metrics.timed('gemini'):` mede a etapa e conta exceções como erro"""
+        return _StageTimer(self, stage) if self.enabled else _NOOP_TIMER
+
+    def observe(self, stage, seconds):
+        if self.enabled:
+            self.stage_seconds.observe(seconds, stage)
+
+    def error(self, stage):
+        if self.enabled:
+            self.stage_errors.inc(stage)
+
+    def fallback(self, path, amount=1):
+        if self.enabled:
+            self.fallbacks.inc(path, amount=amount)
+
+    def gemini_traffic(self, sent, received):
+        if self.enabled:
+            self.gemini_bytes.inc('sent', amount=sent)
+            self.gemini_bytes.inc('received', amount=received)
+
+    def gemini_usage(self, prompt_tokens, response_tokens):
+        if self.enabled:
+            self.gemini_tokens.inc('prompt', amount=prompt_tokens)
+            self.gemini_tokens.inc('response', amount=response_tokens)
+
+    def gemini_route(self, tier, reason):
+        if self.enabled:
+            self.gemini_routes.inc(tier, reason)
+
+    def gemini_tier_call(self, tier, seconds):
+        if self.enabled:
+            self.gemini_tier_seconds.observe(seconds, tier)
+
+    def gemini_failover(self, kind):
+        if self.enabled:
+            self.gemini_failovers.inc(kind)
+
+    def stage_summary(self):
+        """{etapa: {'count', 'seconds', 'errors'}} (usado pelos benchmarks)"""
+        with self.stage_seconds._lock:
+            series = {labels[0]: (count, total) for labels, (_, total, count) in self.stage_seconds._series.items()}
+        return {
+            stage: {'count': count, 'seconds': total, 'errors': self.stage_errors.value(stage)}
+            for stage, (count, total) in series.items()
+        }
+
+    def render(self):
+        """Todas as métricas no formato de exposição de texto do Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+def start_exporter(port, host='0.0.0.0', registry=metrics):
+    """Servidor HTTP em thread daemon com GET /metrics (para o bot por polling)"""
+    # http.server só é importado aqui: o webhook serve /metrics pelo FastAPI
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-exporter', daemon=True).start()
+    logger.info(f"Métricas disponíveis em http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -1,32 +1,68 @@
 #!/usr/bin/env python3
+import argparse
+import os
 import sqlite3
 import logging
 
+import migrations
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def migrate_database():
-    """Migra o banco de dados existente para adicionar a coluna input_method"""
+def migrate_database(db_path=None):
+    """Aplica as migrações pendentes (PRAGMA user_version) no banco usado pelo bot"""
+    db_path = db_path or os.getenv('DATABASE_PATH', '/tmp/financial_data.db')
     try:
-        conn = sqlite3.connect('financial_data.db')
-        cursor = conn.cursor()
-        
-        # Verificar se a coluna input_method já existe
-        cursor.execute("PRAGMA table_info(transactions)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'input_method' not in columns:
-            logger.info("Adicionando coluna input_method à tabela transactions...")
-            cursor.execute('ALTER TABLE transactions ADD COLUMN input_method TEXT DEFAULT "image"')
-            conn.commit()
-            logger.info("Coluna input_method adicionada com sucesso!")
-        else:
-            logger.info("Coluna input_method já existe na tabela transactions")
-        
+        conn = sqlite3.connect(db_path)
+        before = migrations.get_version(conn)
+        after = migrations.migrate(conn)
         conn.close()
-        
+
+        if before == after:
+            logger.info(f"Banco {db_path} já está na versão {after}")
+        else:
+            logger.info(f"Banco {db_path} migrado da versão {before} para {after}")
+
     except Exception as e:
         logger.error(f"Erro na migração do banco de dados: {str(e)}")
 
+def check_aggregates(db_path=None, rebuild=False):
+    """Verifica (e opcionalmente reconstrói) o agregado chat_category_month"""
+    from database_manager import DatabaseManager
+
+    db = DatabaseManager(db_path)
+    if rebuild:
+        db.rebuild_aggregates()
+
+    mismatches = db.check_aggregates()
+    if mismatches:
+        logger.warning(f"{len(mismatches)} linhas divergentes em chat_category_month:")
+        for row in mismatches[:20]:
+            logger.warning(f"  {row}")
+    else:
+        logger.info("Agregado chat_category_month consistente com transactions")
+    db.close()
+
+def recategorize_items(db_path=None, overwrite=False):
+    """Reclassifica as categorias dos itens históricos com o classificador local"""
+    from database_manager import DatabaseManager
+
+    db = DatabaseManager(db_path)
+    updated = db.recategorize_items(only_uncategorized=not overwrite)
+    logger.info(f"{updated} itens reclassificados")
+    db.close()
+
 if __name__ == "__main__":
-    migrate_database()
+    parser = argparse.ArgumentParser(description="Migrações e manutenção do banco do FinTracker")
+    parser.add_argument("db_path", nargs="?", help="caminho do banco (padrão: DATABASE_PATH ou /tmp/financial_data.db)")
+    parser.add_argument("--check-aggregates", action="store_true", help="compara o agregado do /resumo com as transações")
+    parser.add_argument("--rebuild-aggregates", action="store_true", help="recalcula o agregado do /resumo")
+    parser.add_argument("--recategorize-items", action="store_true", help="preenche categorias de itens sem categoria")
+    parser.add_argument("--overwrite", action="store_true", help="com --recategorize-items, reclassifica todos os itens")
+    args = parser.parse_args()
+
+    migrate_database(args.db_path)
+    if args.check_aggregates or args.rebuild_aggregates:
+        check_aggregates(args.db_path, rebuild=args.rebuild_aggregates)
+    if args.recategorize_items:
+        recategorize_items(args.db_path, overwrite=args.overwrite)
@@ -0,0 +1,209 @@
+"""
+Migrações versionadas do banco de dados.
+
+A versão do schema fica em PRAGMA user_version. Em um banco já atualizado,
+migrate() faz apenas essa leitura e não executa nenhum DDL.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _create_base_tables(cursor):
+    """Tabelas originais; também atualiza bancos antigos criados sem input_method"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id TEXT NOT NULL,
+            establishment_name TEXT,
+            transaction_date DATE,
+            total_amount REAL,
+            category TEXT,
+            items_json TEXT,
+            raw_text TEXT,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'processed',
+            input_method TEXT DEFAULT 'image'
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transaction_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id INTEGER,
+            description TEXT,
+            quantity REAL,
+            unit_price REAL,
+            total_price REAL,
+            category TEXT,
+            FOREIGN KEY (transaction_id) REFERENCES transactions (id)
+        )
+    ''')
+
+    cursor.execute("PRAGMA table_info(transactions)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if 'input_method' not in columns:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN input_method TEXT DEFAULT 'image'")
+        logger.info("Coluna input_method adicionada à tabela transactions")
+
+
+def _create_chat_indexes(cursor):
+    """Índices de cobertura para as consultas por chat"""
+    # /extrato: WHERE chat_id = ? ORDER BY processed_at DESC
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_chat_processed
+        ON transactions (chat_id, processed_at, id)
+    ''')
+    # /resumo por categoria
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_chat_category
+        ON transactions (chat_id, category, total_amount)
+    ''')
+    # /resumo por mês (strftime sobre transaction_date)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_chat_date
+        ON transactions (chat_id, transaction_date, total_amount)
+    ''')
+    # Itens de uma transação e DELETE por chat em clear_database
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transaction_items_transaction
+        ON transaction_items (transaction_id)
+    ''')
+
+
+def _aggregate_key(row):
+    """Chave (categoria, mês) de uma linha de transactions; valores nulos viram ''"""
+    return f"IFNULL({row}.category, '')", f"IFNULL(strftime('%Y-%m', {row}.transaction_date), '')"
+
+
+def _aggregate_add_sql(row):
+    category, month = _aggregate_key(row)
+    return f'''
+        INSERT INTO chat_category_month (chat_id, category, month, total_amount, transaction_count)
+        VALUES ({row}.chat_id, {category}, {month}, IFNULL({row}.total_amount, 0), 1)
+        ON CONFLICT (chat_id, category, month) DO UPDATE SET
+            total_amount = total_amount + excluded.total_amount,
+            transaction_count = transaction_count + 1;
+    '''
+
+
+def _aggregate_remove_sql(row):
+    category, month = _aggregate_key(row)
+    where = f"chat_id = {row}.chat_id AND category = {category} AND month = {month}"
+    return f'''
+        UPDATE chat_category_month
+        SET total_amount = total_amount - IFNULL({row}.total_amount, 0),
+            transaction_count = transaction_count - 1
+        WHERE {where};
+        DELETE FROM chat_category_month WHERE {where} AND transaction_count <= 0;
+    '''
+
+
+REBUILD_AGGREGATES_SQL = f'''
+    INSERT INTO chat_category_month (chat_id, category, month, total_amount, transaction_count)
+    SELECT t.chat_id, {_aggregate_key('t')[0]}, {_aggregate_key('t')[1]},
+           SUM(IFNULL(t.total_amount, 0)), COUNT(*)
+    FROM transactions t
+    GROUP BY 1, 2, 3
+'''
+
+# Linhas que divergem entre o agregado e um GROUP BY sobre a tabela bruta
+CHECK_AGGREGATES_SQL = f'''
+    WITH raw AS (
+        SELECT t.chat_id, {_aggregate_key('t')[0]} AS category, {_aggregate_key('t')[1]} AS month,
+               ROUND(SUM(IFNULL(t.total_amount, 0)), 2) AS total_amount, COUNT(*) AS transaction_count
+        FROM transactions t
+        GROUP BY 1, 2, 3
+    ),
+    agg AS (
+        SELECT chat_id, category, month, ROUND(total_amount, 2), transaction_count
+        FROM chat_category_month
+    )
+    SELECT 'transactions' AS source, * FROM (SELECT * FROM raw EXCEPT SELECT * FROM agg)
+    UNION ALL
+    SELECT 'chat_category_month' AS source, * FROM (SELECT * FROM agg EXCEPT SELECT * FROM raw)
+'''
+
+
+def _create_chat_aggregates(cursor):
+    """
+    Agregado por (chat, categoria, mês) usado pelo /resumo, mantido por triggers
+    na mesma transação de cada INSERT/UPDATE/DELETE em transactions.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_category_month (
+            chat_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            month TEXT NOT NULL,
+            total_amount REAL NOT NULL DEFAULT 0,
+            transaction_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (chat_id, category, month)
+        ) WITHOUT ROWID
+    ''')
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_aggregate
+        AFTER INSERT ON transactions
+        BEGIN
+            {_aggregate_add_sql('NEW')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_aggregate
+        AFTER DELETE ON transactions
+        BEGIN
+            {_aggregate_remove_sql('OLD')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_update_aggregate
+        AFTER UPDATE OF chat_id, category, transaction_date, total_amount ON transactions
+        BEGIN
+            {_aggregate_remove_sql('OLD')}
+            {_aggregate_add_sql('NEW')}
+        END
+    ''')
+
+    cursor.execute('DELETE FROM chat_category_month')
+    cursor.execute(REBUILD_AGGREGATES_SQL)
+
+
+# (versão, descrição, função que recebe um cursor). Só acrescente ao final.
+MIGRATIONS = [
+    (1, "tabelas transactions e transaction_items", _create_base_tables),
+    (2, "índices por chat", _create_chat_indexes),
+    (3, "agregado chat_category_month", _create_chat_aggregates),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Aplica as migrações pendentes, cada uma em sua própria transação.
+    Retorna a versão final do schema.
+    """
+    if get_version(conn) >= SCHEMA_VERSION:
+        return SCHEMA_VERSION
+
+    for version, description, apply in MIGRATIONS:
+        cursor = conn.cursor()
+        # BEGIN IMMEDIATE serializa migrações concorrentes (ex.: webhook e worker subindo juntos)
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if get_version(conn) >= version:
+                conn.rollback()
+                continue
+            apply(cursor)
+            cursor.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info(f"Migração {version} aplicada: {description}")
+
+    return get_version(conn)
@@ -0,0 +1,215 @@
+"""
+Perfilamento sob demanda de requisições reais: uma fração (PROFILE_SAMPLE_RATE) das
+chamadas do webhook e dos handlers do bot roda sob cProfile (PROFILE_MODE=cprofile) ou
+sob um amostrador de pilhas em thread (PROFILE_MODE=sample, a cada PROFILE_INTERVAL_MS).
+As estatísticas são somadas entre requisições e gravadas em PROFILE_DIR como .pstats
+(`python -m pstats`, snakeviz) ou pilhas colapsadas (.collapsed, para flamegraph.pl/speedscope).
+
+Com PROFILE_SAMPLE_RATE=0 (padrão) nada é embrulhado: `maybe_wrap` devolve a própria
+função. Só uma requisição é perfilada por vez; como o event loop é compartilhado, o perfil
+inclui o que as outras tarefas executarem enquanto ela estiver aberta.
+"""
+import functools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+MODES = ('cprofile', 'sample')
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RequestProfiler:
+    def __init__(self, sample_rate=None, mode=None, output_dir=None, interval_ms=None):
+        self.sample_rate = 0.0
+        self.mode = MODES[0]
+        self.configure(
+            sample_rate if sample_rate is not None else os.getenv('PROFILE_SAMPLE_RATE', 0),
+            mode or os.getenv('PROFILE_MODE', MODES[0]),
+        )
+        self.output_dir = output_dir or os.getenv('PROFILE_DIR', '/tmp/fintracker-profiles')
+        self.interval = float(interval_ms if interval_ms is not None else os.getenv('PROFILE_INTERVAL_MS', 5)) / 1000
+
+        self.profiled = 0
+        self.skipped_busy = 0
+        self._lock = threading.Lock()
+        self._active = False
+        self._pstats = None
+        self._stacks = Counter()
+        # Amostrador: thread criada só no primeiro perfil em modo sample
+        self._sampler = None
+        self._target_thread = None
+        self._sampling = threading.Event()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def configure(self, sample_rate=None, mode=None):
+        """Muda a fração amostrada e o modo em tempo de execução (comando de admin / rota de debug)"""
+        if sample_rate is not None:
+            sample_rate = float(sample_rate)
+            if not 0 <= sample_rate <= 1:
+                raise ValueError(f"Taxa de amostragem inválida: {sample_rate} (use 0 a 1)")
+            self.sample_rate = sample_rate
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(f"Modo de perfil inválido: {mode} (opções: {', '.join(MODES)})")
+            self.mode = mode
+
+    def wrap(self, func):
+        """Embrulha a corrotina `func`; cada chamada é perfilada com probabilidade sample_rate"""
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if self.sample_rate <= 0 or random.random() >= self.sample_rate or not self._acquire():
+                return await func(*args, **kwargs)
+            try:
+                if self.mode == 'sample':
+                    return await self._run_sampled(func, args, kwargs)
+                return await self._run_cprofile(func, args, kwargs)
+            finally:
+                self._active = False
+        return wrapper
+
+    def maybe_wrap(self, func):
+        """Decorador aplicado na importação: sem perfil ativo, a função fica intacta (custo zero)"""
+        return self.wrap(func) if self.enabled else func
+
+    def _acquire(self):
+        with self._lock:
+            if self._active:
+                self.skipped_busy += 1
+                return False
+            self._active = True
+            return True
+
+    async def _run_cprofile(self, func, args, kwargs):
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Outro profiler (ex.: um depurador) já está ativo neste processo
+            logger.warning(f"Perfil ignorado: {e}")
+            return await func(*args, **kwargs)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._merge_profile(profile)
+
+    def _merge_profile(self, profile):
+        import pstats
+        with self._lock:
+            if self._pstats is None:
+                self._pstats = pstats.Stats(profile)
+            else:
+                self._pstats.add(profile)
+            self.profiled += 1
+
+    async def _run_sampled(self, func, args, kwargs):
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_loop, name='request-profiler', daemon=True)
+            self._sampler.start()
+        self._target_thread = threading.get_ident()
+        self._sampling.set()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            self._sampling.clear()
+            with self._lock:
+                self.profiled += 1
+
+    def _sample_loop(self):
+        while True:
+            self._sampling.wait()
+            time.sleep(self.interval)
+            if not self._sampling.is_set():
+                continue
+            frame = sys._current_frames().get(self._target_thread)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            with self._lock:
+                self._stacks[key] += 1
+
+    def collapsed(self):
+        """Linhas 'raiz;...;folha contagem' no formato de pilhas colapsadas"""
+        with self._lock:
+            items = sorted(self._stacks.items())
+        return [f"{stack} {count}" for stack, count in items]
+
+    def top(self, limit=20):
+        """Funções mais caras: por tempo cumulativo (cprofile) ou por amostras na folha (sample)"""
+        with self._lock:
+            rows = []
+            if self._pstats is not None:
+                entries = sorted(self._pstats.stats.items(), key=lambda item: item[1][3], reverse=True)
+                for (filename, line, name), (_, calls, tottime, cumtime, _) in entries[:limit]:
+                    rows.append({
+                        'function': f"{name} ({os.path.basename(filename)}:{line})",
+                        'calls': calls, 'tottime': round(tottime, 6), 'cumtime': round(cumtime, 6),
+                    })
+            if self._stacks:
+                leaves = Counter()
+                for stack, count in self._stacks.items():
+                    leaves[stack.rsplit(';', 1)[-1]] += count
+                rows.extend({'function': leaf, 'samples': count} for leaf, count in leaves.most_common(limit))
+        return rows
+
+    def dump(self, output_dir=None, reset=False):
+        """Grava o agregado (.pstats e/ou .collapsed) e devolve os caminhos criados"""
+        output_dir = output_dir or self.output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        base = os.path.join(output_dir, f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}")
+        paths = []
+        with self._lock:
+            if self._pstats is not None:
+                self._pstats.dump_stats(f"{base}.pstats")
+                paths.append(f"{base}.pstats")
+            stacks = sorted(self._stacks.items())
+            if reset:
+                self._reset_locked()
+        if stacks:
+            with open(f"{base}.collapsed", 'w') as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in stacks)
+            paths.append(f"{base}.collapsed")
+        if paths:
+            logger.info(f"Perfil gravado: {', '.join(paths)}")
+        return paths
+
+    def _reset_locked(self):
+        self._pstats = None
+        self._stacks.clear()
+        self.profiled = 0
+        self.skipped_busy = 0
+
+    def reset(self):
+        with self._lock:
+            self._reset_locked()
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'mode': self.mode,
+            'profiled': self.profiled,
+            'skipped_busy': self.skipped_busy,
+            'samples': sum(self._stacks.values()),
+            'output_dir': self.output_dir,
+        }
+
+
+profiler = RequestProfiler()
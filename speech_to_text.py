@@ -1,54 +1,271 @@
-# import speech_recognition as sr
-# import tempfile
-# import os
-# from pydub import AudioSegment
+"""
+Transcrição de áudios com backends plugáveis (STT_BACKEND):
+- simulated: resposta fixa e determinística, sem dependências (padrão; usado em testes e benchmarks);
+- vosk: reconhecimento offline local (pacote vosk e um modelo em VOSK_MODEL_PATH);
+- google: Google Web Speech pelo pacote SpeechRecognition (requer rede).
+
+O áudio é decodificado em memória para PCM 16 bits mono (WAV pelo módulo wave; OGG/Opus
+do Telegram pelo ffmpeg via pipes, sem arquivos temporários) e o silêncio do início e do
+fim é removido. Decodificação e reconhecimento rodam em um pool de processos.
+"""
+import asyncio
+import io
 import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import wave
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from metrics import metrics
 
 logger = logging.getLogger(__name__)
 
-class SpeechToText:
+DEFAULT_SAMPLE_RATE = 16000
+SIMULATED_TEXT = "Transcrição simulada do áudio"
+
+
+class FFmpegNotFound(Exception):
+    """O executável do ffmpeg (STT_FFMPEG) não está disponível"""
+
+
+def decode_audio(audio_bytes, sample_rate=DEFAULT_SAMPLE_RATE):
+    """Retorna (amostras PCM 16 bits mono, taxa de amostragem) a partir de WAV ou OGG/Opus"""
+    audio_bytes = bytes(audio_bytes)
+    if audio_bytes[:4] == b'RIFF' and audio_bytes[8:12] == b'WAVE':
+        return _decode_wav(audio_bytes)
+    return _decode_ffmpeg(audio_bytes, sample_rate)
+
+
+def _decode_wav(audio_bytes):
+    with wave.open(io.BytesIO(audio_bytes)) as wav:
+        if wav.getsampwidth() != 2:
+            raise Exception(f"WAV com {wav.getsampwidth() * 8} bits não suportado (use PCM 16 bits)")
+        channels = wav.getnchannels()
+        rate = wav.getframerate()
+        samples = array('h', wav.readframes(wav.getnframes()))
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    if channels > 1:
+        # Primeiro canal basta para reconhecimento de voz
+        samples = samples[::channels]
+    return samples, rate
+
+
+def _decode_ffmpeg(audio_bytes, sample_rate):
+    ffmpeg = os.getenv('STT_FFMPEG', 'ffmpeg')
+    try:
+        result = subprocess.run(
+            [ffmpeg, '-nostdin', '-loglevel', 'error', '-i', 'pipe:0',
+             '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(sample_rate), 'pipe:1'],
+            input=audio_bytes, capture_output=True, check=True
+        )
+    except FileNotFoundError:
+        raise FFmpegNotFound("ffmpeg não encontrado: necessário para decodificar áudios OGG/Opus (STT_FFMPEG)")
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"Erro ao decodificar áudio: {e.stderr.decode(errors='replace').strip()}")
+
+    samples = array('h')
+    samples.frombytes(result.stdout[:len(result.stdout) - len(result.stdout) % 2])
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples, sample_rate
+
+
+def trim_silence(samples, sample_rate, threshold=None, frame_ms=20, padding_ms=100):
+    """Remove o silêncio do início e do fim (quadros com pico abaixo de `threshold`)"""
+    if threshold is None:
+        threshold = int(os.getenv('STT_SILENCE_THRESHOLD', 500))
+    frame = max(1, sample_rate * frame_ms // 1000)
+    total = len(samples)
+
+    def loud(start):
+        chunk = samples[start:start + frame]
+        return max(chunk) >= threshold or -min(chunk) >= threshold
+
+    starts = range(0, total, frame)
+    first = next((start for start in starts if loud(start)), None)
+    if first is None:
+        return samples[:0]
+    last = next(start for start in reversed(starts) if loud(start))
+
+    padding = sample_rate * padding_ms // 1000
+    return samples[max(0, first - padding):min(total, last + frame + padding)]
+
+
+class SimulatedBackend:
+    """
+    Backend determinístico: sempre a mesma transcrição (STT_SIMULATED_TEXT).
+    STT_SIMULATED_RTF > 0 consome CPU proporcional à duração do áudio
+    (fator de tempo real), imitando um motor local nos benchmarks.
+    """
+    name = 'simulated'
+
+    def __init__(self, text=None, real_time_factor=None):
+        self.text = text or os.getenv('STT_SIMULATED_TEXT', SIMULATED_TEXT)
+        self.real_time_factor = float(
+            real_time_factor if real_time_factor is not None else os.getenv('STT_SIMULATED_RTF', 0)
+        )
+
+    def transcribe(self, samples, sample_rate, language):
+        if self.real_time_factor > 0:
+            deadline = time.thread_time() + self.real_time_factor * len(samples) / sample_rate
+            checksum = 0
+            while time.thread_time() < deadline:
+                for sample in samples[:4096]:
+                    checksum = (checksum * 31 + sample) & 0xFFFFFFFF
+        return self.text
+
+
+class VoskBackend:
+    """Reconhecimento offline com Vosk; o modelo (VOSK_MODEL_PATH) define o idioma"""
+    name = 'vosk'
+
+    def __init__(self, model_path=None):
+        try:
+            from vosk import KaldiRecognizer, Model, SetLogLevel
+        except ImportError:
+            raise Exception("Backend vosk requer o pacote vosk (pip install vosk)")
+        model_path = model_path or os.getenv('VOSK_MODEL_PATH')
+        if not model_path:
+            raise Exception("VOSK_MODEL_PATH não definido")
+        SetLogLevel(-1)
+        self._recognizer_class = KaldiRecognizer
+        self.model = Model(model_path)
+
+    def transcribe(self, samples, sample_rate, language):
+        import json
+        recognizer = self._recognizer_class(self.model, sample_rate)
+        recognizer.AcceptWaveform(samples.tobytes())
+        return json.loads(recognizer.FinalResult()).get('text', '')
+
+
+class GoogleBackend:
+    """Google Web Speech (SpeechRecognition) com o PCM já decodificado em memória"""
+    name = 'google'
+
     def __init__(self):
-        # self.recognizer = sr.Recognizer()
-        pass
-    
+        try:
+            import speech_recognition as sr
+        except ImportError:
+            raise Exception("Backend google requer o pacote SpeechRecognition")
+        self._sr = sr
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, samples, sample_rate, language):
+        audio = self._sr.AudioData(samples.tobytes(), sample_rate, 2)
+        try:
+            return self.recognizer.recognize_google(audio, language=language)
+        except self._sr.UnknownValueError:
+            raise Exception("Não foi possível entender o áudio")
+        except self._sr.RequestError as e:
+            raise Exception(f"Erro no serviço de reconhecimento de fala: {e}")
+
+
+BACKENDS = {backend.name: backend for backend in (SimulatedBackend, VoskBackend, GoogleBackend)}
+
+# Backends já carregados neste processo (modelos são caros para carregar a cada áudio)
+_loaded_backends = {}
+
+
+def _get_backend(name):
+    backend = _loaded_backends.get(name)
+    if backend is None:
+        if name not in BACKENDS:
+            raise Exception(f"Backend de transcrição desconhecido: {name}")
+        backend = _loaded_backends[name] = BACKENDS[name]()
+    return backend
+
+
+def transcribe_pcm_pipeline(backend_name, audio_bytes, language='pt-BR'):
+    """
+    Decodifica, remove o silêncio e reconhece; roda dentro dos processos do pool.
+    Retorna (texto, segundos de áudio, segundos após o corte de silêncio).
+    O backend simulado não depende do ffmpeg (ex.: Vercel): sem custo de CPU configurado
+    o áudio nem é decodificado, e sem ffmpeg devolve a transcrição fixa mesmo assim.
+    """
+    backend = _get_backend(backend_name)
+    simulated = isinstance(backend, SimulatedBackend)
+    if simulated and backend.real_time_factor <= 0:
+        return backend.text, 0.0, 0.0
+    try:
+        samples, sample_rate = decode_audio(audio_bytes)
+    except FFmpegNotFound as e:
+        if not simulated:
+            raise
+        logger.warning(f"{e}; usando a transcrição simulada sem decodificar")
+        return backend.text, 0.0, 0.0
+    duration = len(samples) / sample_rate if sample_rate else 0.0
+    samples = trim_silence(samples, sample_rate)
+    trimmed = len(samples) / sample_rate if sample_rate else 0.0
+    if not samples:
+        raise Exception("Áudio sem fala detectada")
+    text = backend.transcribe(samples, sample_rate, language)
+    return text.strip(), duration, trimmed
+
+
+class SpeechToText:
+    def __init__(self, backend=None, process_workers=None):
+        self.backend = backend or os.getenv('STT_BACKEND', SimulatedBackend.name)
+        if self.backend not in BACKENDS:
+            raise ValueError(f"STT_BACKEND inválido: {self.backend} (opções: {', '.join(BACKENDS)})")
+        # 0 executa em uma thread (ex.: ambientes serverless sem processos extras)
+        self.process_workers = int(
+            process_workers if process_workers is not None
+            else os.getenv('STT_PROCESS_WORKERS', min(2, os.cpu_count() or 1))
+        )
+        self._pool = None
+
+        self.transcriptions = 0
+        self.audio_seconds = 0.0
+        self.speech_seconds = 0.0
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: o processo pai tem threads (event loop, pools), o que torna fork inseguro
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.process_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
+
+    def _record(self, result):
+        text, duration, trimmed = result
+        self.transcriptions += 1
+        self.audio_seconds += duration
+        self.speech_seconds += trimmed
+        logger.info(f"Áudio transcrito: {duration:.1f}s ({trimmed:.1f}s após remover silêncio)")
+        return text
+
     def transcribe_audio(self, audio_bytes, language='pt-BR'):
-        """
-        Transcreve áudio para texto usando Google Speech Recognition
-        """
-        # try:
-        #     # Salvar áudio em arquivo temporário
-        #     with tempfile.NamedTemporaryFile(delete=False, suffix='.ogg') as tmp_file:
-        #         tmp_file.write(audio_bytes)
-        #         tmp_path = tmp_file.name
-            
-        #     # Converter OGG para WAV (se necessário)
-        #     if tmp_path.endswith('.ogg'):
-        #         audio = AudioSegment.from_ogg(tmp_path)
-        #         wav_path = tmp_path.replace('.ogg', '.wav')
-        #         audio.export(wav_path, format='wav')
-        #         os.unlink(tmp_path)
-        #         audio_path = wav_path
-        #     else:
-        #         audio_path = tmp_path
-            
-        #     # Usar speech_recognition para transcrever
-        #     with sr.AudioFile(audio_path) as source:
-        #         audio_data = self.recognizer.record(source)
-        #         text = self.recognizer.recognize_google(audio_data, language=language)
-            
-        #     # Limpar arquivos temporários
-        #     os.unlink(audio_path)
-            
-        #     return text
-            
-        # except sr.UnknownValueError:
-        #     logger.error("Google Speech Recognition não entendeu o áudio")
-        #     raise Exception("Não foi possível entender o áudio")
-        # except sr.RequestError as e:
-        #     logger.error(f"Erro no serviço de reconhecimento de fala: {e}")
-        #     raise Exception("Erro no serviço de reconhecimento de fala")
-        # except Exception as e:
-        #     logger.error(f"Erro ao transcrever áudio: {str(e)}")
-        #     raise Exception(f"Erro ao processar áudio: {str(e)}")
-
-        return "Transcrição simulada do áudio"
+        """Transcreve áudio para texto no processo atual (bloqueante)"""
+        with metrics.timed('stt'):
+            result = transcribe_pcm_pipeline(self.backend, bytes(audio_bytes), language)
+        return self._record(result)
+
+    async def transcribe_audio_async(self, audio_bytes, language='pt-BR'):
+        """Transcreve áudio no pool de processos, sem bloquear o event loop"""
+        job = partial(transcribe_pcm_pipeline, self.backend, bytes(audio_bytes), language)
+        loop = asyncio.get_running_loop()
+        with metrics.timed('stt'):
+            if self.process_workers > 0:
+                result = await loop.run_in_executor(self._get_pool(), job)
+            else:
+                result = await asyncio.to_thread(job)
+        return self._record(result)
+
+    def stats(self):
+        return {
+            'backend': self.backend,
+            'transcriptions': self.transcriptions,
+            'audio_seconds': round(self.audio_seconds, 2),
+            'speech_seconds': round(self.speech_seconds, 2),
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,131 @@
+"""
+Cliente assíncrono mínimo da Bot API do Telegram para o webhook (sendMessage,
+getFile e download de arquivos) sobre um único httpx.AsyncClient com keep-alive.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import httpx
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_BASE = "https://api.telegram.org"
+
+# O Telegram garante o link de getFile por pelo menos 1 hora
+FILE_PATH_TTL = 55 * 60
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class TelegramAPI:
+    def __init__(self, token, base_url=None, timeout=30.0, max_connections=None, http2=None,
+                 file_cache_size=1024):
+        self.token = token
+        # TELEGRAM_API_BASE permite apontar para um servidor local (benchmarks)
+        self.base_url = (base_url or os.getenv('TELEGRAM_API_BASE', TELEGRAM_API_BASE)).rstrip('/')
+        self.timeout = timeout
+        self.max_connections = int(max_connections or os.getenv('TELEGRAM_MAX_CONNECTIONS', 20))
+
+        # HTTP/2 multiplexa as chamadas em uma conexão; requer o pacote h2 (httpx[http2])
+        if http2 is None:
+            http2 = os.getenv('TELEGRAM_HTTP2', '0').lower() in ('1', 'true', 'yes')
+        if http2 and not _http2_available():
+            logger.warning("TELEGRAM_HTTP2 ativo, mas o pacote h2 não está instalado; usando HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+
+        # file_unique_id -> (file_path, obtido em)
+        self.file_cache_size = file_cache_size
+        self.file_path_hits = 0
+        self.file_path_misses = 0
+        self._file_paths = OrderedDict()
+
+        self._client = None
+        self._client_loop = None
+
+    @property
+    def bot_url(self):
+        return f"{self.base_url}/bot{self.token}"
+
+    def _get_client(self):
+        """
+        Cliente httpx compartilhado (pool de conexões keep-alive).
+        É recriado se o event loop mudar, pois conexões não podem ser reaproveitadas entre loops.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0
+                ),
+                http2=self.http2
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def send_message(self, chat_id, text):
+        with metrics.timed('send_message'):
+            response = await self._get_client().post(
+                f"{self.bot_url}/sendMessage", json={"chat_id": chat_id, "text": text}
+            )
+            response.raise_for_status()
+        return response.json()
+
+    async def get_file_path(self, file_id, file_unique_id=None):
+        """file_path de getFile; reaproveitado por file_unique_id enquanto o link for válido"""
+        now = time.monotonic()
+        if file_unique_id:
+            cached = self._file_paths.get(file_unique_id)
+            if cached is not None and now - cached[1] < FILE_PATH_TTL:
+                self._file_paths.move_to_end(file_unique_id)
+                self.file_path_hits += 1
+                return cached[0]
+
+        self.file_path_misses += 1
+        response = await self._get_client().get(f"{self.bot_url}/getFile", params={"file_id": file_id})
+        response.raise_for_status()
+        file_path = response.json()['result']['file_path']
+
+        if file_unique_id:
+            self._file_paths[file_unique_id] = (file_path, now)
+            self._file_paths.move_to_end(file_unique_id)
+            if len(self._file_paths) > self.file_cache_size:
+                self._file_paths.popitem(last=False)
+        return file_path
+
+    async def download_file(self, file_id, file_unique_id=None):
+        """Baixa um arquivo (foto/voz) e retorna os bytes"""
+        with metrics.timed('download'):
+            return await self._download_file(file_id, file_unique_id)
+
+    async def _download_file(self, file_id, file_unique_id=None):
+        file_path = await self.get_file_path(file_id, file_unique_id)
+        response = await self._get_client().get(f"{self.base_url}/file/bot{self.token}/{file_path}")
+        if response.status_code == 404 and file_unique_id:
+            # Link expirado antes do previsto: descarta o cache e pede um novo
+            self._file_paths.pop(file_unique_id, None)
+            file_path = await self.get_file_path(file_id)
+            response = await self._get_client().get(f"{self.base_url}/file/bot{self.token}/{file_path}")
+        response.raise_for_status()
+        return response.content
+
+    async def aclose(self):
+        """Fecha o pool de conexões"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
@@ -1,7 +1,19 @@
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler
+import asyncio
+import os
+import re
+import time
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import (
+    Application, ApplicationHandlerStop, CallbackQueryHandler, CommandHandler, MessageHandler, TypeHandler,
+    filters, ContextTypes, ConversationHandler
+)
+from telegram.request import HTTPXRequest
 import logging
+from bot_execution import BlockingExecutor, ChatOrderedUpdateProcessor
 from database_manager import DatabaseManager
+from idempotency import IdempotencyStore
+from metrics import metrics, start_exporter
+from profiling import profiler
 from speech_to_text import SpeechToText
 
 logger = logging.getLogger(__name__)
@@ -9,15 +21,130 @@ logger = logging.getLogger(__name__)
 # Estados para a conversa de limpeza do banco
 CONFIRM_CLEAR = 1
 
+# Transações por página do /extrato
+EXTRATO_PAGE_SIZE = 10
+DATE_ARG_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# Chamadas da Bot API medidas como etapa send_message
+SEND_METHODS = ('/sendMessage', '/editMessageText')
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest que mede o envio de mensagens (mesma etapa do webhook)"""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        if not url.endswith(SEND_METHODS):
+            return await super().do_request(url, method, *args, **kwargs)
+        with metrics.timed('send_message'):
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        if code >= 400:
+            metrics.error('send_message')
+        return code, payload
+
+
+class ProgressMessage:
+    """
+    Mensagem de "processando" editada no lugar com os campos parciais do streaming do Gemini.
+    A Bot API limita edições seguidas da mesma mensagem: entre edições há pelo menos `interval`
+    segundos e só o texto mais recente é enviado.
+    """
+
+    def __init__(self, message, interval):
+        self.message = message
+        self.header = message.text
+        self.interval = interval
+        self.edits = 0
+        self._last_text = message.text
+        self._last_edit = 0.0
+        self._pending = None
+        self._task = None
+
+    def update(self, partial):
+        """Callback on_partial do GeminiAIClient (síncrono): agenda a edição"""
+        text = self._render(partial)
+        if text == self._last_text:
+            return
+        self._pending = text
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._flush())
+
+    def _render(self, partial):
+        lines = [self.header]
+        if partial.get('establishment'):
+            lines.append(f"🏪 {partial['establishment']}")
+        if isinstance(partial.get('total_amount'), (int, float)):
+            lines.append(f"💰 R$ {partial['total_amount']:.2f}")
+        if partial.get('category'):
+            lines.append(f"🏷️ {partial['category']}")
+        if partial.get('items'):
+            lines.append(f"🛒 Itens lidos: {len(partial['items'])}")
+        return '\n'.join(lines)
+
+    async def _flush(self):
+        while self._pending is not None:
+            wait = self._last_edit + self.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            text, self._pending = self._pending, None
+            try:
+                await self.message.edit_text(text)
+            except Exception as e:
+                logger.debug(f"Edição da mensagem de progresso ignorada: {e}")
+            self._last_text = text
+            self._last_edit = time.monotonic()
+            self.edits += 1
+
+    async def close(self):
+        """Descarta a edição agendada: o resultado final chega em uma nova mensagem"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
 class TelegramBot:
-    def __init__(self, token, gemini_client):
+    def __init__(self, token, gemini_client, concurrent_updates=None, executor=None):
         self.gemini_client = gemini_client
         self.db_manager = DatabaseManager()
+        self.idempotency = IdempotencyStore()
         self.speech_to_text = SpeechToText()
-        self.application = Application.builder().token(token).build()
+        # Chamadas bloqueantes ao SQLite saem do event loop
+        self.executor = executor or BlockingExecutor()
+
+        # Updates de chats diferentes em paralelo; os de um mesmo chat, em ordem
+        self.concurrent_updates = int(concurrent_updates or os.getenv('BOT_CONCURRENT_UPDATES', 8))
+        self.update_processor = None
+        builder = (
+            Application.builder()
+            .token(token)
+            .request(InstrumentedRequest(connection_pool_size=256))
+            .post_shutdown(self._on_shutdown)
+        )
+        if self.concurrent_updates > 1:
+            self.update_processor = ChatOrderedUpdateProcessor(self.concurrent_updates)
+            builder = builder.concurrent_updates(self.update_processor)
+        # TELEGRAM_API_BASE permite apontar para um servidor local (benchmarks)
+        api_base = os.getenv('TELEGRAM_API_BASE')
+        if api_base:
+            api_base = api_base.rstrip('/')
+            builder = builder.base_url(f"{api_base}/bot").base_file_url(f"{api_base}/file/bot")
+        self.application = builder.build()
+        # Respostas do Gemini em streaming: a mensagem de "processando" mostra os campos já lidos
+        self.stream_responses = os.getenv('BOT_STREAM_RESPONSES', '1').lower() in ('1', 'true', 'yes')
+        self.stream_edit_interval = float(os.getenv('BOT_STREAM_EDIT_INTERVAL', 1.0))
+        # Chats autorizados a usar /perfil (sem ADMIN_CHAT_IDS o comando é ignorado)
+        self.admin_chat_ids = {int(chat_id) for chat_id in os.getenv('ADMIN_CHAT_IDS', '').split(',') if chat_id.strip()}
+        self._original_callbacks = {}
         self.setup_handlers()
+        if profiler.enabled:
+            self._set_handler_profiling(True)
     
     def setup_handlers(self):
+        # Antes de todos os outros: descarta updates repetidos
+        self.application.add_handler(TypeHandler(Update, self._drop_duplicates), group=-1)
+
         # Handler para limpeza de banco (com confirmação)
         clear_conv = ConversationHandler(
             entry_points=[CommandHandler('limpar', self.clear_command)],
@@ -30,17 +157,35 @@ class TelegramBot:
         self.application.add_handler(clear_conv)
         self.application.add_handler(CommandHandler("start", self.start_command))
         self.application.add_handler(CommandHandler("extrato", self.extrato_command))
+        self.application.add_handler(CallbackQueryHandler(self.extrato_page_callback, pattern=r'^extrato:'))
         self.application.add_handler(CommandHandler("resumo", self.resumo_command))
+        self.application.add_handler(CommandHandler("perfil", self.perfil_command))
         self.application.add_handler(MessageHandler(filters.PHOTO, self.handle_image))
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text))
         self.application.add_handler(MessageHandler(filters.VOICE, self.handle_voice))
     
+    async def _drop_duplicates(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Interrompe o processamento de reentregas antes de qualquer download ou chamada ao Gemini"""
+        # Claims no SQLite de idempotência rodam no pool de threads, como os demais acessos ao banco
+        if not await self.executor.run(self.idempotency.claim_update, update.update_id):
+            logger.info(f"Update duplicado descartado: {update.update_id}")
+            raise ApplicationHandlerStop
+        if update.message and not await self.executor.run(
+            self.idempotency.claim_message, update.message.chat_id, update.message.message_id
+        ):
+            logger.info(f"Mensagem duplicada descartada: {update.message.message_id}")
+            raise ApplicationHandlerStop
+        # Só edições de texto mudam a transação (legendas de fotos/áudios, não)
+        if update.edited_message and not update.edited_message.text:
+            raise ApplicationHandlerStop
+
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
             "🤖 *FinTracker AI - Sistema de Gestão Financeira*\n\n"
             "Envie fotos de recibos, notas fiscais, áudios ou textos para registro automático.\n\n"
             "Comandos disponíveis:\n"
             "/extrato - Ver últimas transações\n"
+            "   filtros: /extrato 2025-01-01 2025-01-31 categoria=Mercado metodo=texto\n"
             "/resumo - Resumo financeiro por categorias\n"
             "/limpar - Limpar banco de dados (com confirmação)\n\n"
             "Aceito:\n"
@@ -51,17 +196,18 @@ class TelegramBot:
         )
     
     async def handle_image(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        await update.message.reply_text("📷 Processando documento financeiro...")
+        status_message = await update.message.reply_text("📷 Processando documento financeiro...")
         
         try:
-            photo = await update.message.photo[-1].get_file()
-            image_bytes = await photo.download_as_bytearray()
+            with metrics.timed('download'):
+                photo = await update.message.photo[-1].get_file()
+                image_bytes = await photo.download_as_bytearray()
             
             # Processar com Gemini AI
-            transaction_data = self.gemini_client.analyze_financial_document(image_bytes=image_bytes)
+            transaction_data = await self._analyze(status_message, image_bytes=image_bytes)
             
             # Salvar no banco de dados
-            if self.db_manager.save_transaction(update.effective_chat.id, transaction_data, "image"):
+            if await self._save_transaction(update.effective_chat.id, transaction_data, "image", update.message.message_id):
                 response_message = self._format_transaction_response(transaction_data)
                 await update.message.reply_text(response_message, parse_mode="Markdown")
             else:
@@ -72,43 +218,62 @@ class TelegramBot:
             await update.message.reply_text("❌ Erro ao processar documento. Tente novamente com uma imagem mais nítida.")
     
     async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        text = update.message.text
+        # Mensagens editadas chegam em update.edited_message e atualizam a transação original
+        message = update.effective_message
+        text = message.text
         
         # Ignorar comandos de confirmação de limpeza
         if text.upper() in ['SIM', 'NÃO', 'NAO', 'CANCELAR']:
             return
         
-        await update.message.reply_text("📝 Processando descrição de transação...")
+        edited_transaction_id = None
+        if update.edited_message:
+            edited_transaction_id = await self.executor.run(
+                self.idempotency.get_transaction, message.chat_id, message.message_id
+            )
+
+        status_message = await message.reply_text("📝 Processando descrição de transação...")
         
         try:
             # Processar com Gemini AI
-            transaction_data = self.gemini_client.analyze_financial_document(text_input=text)
+            transaction_data = await self._analyze(status_message, text_input=text)
             
             # Log para debugging
             logger.info(f"Dados processados: {transaction_data}")
             
             # Verificar se os dados essenciais estão presentes
             if not transaction_data.get('total_amount', 0) > 0:
-                await update.message.reply_text(
+                await message.reply_text(
                     "❌ Não consegui identificar um valor na transação. "
                     "Por favor, seja mais específico sobre o valor gasto. "
                     "Exemplo: 'Gastei 200 reais em um mouse'"
                 )
                 return
             
+            if edited_transaction_id:
+                updated = await self.executor.run(
+                    self.db_manager.update_transaction, edited_transaction_id, message.chat_id, transaction_data
+                )
+                if updated:
+                    response_message = self._format_transaction_response(transaction_data, updated=True)
+                    await message.reply_text(response_message, parse_mode="Markdown")
+                else:
+                    await message.reply_text("❌ Erro ao atualizar transação no banco de dados.")
+                return
+
             # Salvar no banco de dados
-            if self.db_manager.save_transaction(update.effective_chat.id, transaction_data, "text"):
+            if await self._save_transaction(update.effective_chat.id, transaction_data, "text", message.message_id):
                 response_message = self._format_transaction_response(transaction_data)
-                await update.message.reply_text(response_message, parse_mode="Markdown")
+                await message.reply_text(response_message, parse_mode="Markdown")
             else:
-                await update.message.reply_text(
+                await message.reply_text(
                     "❌ Erro ao salvar transação no banco de dados. "
                     "Por favor, tente novamente ou use /ajuda para suporte."
                 )
             
         except Exception as e:
             logger.error(f"Erro no processamento de texto: {str(e)}")
-            await update.message.reply_text(
+            await message.reply_text(
                 "❌ Erro ao processar texto. Por favor, tente ser mais específico:\n\n"
                 "• Inclua o valor gasto (ex: 200 reais)\n"
                 "• Mentione o estabelecimento (ex: na Magazine Luiza)\n"
@@ -121,19 +286,21 @@ class TelegramBot:
         await update.message.reply_text("🎤 Processando áudio...")
         
         try:
-            voice = await update.message.voice.get_file()
-            audio_bytes = await voice.download_as_bytearray()
+            with metrics.timed('download'):
+                voice = await update.message.voice.get_file()
+                audio_bytes = await voice.download_as_bytearray()
             
             # Transcrever áudio para texto
-            transcribed_text = self.speech_to_text.transcribe_audio(audio_bytes)
+            # Decodificação e reconhecimento no pool de processos do SpeechToText
+            transcribed_text = await self.speech_to_text.transcribe_audio_async(audio_bytes)
             
-            await update.message.reply_text(f"📝 Áudio transcrito: {transcribed_text}")
+            status_message = await update.message.reply_text(f"📝 Áudio transcrito: {transcribed_text}")
             
             # Processar texto transcrito
-            transaction_data = self.gemini_client.analyze_financial_document(text_input=transcribed_text)
+            transaction_data = await self._analyze(status_message, text_input=transcribed_text)
             
             # Salvar no banco de dados
-            if self.db_manager.save_transaction(update.effective_chat.id, transaction_data, "voice"):
+            if await self._save_transaction(update.effective_chat.id, transaction_data, "voice", update.message.message_id):
                 response_message = self._format_transaction_response(transaction_data)
                 await update.message.reply_text(response_message, parse_mode="Markdown")
             else:
@@ -143,6 +310,33 @@ class TelegramBot:
             logger.error(f"Erro no processamento de áudio: {str(e)}")
             await update.message.reply_text("❌ Erro ao processar áudio. Tente novamente com um áudio mais claro.")
     
+    async def _analyze(self, status_message, **document):
+        """Análise do Gemini; com streaming, `status_message` é editada com os campos já lidos"""
+        if not self.stream_responses:
+            return await self.gemini_client.analyze_financial_document_async(**document)
+        progress = ProgressMessage(status_message, self.stream_edit_interval)
+        try:
+            return await self.gemini_client.analyze_financial_document_stream(on_partial=progress.update, **document)
+        finally:
+            await progress.close()
+
+    async def _save_transaction(self, chat_id, transaction_data, input_method, message_id=None):
+        """
+        Salva a transação (em lote, se o modo write-behind estiver ativo) e retorna o id ou None.
+        Com message_id, edições futuras da mensagem atualizam esta transação.
+        """
+        try:
+            # Sem write-behind, submit_transaction grava na hora: fica no pool de threads
+            future = await self.executor.run(self.db_manager.submit_transaction, chat_id, transaction_data, input_method)
+            transaction_id = await asyncio.wrap_future(future)
+        except Exception as e:
+            logger.error(f"Erro ao salvar transação: {str(e)}")
+            return None
+
+        if transaction_id and message_id is not None:
+            await self.executor.run(self.idempotency.set_transaction, chat_id, message_id, transaction_id)
+        return transaction_id
+
     async def clear_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Inicia o processo de limpeza do banco de dados"""
         await update.message.reply_text(
@@ -157,7 +351,7 @@ class TelegramBot:
         response = update.message.text.upper()
         
         if response in ['SIM', 'YES']:
-            if self.db_manager.clear_database(update.effective_chat.id):
+            if await self.executor.run(self.db_manager.clear_database, update.effective_chat.id):
                 await update.message.reply_text("✅ Banco de dados limpo com sucesso!")
             else:
                 await update.message.reply_text("❌ Erro ao limpar banco de dados.")
@@ -171,10 +365,10 @@ class TelegramBot:
         await update.message.reply_text("❌ Operação de limpeza cancelada.")
         return ConversationHandler.END
     
-    def _format_transaction_response(self, transaction_data):
+    def _format_transaction_response(self, transaction_data, updated=False):
         """Formata a resposta da transação para o usuário"""
         response_message = (
-            f"✅ *Transação registrada com sucesso!*\n\n"
+            f"✅ *Transação {'atualizada' if updated else 'registrada'} com sucesso!*\n\n"
             f"🏪 **Estabelecimento:** {transaction_data.get('establishment', 'Não identificado')}\n"
             f"📅 **Data:** {transaction_data.get('date', 'Não especificada')}\n"
             f"💰 **Valor Total:** R$ {transaction_data.get('total_amount', 0):.2f}\n"
@@ -191,25 +385,92 @@ class TelegramBot:
     
     async def extrato_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.effective_chat.id
-        transactions = self.db_manager.get_transactions(chat_id, 10)
-        
-        if not transactions:
-            await update.message.reply_text("📝 Nenhuma transação registrada ainda.")
+        # Filtros ficam no chat_data para as páginas seguintes (callback_data tem limite de 64 bytes)
+        filters_ = self._parse_extrato_filters(context.args or [])
+        context.chat_data['extrato_filters'] = filters_
+
+        page = await self.executor.run(self.db_manager.get_transactions_page, chat_id, EXTRATO_PAGE_SIZE, **filters_)
+
+        if not page['transactions']:
+            if filters_:
+                await update.message.reply_text("📝 Nenhuma transação encontrada com esses filtros.")
+            else:
+                await update.message.reply_text("📝 Nenhuma transação registrada ainda.")
             return
-        
+
+        await update.message.reply_text(
+            self._format_extrato(page['transactions']),
+            parse_mode="Markdown",
+            reply_markup=self._extrato_keyboard(page)
+        )
+
+    async def extrato_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Botões próxima/anterior do /extrato"""
+        query = update.callback_query
+        await query.answer()
+
+        _, direction, cursor = query.data.split(':', 2)
+        page = await self.executor.run(
+            self.db_manager.get_transactions_page,
+            update.effective_chat.id,
+            EXTRATO_PAGE_SIZE,
+            cursor=cursor,
+            backward=direction == 'p',
+            **context.chat_data.get('extrato_filters', {})
+        )
+
+        if not page['transactions']:
+            await query.edit_message_reply_markup(reply_markup=None)
+            return
+
+        await query.edit_message_text(
+            self._format_extrato(page['transactions']),
+            parse_mode="Markdown",
+            reply_markup=self._extrato_keyboard(page)
+        )
+
+    def _parse_extrato_filters(self, args):
+        """Interpreta '/extrato [de] [até] [categoria=X] [metodo=texto|imagem|audio]'"""
+        methods = {'texto': 'text', 'text': 'text', 'imagem': 'image', 'image': 'image',
+                   'foto': 'image', 'audio': 'voice', 'áudio': 'voice', 'voice': 'voice'}
+        filters_ = {}
+        dates = []
+        for arg in args:
+            key, sep, value = arg.partition('=')
+            if DATE_ARG_RE.match(arg):
+                dates.append(arg)
+            elif sep and key.lower() == 'categoria' and value:
+                filters_['category'] = value
+            elif sep and key.lower() in ('metodo', 'método') and value.lower() in methods:
+                filters_['input_method'] = methods[value.lower()]
+
+        if dates:
+            filters_['date_from'] = dates[0]
+        if len(dates) > 1:
+            filters_['date_to'] = dates[1]
+        return filters_
+
+    def _format_extrato(self, transactions):
         message = "📋 *Últimas Transações:*\n\n"
         for trans in transactions:
             message += (
                 f"🏪 {trans[2]}\n"
-                f"   📅 {trans[3]} | 💰 R$ {trans[4]:.2f}\n"
+                f"   📅 {trans[3]} | 💰 R$ {trans[4] or 0:.2f}\n"
                 f"   🏷️ {trans[5]} | 📝 {trans[10]}\n\n"
             )
-        
-        await update.message.reply_text(message, parse_mode="Markdown")
-    
+        return message
+
+    def _extrato_keyboard(self, page):
+        buttons = []
+        if page['prev_cursor']:
+            buttons.append(InlineKeyboardButton("◀️ Mais recentes", callback_data=f"extrato:p:{page['prev_cursor']}"))
+        if page['next_cursor']:
+            buttons.append(InlineKeyboardButton("Mais antigas ▶️", callback_data=f"extrato:n:{page['next_cursor']}"))
+        return InlineKeyboardMarkup([buttons]) if buttons else None
+
     async def resumo_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.effective_chat.id
-        summary = self.db_manager.get_financial_summary(chat_id)
+        summary = await self.executor.run(self.db_manager.get_financial_summary, chat_id)
         
         if not summary or not summary['by_category']:
             await update.message.reply_text("📊 Não há dados suficientes para gerar um resumo.")
@@ -227,5 +488,71 @@ class TelegramBot:
         
         await update.message.reply_text(message, parse_mode="Markdown")
     
+    def _profiled_handlers(self):
+        """Handlers cujo callback pode ser perfilado (inclui os da conversa de /limpar)"""
+        for handlers in self.application.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, ConversationHandler):
+                    yield from handler.entry_points
+                    for state_handlers in handler.states.values():
+                        yield from state_handlers
+                    yield from handler.fallbacks
+                elif handler.callback != self.perfil_command:
+                    yield handler
+
+    def _set_handler_profiling(self, enabled):
+        """Troca os callbacks pelos embrulhados pelo perfilador ou restaura os originais (custo zero)"""
+        for handler in self._profiled_handlers():
+            original = self._original_callbacks.setdefault(handler, handler.callback)
+            handler.callback = profiler.wrap(original) if enabled else original
+
+    async def perfil_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        /perfil - estado e funções mais caras
+        /perfil ligar [taxa] [cprofile|sample] - perfila uma fração dos handlers
+        /perfil desligar - restaura os handlers originais
+        /perfil gravar - grava o agregado em PROFILE_DIR e zera
+        """
+        if update.effective_chat.id not in self.admin_chat_ids:
+            return
+        action = context.args[0].lower() if context.args else ''
+
+        try:
+            if action == 'ligar':
+                rate = context.args[1] if len(context.args) > 1 else (profiler.sample_rate or 0.1)
+                mode = context.args[2] if len(context.args) > 2 else None
+                profiler.configure(rate, mode)
+                self._set_handler_profiling(profiler.enabled)
+            elif action == 'desligar':
+                profiler.configure(0)
+                self._set_handler_profiling(False)
+            elif action == 'gravar':
+                paths = await self.executor.run(profiler.dump, reset=True)
+                await update.message.reply_text("\n".join(paths) if paths else "Nenhum perfil coletado ainda.")
+                return
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+
+        stats = profiler.stats()
+        lines = [f"Perfil: {'ligado' if stats['enabled'] else 'desligado'} | taxa {stats['sample_rate']} | "
+                 f"modo {stats['mode']} | {stats['profiled']} perfilados"]
+        for row in profiler.top(10):
+            cost = f"{row['cumtime']:.3f}s" if 'cumtime' in row else f"{row['samples']} amostras"
+            lines.append(f"{cost}  {row['function']}")
+        await update.message.reply_text("\n".join(lines))
+
+    async def _on_shutdown(self, application: Application):
+        """Libera o pool de conexões do cliente Gemini e os pools de execução ao encerrar o bot"""
+        await self.gemini_client.aclose()
+        self.executor.shutdown()
+        self.speech_to_text.close()
+        self.db_manager.close()
+        self.idempotency.close()
+
     def start(self):
+        # Exportador Prometheus opcional (no webhook as métricas ficam em /metrics)
+        metrics_port = os.getenv('METRICS_PORT')
+        if metrics_port:
+            start_exporter(int(metrics_port))
         self.application.run_polling()
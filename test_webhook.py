@@ -1,13 +1,176 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+import pytest
+from fastapi import BackgroundTasks, Request
 from fastapi.testclient import TestClient
+
 from api import webhook
-import os
 
-client = TestClient(webhook.app)
+UPDATES = [
+    {'update_id': 1, 'message': {'message_id': 10, 'chat': {'id': 999}, 'text': 'teste'}},
+    {'update_id': 2, 'message': {'message_id': 11, 'chat': {'id': 999}, 'text': 'outro teste'}},
+]
+
+
+@pytest.fixture(autouse=True)
+def isolated_webhook(tmp_path, monkeypatch):
+    """Bancos em um diretório temporário, sem Telegram nem Gemini (transação padrão)"""
+    monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'financial_data.db'))
+    monkeypatch.setenv('JOB_QUEUE_PATH', str(tmp_path / 'jobs.db'))
+    monkeypatch.setenv('IDEMPOTENCY_PATH', str(tmp_path / 'idempotency.db'))
+    monkeypatch.delenv('VERCEL', raising=False)
+    monkeypatch.delenv('JOB_PROCESS_INLINE', raising=False)
+    monkeypatch.setattr(webhook, 'TELEGRAM_TOKEN', None)
+    monkeypatch.setattr(webhook, 'GEMINI_API_KEY', None)
+    monkeypatch.setattr(webhook, 'METRICS_TOKEN', None)
+    yield tmp_path
+    asyncio.run(webhook.shutdown())
+
+
+def saved_transactions(tmp_path):
+    with sqlite3.connect(tmp_path / 'financial_data.db') as conn:
+        return conn.execute("SELECT COUNT(*) FROM transactions WHERE chat_id = '999'").fetchone()[0]
+
+
+def post_updates(client):
+    for path, update in zip(['/', '/api/webhook'], UPDATES):
+        response = client.post(path, json=update)
+        assert response.status_code == 200
+        assert response.json() == {'ok': True}
+
+
+def test_jobs_complete_with_lifespan_worker(isolated_webhook):
+    with TestClient(webhook.app) as client:
+        assert webhook.worker is not None
+        post_updates(client)
+        deadline = time.monotonic() + 10
+        while webhook.worker.processed < len(UPDATES) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert webhook.worker.processed == len(UPDATES)
+        assert webhook.get_job_queue().stats() == {'pending': 0, 'running': 0, 'failed': 0}
+    assert saved_transactions(isolated_webhook) == len(UPDATES)
+
+
+def test_edit_waits_for_the_original_message(isolated_webhook):
+    edit = {'update_id': 3, 'edited_message': {'message_id': 10, 'chat': {'id': 999}, 'text': 'teste editado'}}
+    with TestClient(webhook.app) as client:
+        # Worker com vários jobs simultâneos: a edição não pode rodar antes do job da mensagem
+        client.post('/api/webhook', json=UPDATES[0])
+        client.post('/api/webhook', json=edit)
+        deadline = time.monotonic() + 10
+        while webhook.worker.processed < 2 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert webhook.worker.processed == 2
+    assert saved_transactions(isolated_webhook) == 1
+
+
+def test_jobs_complete_inline_without_lifespan(isolated_webhook):
+    # Sem `with` o lifespan não roda: o job é processado antes da resposta
+    client = TestClient(webhook.app)
+    post_updates(client)
+    assert webhook.worker is None
+    assert webhook.get_job_queue().stats() == {'pending': 0, 'running': 0, 'failed': 0}
+    assert saved_transactions(isolated_webhook) == len(UPDATES)
+
+
+def test_inline_job_runs_after_the_ack(isolated_webhook):
+    async def scenario():
+        body = json.dumps(UPDATES[0]).encode()
+
+        async def receive():
+            return {'type': 'http.request', 'body': body}
+
+        request = Request({'type': 'http', 'method': 'POST', 'path': '/api/webhook', 'headers': []}, receive)
+        tasks = BackgroundTasks()
+        assert await webhook.telegram_webhook(request, tasks) == {'ok': True}
+        # Confirmado com o job ainda na fila; a background task roda depois da resposta
+        assert webhook.get_job_queue().stats()['pending'] == 1
+        await tasks()
+        assert webhook.get_job_queue().stats() == {'pending': 0, 'running': 0, 'failed': 0}
+
+    asyncio.run(scenario())
+    assert saved_transactions(isolated_webhook) == 1
+
+
+def test_inline_failure_replies_with_error(isolated_webhook, monkeypatch):
+    sent = []
+
+    async def send_message(chat_id, text):
+        sent.append(text)
+
+    def broken_db():
+        raise sqlite3.OperationalError('disk I/O error')
+
+    monkeypatch.setattr(webhook, '_send_telegram_message', send_message)
+    monkeypatch.setattr(webhook, 'get_db', broken_db)
+    client = TestClient(webhook.app)
+    assert client.post('/api/webhook', json=UPDATES[0]).status_code == 200
+    # Sem worker não há retentativa agendada: o usuário recebe o erro na mesma invocação
+    assert sent == ['❌ Erro ao salvar transação no banco de dados.']
+    # Nada fica pendente esperando um worker que não existe
+    assert webhook.get_job_queue().stats() == {'pending': 0, 'running': 0, 'failed': 0}
+
+
+def test_database_is_created_off_the_event_loop(isolated_webhook, monkeypatch):
+    created_on_loop = []
+    database_manager = webhook.DatabaseManager
+
+    def tracking_database_manager():
+        try:
+            asyncio.get_running_loop()
+            created_on_loop.append(True)
+        except RuntimeError:
+            created_on_loop.append(False)
+        return database_manager()
+
+    monkeypatch.setattr(webhook, 'DatabaseManager', tracking_database_manager)
+    post_updates(TestClient(webhook.app))
+    # Uma instância só, criada (com as migrações) em uma thread do pool
+    assert created_on_loop == [False]
+    assert saved_transactions(isolated_webhook) == len(UPDATES)
+
+
+def test_duplicate_update_is_dropped(isolated_webhook):
+    client = TestClient(webhook.app)
+    post_updates(client)
+    client.post('/api/webhook', json=UPDATES[0])
+    assert saved_transactions(isolated_webhook) == len(UPDATES)
+
+
+def test_redelivery_after_failed_enqueue_is_processed(isolated_webhook, monkeypatch):
+    client = TestClient(webhook.app, raise_server_exceptions=False)
+    queue = webhook.get_job_queue()
+    enqueue = queue.enqueue
+
+    def failing_enqueue(*args, **kwargs):
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(queue, 'enqueue', failing_enqueue)
+    assert client.post('/api/webhook', json=UPDATES[0]).status_code == 500
+    # Nada foi processado: o banco de transações nem chegou a ser criado
+    assert not (isolated_webhook / 'financial_data.db').exists()
+
+    # O Telegram reentrega o mesmo update depois do 500
+    monkeypatch.setattr(queue, 'enqueue', enqueue)
+    assert client.post('/api/webhook', json=UPDATES[0]).status_code == 200
+    assert saved_transactions(isolated_webhook) == 1
+
+
+def test_metrics_require_a_token(isolated_webhook, monkeypatch):
+    client = TestClient(webhook.app)
+    # Fechado por padrão
+    assert client.get('/metrics').status_code == 404
+
+    monkeypatch.setattr(webhook, 'METRICS_TOKEN', 'segredo')
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer segredo'}).status_code == 200
 
-for path in ['/', '/api/webhook']:
-    r = client.post(path, json={'update_id':1,'message':{'chat':{'id':999},'text':'teste'}})
-    print(path, r.status_code, r.json())
 
-print('last_update exists:', os.path.exists('last_update.json'))
-if os.path.exists('last_update.json'):
-    print('last_update size:', os.path.getsize('last_update.json'))
+def test_debug_token_is_only_accepted_in_the_header(isolated_webhook, monkeypatch):
+    monkeypatch.setattr(webhook, 'DEBUG_TOKEN', 'segredo')
+    client = TestClient(webhook.app)
+    assert client.get('/api/debug/updates', params={'token': 'segredo'}).status_code == 403
+    assert client.get('/api/debug/updates', headers={'X-Debug-Token': 'segredo'}).status_code == 200
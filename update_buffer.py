@@ -0,0 +1,107 @@
+"""
+Buffer circular em memória com os últimos updates recebidos pelo webhook (debug).
+Substitui a gravação de /tmp/last_update.json a cada requisição: o caminho quente
+só adiciona uma referência à deque; disco apenas quando um flush é pedido.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Campos com dados pessoais ou conteúdo das mensagens, mascarados na leitura
+REDACTED_FIELDS = frozenset({
+    'text', 'caption', 'first_name', 'last_name', 'username', 'phone_number', 'title'
+})
+
+
+def redact(value):
+    """Cópia do update com textos e dados de contato substituídos pelo tamanho original"""
+    if isinstance(value, dict):
+        return {
+            key: (f"<{len(item)} caracteres>" if key in REDACTED_FIELDS and isinstance(item, str) else redact(item))
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+class UpdateBuffer:
+    """
+    Guarda os `capacity` updates mais recentes, amostrados com `sample_rate` (0 a 1).
+    Os updates são guardados por referência (o webhook não os altera) e a redação
+    acontece só em snapshot()/flush(), fora do caminho quente.
+    """
+
+    def __init__(self, capacity=None, sample_rate=None, redact_fields=None, dump_path=None):
+        self.capacity = int(capacity or os.getenv('UPDATE_BUFFER_SIZE', 100))
+        self.sample_rate = float(sample_rate if sample_rate is not None else os.getenv('UPDATE_SAMPLE_RATE', 1.0))
+        if redact_fields is None:
+            redact_fields = os.getenv('UPDATE_REDACT', '1').lower() in ('1', 'true', 'yes')
+        self.redact = redact_fields
+        self.dump_path = dump_path or os.getenv('UPDATE_DUMP_PATH', '/tmp/recent_updates.jsonl')
+
+        self.recorded = 0
+        self.skipped = 0
+        self.flushed = 0
+        self._entries = deque(maxlen=self.capacity)
+        self._flush_lock = threading.Lock()
+
+    def record(self, update):
+        """Adiciona o update ao buffer (se amostrado); O(1) e sem I/O"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.skipped += 1
+            return False
+        if isinstance(update, (bytes, bytearray)):
+            update = update.decode('utf-8', errors='replace')
+        self._entries.append((time.time(), update))
+        self.recorded += 1
+        return True
+
+    def snapshot(self, limit=None):
+        """Updates mais recentes primeiro, já com a redação aplicada"""
+        entries = list(self._entries)
+        entries.reverse()
+        if limit is not None:
+            entries = entries[:max(0, limit)]
+        return [
+            {'received_at': received_at, 'update': redact(update) if self.redact else update}
+            for received_at, update in entries
+        ]
+
+    def _write(self, entries, path):
+        dirpath = os.path.dirname(path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        with self._flush_lock, open(path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+
+    async def flush(self, path=None, clear=False):
+        """Anexa o conteúdo do buffer em JSONL (em thread) e retorna (caminho, quantidade)"""
+        path = path or self.dump_path
+        entries = self.snapshot()
+        entries.reverse()
+        if clear:
+            self._entries.clear()
+        await asyncio.to_thread(self._write, entries, path)
+        self.flushed += len(entries)
+        logger.info(f"{len(entries)} updates gravados em {path}")
+        return path, len(entries)
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'capacity': self.capacity,
+            'sample_rate': self.sample_rate,
+            'redact': self.redact,
+            'recorded': self.recorded,
+            'skipped': self.skipped,
+            'flushed': self.flushed,
+        }
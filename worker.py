@@ -0,0 +1,48 @@
+"""
+Worker separado da fila de jobs do webhook.
+
+Uso (com JOB_WORKER_INPROCESS=0 no webhook):
+    python worker.py --concurrency 8
+"""
+import argparse
+import asyncio
+import logging
+import signal
+
+from api import webhook
+
+# Configurar logging
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+async def run(concurrency):
+    worker = webhook.create_worker(concurrency)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    worker.start()
+    logger.info(f"Worker {worker.worker_id} iniciado ({worker.concurrency} jobs simultâneos)")
+    await stop.wait()
+
+    logger.info("Encerrando: aguardando os jobs em andamento")
+    await worker.stop()
+    await webhook.shutdown()
+    logger.info(f"Worker encerrado: {worker.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Processa os updates enfileirados pelo webhook")
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help="jobs simultâneos (padrão: JOB_WORKER_CONCURRENCY ou 4)")
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()